@@ -52,6 +52,9 @@ class MagnitudeCompletenessConfig(pexConfig.Config):
 class CalcCompletenessHistogramAction(KeyedDataAction):
     """Action to calculate a histogram of completeness vs magnitude."""
 
+    # The band is used to name the outputs.
+    bandDependent = True
+
     action = ConfigurableActionField[CalcBinnedCompletenessAction](
         doc="The action to compute completeness/purity",
     )
@@ -20,13 +20,14 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 __all__ = ("CalcRelativeDistances",)
 
+import hashlib
+
 import astropy.units as u
-import esutil
 import numpy as np
 from lsst.pex.config import Field
 from smatch import Matcher
 
-from ...interfaces import KeyedData, KeyedDataAction, KeyedDataSchema, Vector
+from ...interfaces import ActionCache, KeyedData, KeyedDataAction, KeyedDataSchema, Vector
 
 
 class CalcRelativeDistances(KeyedDataAction):
@@ -58,6 +59,16 @@ class CalcRelativeDistances(KeyedDataAction):
         doc="Random seed to use when downsampling.",
         default=12345,
     )
+    selfMatchRadius = Field[float](
+        doc="Radius in arcmin to match the objects to each other within, or 0 to use the outer radius of "
+        "the annulus. Setting this to the same value, at least as large as the largest annulus, for all "
+        "the actions computing different annuli of the same objects (e.g. AM1, AM2, and AM3) allows them "
+        "to share a single self-match, which is held by the action cache of the task (see cacheActions) "
+        "until the end of the quantum; without a cache, each action makes its own. When more than "
+        "maxPairs pairs are found, the pairs downsampled from a shared self-match differ from those "
+        "downsampled when this is 0.",
+        default=0.0,
+    )
 
     def getInputSchema(self) -> KeyedDataSchema:
         return (
@@ -102,22 +113,14 @@ class CalcRelativeDistances(KeyedDataAction):
 
         rng = np.random.RandomState(seed=self.randomSeed)
 
-        def _compressArray(arrayIn):
-            h, rev = esutil.stat.histogram(arrayIn, rev=True)
-            arrayOut = np.zeros(len(arrayIn), dtype=np.int32)
-            (good,) = np.where(h > 0)
-            for counter, ind in enumerate(good):
-                arrayOut[rev[rev[ind] : rev[ind + 1]]] = counter
-            return arrayOut
-
-        groupId = _compressArray(data[self.groupKey])
+        # Number the objects consecutively, in order of their group key.
+        _, groupId = np.unique(np.asarray(data[self.groupKey]), return_inverse=True)
+        groupId = groupId.ravel()
 
         nObj = groupId.max() + 1
 
         # Compute the meanRa/meanDec.
-        meanRa = np.zeros(nObj)
-        meanDec = np.zeros_like(meanRa)
-        nObs = np.zeros_like(meanRa, dtype=np.int64)
+        nObs = np.bincount(groupId, minlength=nObj)
 
         # Check if tract is overlapping ra=0 and rotate if so.
         # We assume a tract is smaller than 60x60 degrees.
@@ -128,12 +131,8 @@ class CalcRelativeDistances(KeyedDataAction):
         else:
             raRotated = np.array(data[self.raKey])
 
-        np.add.at(meanRa, groupId, raRotated)
-        np.add.at(meanDec, groupId, np.array(data[self.decKey]))
-        np.add.at(nObs, groupId, 1)
-
-        meanRa /= nObs
-        meanDec /= nObs
+        meanRa = np.bincount(groupId, weights=raRotated, minlength=nObj) / nObs
+        meanDec = np.bincount(groupId, weights=np.array(data[self.decKey]), minlength=nObj) / nObs
         meanRa += rotation
 
         D = (self.annulus * u.arcmin).to_value(u.degree)
@@ -142,10 +141,18 @@ class CalcRelativeDistances(KeyedDataAction):
 
         # Match this catalog to itself within the radius and then cut
         # to the annulus inner radius.
-        with Matcher(meanRa, meanDec) as m:
-            idx, i1, i2, d = m.query_self(annulus[1], return_indices=True)
-
-        inAnnulus = d > annulus[0]
+        selfMatchRadius = (self.selfMatchRadius * u.arcmin).to_value(u.degree)
+        if selfMatchRadius > 0:
+            if selfMatchRadius < annulus[1]:
+                raise ValueError(
+                    f"selfMatchRadius ({self.selfMatchRadius}) must be at least the outer radius of the "
+                    f"annulus ({self.annulus + self.width / 2})"
+                )
+            i1, i2, d = _sharedSelfMatch(meanRa, meanDec, selfMatchRadius, kwargs.get("actionCache"))
+            inAnnulus = (d > annulus[0]) & (d <= annulus[1])
+        else:
+            i1, i2, d = _selfMatch(meanRa, meanDec, annulus[1])
+            inAnnulus = d > annulus[0]
         i1 = i1[inAnnulus]
         i2 = i2[inAnnulus]
 
@@ -153,36 +160,45 @@ class CalcRelativeDistances(KeyedDataAction):
             return distanceParams
 
         if len(i1) > self.maxPairs:
-            # Downsample the pairs.
+            # Downsample the pairs. The pairs of a shared self-match are put
+            # in a canonical order first, so that the selection does not
+            # depend on its radius.
+            if selfMatchRadius > 0:
+                pairOrder = np.argsort(i1.astype(np.int64) * nObj + i2)
+                i1 = i1[pairOrder]
+                i2 = i2[pairOrder]
             selection = rng.choice(len(i1), size=self.maxPairs, replace=False)
             i1 = i1[selection]
             i2 = i2[selection]
 
-        # Match groups and get indices.
-        h, rev = esutil.stat.histogram(groupId, rev=True)
-
-        # Match together pairs that have the same visit.
-        # It is unfortunate that this requires a loop, but it is not slow.
-        # After this matching we have a set of matchedObsInd1/matchedObsInd2
-        # that are all individual observations that are in the annulus and
-        # share a visit. The matchedPairInd groups all the paired observations
-        # of a given pair.
-        matchedObsInd1 = []
-        matchedObsInd2 = []
-        matchedPairInd = []
-        for ind in range(len(i1)):
-            objInd1 = i1[ind]
-            objInd2 = i2[ind]
-            obsInd1 = rev[rev[objInd1] : rev[objInd1 + 1]]
-            obsInd2 = rev[rev[objInd2] : rev[objInd2 + 1]]
-            a, b = esutil.numpy_util.match(data[self.visitKey][obsInd1], data[self.visitKey][obsInd2])
-            matchedObsInd1.append(obsInd1[a])
-            matchedObsInd2.append(obsInd2[b])
-            matchedPairInd.append(np.full(len(a), ind))
-
-        matchedObsInd1 = np.concatenate(matchedObsInd1)
-        matchedObsInd2 = np.concatenate(matchedObsInd2)
-        matchedPairInd = np.concatenate(matchedPairInd)
+        # Match together the observations of each pair of objects that share
+        # a visit. Sorting the observations by object and then visit makes
+        # the observations of each object a contiguous run ordered by visit.
+        # The observations of the second object of every pair are then looked
+        # up in the runs of the first objects all at once. After this
+        # matching we have a set of matchedObsInd1/matchedObsInd2 that are
+        # all individual observations that are in the annulus and share a
+        # visit. The matchedPairInd groups all the paired observations of a
+        # given pair.
+        _, visitId = np.unique(np.asarray(data[self.visitKey]), return_inverse=True)
+        visitId = visitId.ravel()
+        nVisit = visitId.max() + 1
+        obsKey = groupId.astype(np.int64) * nVisit + visitId
+        obsOrder = np.argsort(obsKey, kind="stable")
+        sortedObsKey = obsKey[obsOrder]
+        objStart = np.concatenate(([0], np.cumsum(nObs)[:-1]))
+
+        nObs2 = nObs[i2]
+        matchedPairInd = np.repeat(np.arange(len(i1)), nObs2)
+        runOffset = np.arange(len(matchedPairInd)) - np.repeat(np.cumsum(nObs2) - nObs2, nObs2)
+        matchedObsInd2 = obsOrder[np.repeat(objStart[i2], nObs2) + runOffset]
+
+        target = i1[matchedPairInd].astype(np.int64) * nVisit + visitId[matchedObsInd2]
+        position = np.minimum(np.searchsorted(sortedObsKey, target), len(sortedObsKey) - 1)
+        found = sortedObsKey[position] == target
+        matchedObsInd1 = obsOrder[position[found]]
+        matchedObsInd2 = matchedObsInd2[found]
+        matchedPairInd = matchedPairInd[found]
 
         separations = sphDist(
             np.deg2rad(np.array(data[self.raKey][matchedObsInd1])),
@@ -192,11 +208,9 @@ class CalcRelativeDistances(KeyedDataAction):
         )
 
         # Compute the mean from the ragged array of pairs by
-        # using np.add.at to sum numerator and denominator.
-        sepMean = np.zeros(len(i1))
-        nSep = np.zeros_like(sepMean, dtype=np.int32)
-        np.add.at(sepMean, matchedPairInd, separations)
-        np.add.at(nSep, matchedPairInd, 1)
+        # summing numerator and denominator per pair.
+        sepMean = np.bincount(matchedPairInd, weights=separations, minlength=len(i1))
+        nSep = np.bincount(matchedPairInd, minlength=len(i1))
         good = nSep > 1
         sepMean[good] /= nSep[good]
         sepMean[~good] = np.nan
@@ -206,11 +220,10 @@ class CalcRelativeDistances(KeyedDataAction):
             return distanceParams
 
         # Compute the stdev with sqrt(sum((sep - mean(sep))**2.)/(nsep - 1))
-        sepStd = np.zeros_like(sepMean)
-        np.add.at(
-            sepStd,
+        sepStd = np.bincount(
             matchedPairInd,
-            (separations - sepMean[matchedPairInd]) ** 2.0,
+            weights=(separations - sepMean[matchedPairInd]) ** 2.0,
+            minlength=len(i1),
         )
         sepStd[good] = np.sqrt(sepStd[good] / (nSep[good] - 1))
         rmsDistances = sepStd[good]
@@ -246,6 +259,33 @@ class CalcRelativeDistances(KeyedDataAction):
         return distanceParams
 
 
+def _selfMatch(ra: np.ndarray, dec: np.ndarray, radius: float) -> tuple[np.ndarray, ...]:
+    """Return the indices and separations, in degrees, of all the pairs of
+    positions within the given radius, in degrees, of each other.
+    """
+    with Matcher(ra, dec) as m:
+        idx, i1, i2, d = m.query_self(radius, return_indices=True)
+    return i1, i2, d
+
+
+def _sharedSelfMatch(
+    ra: np.ndarray, dec: np.ndarray, radius: float, cache: ActionCache | None
+) -> tuple[np.ndarray, ...]:
+    """Return the same results as `_selfMatch`, shared through an
+    `ActionCache`, if there is one, with the other actions matching the same
+    positions within the same radius.
+    """
+    if cache is None:
+        return _selfMatch(ra, dec, radius)
+    # The positions are identified by a digest, so that they are not held
+    # along with the match.
+    digest = hashlib.blake2b(np.ascontiguousarray(ra).tobytes(), digest_size=16)
+    digest.update(np.ascontiguousarray(dec).tobytes())
+    return cache.share(
+        ("selfMatch", radius, len(ra), digest.hexdigest()), lambda: _selfMatch(ra, dec, radius)
+    )
+
+
 def sphDist(ra_mean, dec_mean, ra, dec):
     """Calculate distance on the surface of a unit sphere.
 
@@ -43,6 +43,7 @@ from ...interfaces import (
     ScalarAction,
     Vector,
     VectorAction,
+    VectorStatisticsCache,
 )
 
 
@@ -154,6 +155,12 @@ class KeyedScalars(KeyedDataAction):
 
     def __call__(self, data: KeyedData, **kwargs) -> KeyedData:
         result: KeyedData = {}  # type: ignore
+        # Statistics of the same vector are computed together, along with
+        # those of any cache supplied by the caller.
+        if (statistics := kwargs.get("vectorStatistics")) is None:
+            statistics = VectorStatisticsCache()
+        statistics.plan(self.scalarActions, **kwargs)
+        kwargs = kwargs | {"vectorStatistics": statistics}
         for name, action in self.scalarActions.items():
             result[name] = action(data, **kwargs)
         return result
@@ -51,8 +51,15 @@ import numpy as np
 from lsst.pex.config import ChoiceField, Field
 from lsst.pex.config.configurableActions import ConfigurableActionField
 
-from ...interfaces import KeyedData, KeyedDataSchema, Scalar, ScalarAction, Vector
-from ...math import nanMax, nanMean, nanMedian, nanMin, nanSigmaMad, nanStd
+from ...interfaces import (
+    KeyedData,
+    KeyedDataSchema,
+    QuantileSketch,
+    Scalar,
+    ScalarAction,
+    Vector,
+    VectorStatistics,
+)
 
 log = logging.getLogger(__name__)
 
@@ -68,6 +75,48 @@ def _dataToArray(data):
         return np.array(data)
 
 
+def _getStatistics(vectorKey: str, data: KeyedData, **kwargs) -> VectorStatistics:
+    """Return the statistics of a vector, masked by the ``mask`` keyword
+    argument if there is one.
+
+    The statistics are shared through the `VectorStatisticsCache` passed as
+    the ``vectorStatistics`` keyword argument, if there is one.
+    """
+    key = vectorKey.format(**kwargs)
+    mask = kwargs.get("mask")
+    if (cache := kwargs.get("vectorStatistics")) is not None:
+        return cache.get(key, data[key], mask)
+    return VectorStatistics(data[key], mask)
+
+
+def _getQuantileSketch(
+    vectorKey: str, rankError: float | None, data: KeyedData, **kwargs
+) -> QuantileSketch | None:
+    """Return a sketch of the values of a vector, or `None` if quantiles are
+    to be computed exactly.
+
+    A vector of `QuantileSketch`, for instance of each patch of a tract, is
+    merged into a single sketch whatever the rank error. Otherwise the values
+    are sketched if a rank error is given.
+    """
+    key = vectorKey.format(**kwargs)
+    values = data[key]
+    if isinstance(values, QuantileSketch):
+        return values
+    if isinstance(values, (list, tuple, np.ndarray)) and len(values) > 0:
+        if all(isinstance(value, QuantileSketch) for value in values):
+            # Sketches define __len__, so numpy would treat them as
+            # sequences.
+            sketches = np.empty(len(values), dtype=object)
+            sketches[:] = list(values)
+            if (mask := kwargs.get("mask")) is not None:
+                sketches = sketches[mask]
+            return QuantileSketch.fromSketches(sketches)
+    if rankError is None:
+        return None
+    return _getStatistics(vectorKey, data, **kwargs).quantileSketch(rankError)
+
+
 class ScalarFromVectorAction(ScalarAction):
     """Calculates a statistic from a single vector."""
 
@@ -77,46 +126,70 @@ class ScalarFromVectorAction(ScalarAction):
         return ((self.vectorKey, Vector),)
 
 
-class MedianAction(ScalarFromVectorAction):
+class QuantileFromVectorAction(ScalarFromVectorAction):
+    """Calculates a statistic from the quantiles of a single vector.
+
+    The statistic is estimated from a mergeable `QuantileSketch` if
+    ``sketchRankError`` is set, or if the vector holds sketches of parts of
+    the data.
+    """
+
+    sketchRankError = Field[float](
+        doc="If set, estimate the statistic from a quantile sketch, the ranks of which are typically "
+        "in error by less than this fraction of the number of values, instead of computing it exactly.",
+        optional=True,
+        default=None,
+        check=lambda x: 0 < x < 1,
+    )
+
+    def getQuantileSketch(self, data: KeyedData, **kwargs) -> QuantileSketch | None:
+        """Return a sketch of the values, or `None` if the statistic is to be
+        computed exactly.
+        """
+        return _getQuantileSketch(self.vectorKey, self.sketchRankError, data, **kwargs)
+
+
+class MedianAction(QuantileFromVectorAction):
     """Calculates the median of the given data."""
 
-    def __call__(self, data: KeyedData, **kwargs) -> Scalar:
-        mask = self.getMask(**kwargs)
-        values = _dataToArray(data[self.vectorKey.format(**kwargs)])[mask]
-        med = nanMedian(values) if values.size else np.NaN
+    def getStatisticNames(self) -> tuple[str, ...]:
+        return ("median",) if self.sketchRankError is None else ("quantileSketch",)
 
-        return med
+    def __call__(self, data: KeyedData, **kwargs) -> Scalar:
+        if (sketch := self.getQuantileSketch(data, **kwargs)) is not None:
+            return sketch.quantile(0.5)
+        return _getStatistics(self.vectorKey, data, **kwargs).median
 
 
 class MeanAction(ScalarFromVectorAction):
     """Calculates the mean of the given data."""
 
-    def __call__(self, data: KeyedData, **kwargs) -> Scalar:
-        mask = self.getMask(**kwargs)
-        values = _dataToArray(data[self.vectorKey.format(**kwargs)])[mask]
-        mean = nanMean(values) if values.size else np.NaN
+    def getStatisticNames(self) -> tuple[str, ...]:
+        return ("mean",)
 
-        return mean
+    def __call__(self, data: KeyedData, **kwargs) -> Scalar:
+        return _getStatistics(self.vectorKey, data, **kwargs).mean
 
 
 class StdevAction(ScalarFromVectorAction):
     """Calculates the standard deviation of the given data."""
 
+    def getStatisticNames(self) -> tuple[str, ...]:
+        return ("std",)
+
     def __call__(self, data: KeyedData, **kwargs) -> Scalar:
-        mask = self.getMask(**kwargs)
-        return nanStd(_dataToArray(data[self.vectorKey.format(**kwargs)])[mask])
+        return _getStatistics(self.vectorKey, data, **kwargs).std
 
 
 class RmsAction(ScalarFromVectorAction):
     """Calculates the root mean square of the given data (without subtracting
     the mean as in StdevAction)."""
 
-    def __call__(self, data: KeyedData, **kwargs) -> Scalar:
-        mask = self.getMask(**kwargs)
-        vector = _dataToArray(data[self.vectorKey.format(**kwargs)])[mask]
-        vector = vector[~np.isnan(vector)]
+    def getStatisticNames(self) -> tuple[str, ...]:
+        return ("rms",)
 
-        return np.sqrt(np.mean(vector**2))
+    def __call__(self, data: KeyedData, **kwargs) -> Scalar:
+        return _getStatistics(self.vectorKey, data, **kwargs).rms
 
 
 class ValueAction(ScalarFromVectorAction):
@@ -126,13 +199,16 @@ class ValueAction(ScalarFromVectorAction):
         return cast(Scalar, float(data[self.vectorKey.format(**kwargs)][0]))
 
 
-class SigmaMadAction(ScalarFromVectorAction):
+class SigmaMadAction(QuantileFromVectorAction):
     """Calculates the sigma mad of the given data."""
 
+    def getStatisticNames(self) -> tuple[str, ...]:
+        return ("sigmaMad",) if self.sketchRankError is None else ("quantileSketch",)
+
     def __call__(self, data: KeyedData, **kwargs) -> Scalar:
-        mask = self.getMask(**kwargs)
-        values = _dataToArray(data[self.vectorKey.format(**kwargs)])[mask]
-        return nanSigmaMad(values)
+        if (sketch := self.getQuantileSketch(data, **kwargs)) is not None:
+            return sketch.sigmaMad()
+        return _getStatistics(self.vectorKey, data, **kwargs).sigmaMad
 
 
 class CountAction(ScalarAction):
@@ -164,28 +240,32 @@ class CountAction(ScalarAction):
     def getInputSchema(self) -> KeyedDataSchema:
         return ((self.vectorKey, Vector),)
 
+    def getStatisticNames(self) -> tuple[str, ...]:
+        if self.op == "ne" and np.isnan(self.threshold):
+            return ("count",)
+        return ("count", "values")
+
     def __call__(self, data: KeyedData, **kwargs) -> Scalar:
-        mask = self.getMask(**kwargs)
-        arr = _dataToArray(data[self.vectorKey.format(**kwargs)])[mask]
+        statistics = _getStatistics(self.vectorKey, data, **kwargs)
 
         # Count NaNs and non-NaNs
         if self.threshold == nan:
             if self.op == "eq":
                 # Count number of NaNs
-                result = np.isnan(arr).sum()
-                return cast(Scalar, int(result))
+                return cast(Scalar, statistics.nanCount)
             elif self.op == "ne":
                 # Count number of non-NaNs
-                result = arr.size - np.isnan(arr).sum()
-                return cast(Scalar, int(result))
+                return cast(Scalar, statistics.count)
             else:
                 raise ValueError("Invalid operator for counting NaNs.")
         # Count for given threshold ignoring all NaNs
+        elif self.op == "ne" and np.isnan(self.threshold):
+            # Every value which is not NaN differs from NaN.
+            return cast(Scalar, statistics.count)
         else:
-            result = arr[~np.isnan(arr)]
             result = cast(
                 Scalar,
-                int(np.sum(getattr(operator, self.op)(result, self.threshold))),
+                int(np.sum(getattr(operator, self.op)(statistics.values, self.threshold))),
             )
             return result
 
@@ -203,11 +283,24 @@ class CountUniqueAction(ScalarFromVectorAction):
 class ApproxFloor(ScalarFromVectorAction):
     """Returns the median of the lowest ten values of the sorted input."""
 
+    def getStatisticNames(self) -> tuple[str, ...]:
+        return ("count", "values")
+
     def __call__(self, data: KeyedData, **kwargs) -> Scalar:
-        mask = self.getMask(**kwargs)
-        values = np.sort(_dataToArray(data[self.vectorKey.format(**kwargs)])[mask], axis=None)  # type: ignore
-        x = values.size // 10
-        return nanMedian(values[-x:])
+        statistics = _getStatistics(self.vectorKey, data, **kwargs)
+        x = statistics.size // 10
+        if x == 0:
+            return statistics.median
+        # This is the median of the last tenth of the sorted values, in which
+        # NaN values sort last.
+        n = x - statistics.nanCount
+        if n <= 0:
+            return np.nan
+        start = statistics.count - n
+        lower, upper = statistics.orderStatistics((start + (n - 1) // 2, start + n // 2))
+        # Average in floating point, as numpy does, so that boolean and small
+        # integer values neither saturate nor overflow.
+        return (float(lower) + float(upper)) / 2
 
 
 class FracThreshold(ScalarFromVectorAction):
@@ -239,19 +332,21 @@ class FracThreshold(ScalarFromVectorAction):
         default=False,
     )
 
+    def getStatisticNames(self) -> tuple[str, ...]:
+        return ("count", "median", "values") if self.relative_to_median else ("count", "values")
+
     def __call__(self, data: KeyedData, **kwargs) -> Scalar:
-        mask = self.getMask(**kwargs)
-        values = _dataToArray(data[self.vectorKey.format(**kwargs)])[mask]
-        values = values[np.logical_not(np.isnan(values))]
-        n_values = values.size
+        statistics = _getStatistics(self.vectorKey, data, **kwargs)
+        values = statistics.values
+        n_values = statistics.count
         if n_values == 0:
             return np.nan
         threshold = self.threshold
         # If relative_to_median is set, shift the threshold to be median+thresh
         if self.relative_to_median and values.size > 0:
-            offset = nanMedian(values)
+            offset = statistics.median
             if np.isfinite(offset):
-                values -= offset
+                values = values - offset
         if self.use_absolute_value:
             values = np.abs(values)
         result = cast(
@@ -267,17 +362,21 @@ class FracThreshold(ScalarFromVectorAction):
 class MaxAction(ScalarFromVectorAction):
     """Returns the maximum of the given data."""
 
+    def getStatisticNames(self) -> tuple[str, ...]:
+        return ("max",)
+
     def __call__(self, data: KeyedData, **kwargs) -> Scalar:
-        mask = self.getMask(**kwargs)
-        return nanMax(_dataToArray(data[self.vectorKey.format(**kwargs)])[mask])
+        return _getStatistics(self.vectorKey, data, **kwargs).max
 
 
 class MinAction(ScalarFromVectorAction):
     """Returns the minimum of the given data."""
 
+    def getStatisticNames(self) -> tuple[str, ...]:
+        return ("min",)
+
     def __call__(self, data: KeyedData, **kwargs) -> Scalar:
-        mask = self.getMask(**kwargs)
-        return nanMin(_dataToArray(data[self.vectorKey.format(**kwargs)])[mask])
+        return _getStatistics(self.vectorKey, data, **kwargs).min
 
 
 class FracInRange(ScalarFromVectorAction):
@@ -289,15 +388,16 @@ class FracInRange(ScalarFromVectorAction):
     minimum = Field[float](doc="The minimum value", default=np.nextafter(-np.inf, 0.0))
     percent = Field[bool](doc="Express result as percentage", default=False)
 
+    def getStatisticNames(self) -> tuple[str, ...]:
+        return ("size", "values")
+
     def __call__(self, data: KeyedData, **kwargs) -> Scalar:
-        mask = self.getMask(**kwargs)
-        values = _dataToArray(data[self.vectorKey.format(**kwargs)])[mask]
-        nvalues = values.size
-        values = values[np.logical_not(np.isnan(values))]
+        statistics = _getStatistics(self.vectorKey, data, **kwargs)
+        values = statistics.values
         sel_range = (values >= self.minimum) & (values < self.maximum)
         result = cast(
             Scalar,
-            float(values[sel_range].size / nvalues),  # type: ignore
+            float(np.count_nonzero(sel_range) / statistics.size),  # type: ignore
         )
         if self.percent:
             return 100.0 * result
@@ -310,14 +410,14 @@ class FracNan(ScalarFromVectorAction):
 
     percent = Field[bool](doc="Express result as percentage", default=False)
 
+    def getStatisticNames(self) -> tuple[str, ...]:
+        return ("nanCount",)
+
     def __call__(self, data: KeyedData, **kwargs) -> Scalar:
-        mask = self.getMask(**kwargs)
-        values = _dataToArray(data[self.vectorKey.format(**kwargs)])[mask]
-        nvalues = values.size
-        values = values[np.isnan(values)]
+        statistics = _getStatistics(self.vectorKey, data, **kwargs)
         result = cast(
             Scalar,
-            float(values.size / nvalues),  # type: ignore
+            float(statistics.nanCount / statistics.size),  # type: ignore
         )
         if self.percent:
             return 100.0 * result
@@ -328,10 +428,11 @@ class FracNan(ScalarFromVectorAction):
 class SumAction(ScalarFromVectorAction):
     """Returns the sum of all values in the column."""
 
+    def getStatisticNames(self) -> tuple[str, ...]:
+        return ("sum",)
+
     def __call__(self, data: KeyedData, **kwargs) -> Scalar:
-        mask = self.getMask(**kwargs)
-        arr = _dataToArray(data[self.vectorKey.format(**kwargs)])[mask]
-        return cast(Scalar, np.nansum(arr))
+        return cast(Scalar, _getStatistics(self.vectorKey, data, **kwargs).sum)
 
 
 class MedianHistAction(ScalarAction):
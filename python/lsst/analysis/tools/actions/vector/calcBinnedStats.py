@@ -35,11 +35,19 @@ from .selectors import RangeSelector
 
 
 class CalcBinnedStatsAction(KeyedDataAction):
+    # The band is used to name the outputs.
+    bandDependent = True
+
     key_vector = Field[str](doc="Vector on which to compute statistics")
     name_prefix = Field[str](default="", doc="Field name to append stat names to")
     name_suffix = Field[str](default="", doc="Field name to append to stat names")
     selector_range = ConfigurableActionField[RangeSelector](doc="Range selector")
     return_minmax = Field[bool](default=True, doc="Whether to return the bin minimum and maximum")
+    statistics = ConfigurableActionField[SummaryStatisticAction](
+        doc="Statistics to compute in each bin, the actions of which are applied to key_vector "
+        "whatever vector key they are configured with",
+        default=SummaryStatisticAction,
+    )
 
     def getInputSchema(self, **kwargs) -> KeyedDataSchema:
         yield (self.key_vector, Vector)
@@ -102,10 +110,12 @@ class CalcBinnedStatsAction(KeyedDataAction):
         results[self.name_mask.format(**kwargs_format)] = mask
         kwargs["mask"] = mask
 
-        action = SummaryStatisticAction(vectorKey=self.key_vector)
-        # this is sad, but pex_config seems to have broken behavior that
-        # is dangerous to fix
-        action.setDefaults()
+        # The configured statistics may be frozen, so the key is set on a
+        # copy.
+        action = self.statistics.copy()
+        action.vectorKey = self.key_vector
+        for scalarAction in action.scalarActions:
+            scalarAction.vectorKey = self.key_vector
 
         for name, value in action(data, **kwargs).items():
             results[getattr(self, f"name_{name}").format(**kwargs_format)] = value
@@ -51,7 +51,7 @@ __all__ = (
 )
 
 import operator
-from typing import Optional, cast
+from typing import Any, Optional, cast
 
 import numpy as np
 from lsst.pex.config import Field
@@ -60,6 +60,23 @@ from lsst.pex.config.listField import ListField
 from ...interfaces import KeyedData, KeyedDataSchema, Vector, VectorAction
 from ...math import divide, fluxToMag
 
+# Comparison operators, by the name of the equivalent function in the
+# operator module, which can be applied while reading a dataset.
+_COMPARISONS = {"eq": "==", "ne": "!=", "lt": "<", "le": "<=", "gt": ">", "ge": ">="}
+
+
+def _flagBands(bands: list[str], kwargs: dict) -> tuple[str, ...]:
+    """Return the bands a multi-band flag selector applies its flags in."""
+    match kwargs:
+        case {"band": band} if not bands and bands == []:
+            return (band,)
+        case {"bands": kwargBands} if not bands and bands == []:
+            return tuple(kwargBands)
+        case _ if bands:
+            return tuple(bands)
+        case _:
+            return ("",)
+
 
 class SelectorBase(VectorAction):
     plotLabelKey = Field[str](
@@ -131,6 +148,17 @@ class FlagSelector(VectorAction):
         # The test at the beginning assures this can never be None
         return cast(Vector, results)
 
+    def getRowFilters(self, **kwargs) -> list[tuple[str, str, Any]] | None:
+        if not self.selectWhenFalse and not self.selectWhenTrue:
+            return None
+        try:
+            return [(flag.format(**kwargs), "==", False) for flag in self.selectWhenFalse] + [
+                (flag.format(**kwargs), "==", True) for flag in self.selectWhenTrue
+            ]
+        except KeyError:
+            # The flags are templated on something other than the band.
+            return None
+
 
 class CoaddPlotFlagSelector(FlagSelector):
     """This default setting makes it take the band from
@@ -156,17 +184,7 @@ class CoaddPlotFlagSelector(FlagSelector):
 
     def __call__(self, data: KeyedData, **kwargs) -> Vector:
         result: Optional[Vector] = None
-        bands: tuple[str, ...]
-        match kwargs:
-            case {"band": band} if not self.bands and self.bands == []:
-                bands = (band,)
-            case {"bands": bands} if not self.bands and self.bands == []:
-                bands = bands
-            case _ if self.bands:
-                bands = tuple(self.bands)
-            case _:
-                bands = ("",)
-        for band in bands:
+        for band in _flagBands(self.bands, kwargs):
             temp = super().__call__(data, **(kwargs | dict(band=band)))
             if result is not None:
                 result &= temp  # type: ignore
@@ -174,6 +192,14 @@ class CoaddPlotFlagSelector(FlagSelector):
                 result = temp
         return cast(Vector, result)
 
+    def getRowFilters(self, **kwargs) -> list[tuple[str, str, Any]] | None:
+        filters: list[tuple[str, str, Any]] = []
+        for band in _flagBands(self.bands, kwargs):
+            if (bandFilters := super().getRowFilters(**(kwargs | dict(band=band)))) is None:
+                return None
+            filters.extend(bandFilters)
+        return filters
+
     def setDefaults(self):
         self.selectWhenFalse = [
             "{band}_psfFlux_flag",
@@ -261,10 +287,16 @@ class RangeSelector(SelectorBase):
 
         return cast(Vector, mask)
 
+    def getRowFilters(self, **kwargs) -> list[tuple[str, str, Any]] | None:
+        return [(self.vectorKey, ">=", self.minimum), (self.vectorKey, "<", self.maximum)]
+
 
 class SnSelector(SelectorBase):
     """Selects points that have S/N > threshold in the given flux type."""
 
+    # The band is added to the plot label.
+    bandDependent = True
+
     fluxType = Field[str](doc="Flux type to calculate the S/N in.", default="{band}_psfFlux")
     threshold = Field[float](doc="The S/N threshold to remove sources with.", default=500.0)
     maxSN = Field[float](doc="Maximum S/N to include in the sample (to allow S/N ranges).", default=1e6)
@@ -349,17 +381,7 @@ class SkyObjectSelector(FlagSelector):
 
     def __call__(self, data: KeyedData, **kwargs) -> Vector:
         result: Optional[Vector] = None
-        bands: tuple[str, ...]
-        match kwargs:
-            case {"band": band} if not self.bands and self.bands == []:
-                bands = (band,)
-            case {"bands": bands} if not self.bands and self.bands == []:
-                bands = bands
-            case _ if self.bands:
-                bands = tuple(self.bands)
-            case _:
-                bands = ("",)
-        for band in bands:
+        for band in _flagBands(self.bands, kwargs):
             temp = super().__call__(data, **(kwargs | dict(band=band)))
             if result is not None:
                 result &= temp  # type: ignore
@@ -367,6 +389,14 @@ class SkyObjectSelector(FlagSelector):
                 result = temp
         return cast(Vector, result)
 
+    def getRowFilters(self, **kwargs) -> list[tuple[str, str, Any]] | None:
+        filters: list[tuple[str, str, Any]] = []
+        for band in _flagBands(self.bands, kwargs):
+            if (bandFilters := super().getRowFilters(**(kwargs | dict(band=band)))) is None:
+                return None
+            filters.extend(bandFilters)
+        return filters
+
     def setDefaults(self):
         self.selectWhenFalse = [
             "{band}_pixelFlags_edge",
@@ -514,6 +544,11 @@ class ThresholdSelector(SelectorBase):
         mask = getattr(operator, self.op)(data[self.vectorKey], self.threshold)
         return cast(Vector, mask)
 
+    def getRowFilters(self, **kwargs) -> list[tuple[str, str, Any]] | None:
+        if (comparison := _COMPARISONS.get(self.op)) is None:
+            return None
+        return [(self.vectorKey, comparison, self.threshold)]
+
 
 class BandSelector(VectorAction):
     """Makes a mask for sources observed in a specified set of bands."""
@@ -583,6 +618,9 @@ class ChildObjectSelector(RangeSelector):
 
         return cast(Vector, mask)
 
+    def getRowFilters(self, **kwargs) -> list[tuple[str, str, Any]] | None:
+        return [(self.vectorKey, ">", 0)]
+
 
 class MagSelector(SelectorBase):
     """Selects points that have minMag < mag (AB) < maxMag.
@@ -590,6 +628,9 @@ class MagSelector(SelectorBase):
     The magnitude is based on the given fluxType.
     """
 
+    # The band is added to the plot label.
+    bandDependent = True
+
     fluxType = Field[str](doc="Flux type to calculate the magnitude in.", default="{band}_psfFlux")
     minMag = Field[float](doc="Minimum mag to include in the sample.", default=-1e6)
     maxMag = Field[float](doc="Maximum mag to include in the sample.", default=1e6)
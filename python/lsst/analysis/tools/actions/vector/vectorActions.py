@@ -49,7 +49,7 @@ from lsst.pex.config import DictField, Field
 from lsst.pex.config.configurableActions import ConfigurableActionField, ConfigurableActionStructField
 
 from ...interfaces import KeyedData, KeyedDataSchema, Vector, VectorAction
-from ...math import divide, fluxToMag, log10
+from ...math import GroupIndex, divide, fluxToMag, log10
 from .selectors import VectorSelector
 
 _LOG = logging.getLogger(__name__)
@@ -366,10 +366,24 @@ class AngularSeparation(VectorAction):
 # Statistical vectorActions
 
 
+def _perGroupStatistic(index: GroupIndex, keys: Vector, values: Vector, func: str) -> Vector:
+    """Compute a statistic of the values in each group of an index."""
+    if func in GroupIndex.reductions:
+        return index.reduce(values, func)
+    # Fall back to pandas for any other aggregation it supports, the groups
+    # are ordered in the same way as those of the index.
+    return pd.Series(np.asarray(values)).groupby(np.asarray(keys)).aggregate(func).to_numpy()
+
+
 class PerGroupStatistic(VectorAction):
     """Compute per-group statistic values and return result as a vector with
     one element per group. The computed statistic can be any function accepted
     by pandas DataFrameGroupBy.aggregate passed in as a string function name.
+
+    The statistics supported by `~lsst.analysis.tools.math.GroupIndex`
+    (including ``sigmaMad``, which is not a pandas function) are computed
+    without pandas, using a grouping of the rows which is shared with every
+    other action grouping the same key vector.
     """
 
     groupKey = Field[str](doc="Column key to use for forming groups", default="obj_index")
@@ -380,9 +394,9 @@ class PerGroupStatistic(VectorAction):
         return tuple(self.buildAction.getInputSchema()) + ((self.groupKey, Vector),)
 
     def __call__(self, data: KeyedData, **kwargs) -> Vector:
-        df = pd.DataFrame({"groupKey": data[self.groupKey], "value": self.buildAction(data, **kwargs)})
-        result = df.groupby("groupKey")["value"].aggregate(self.func)
-        return np.array(result)
+        keys = data[self.groupKey]
+        values = self.buildAction(data, **kwargs)
+        return _perGroupStatistic(GroupIndex.fromKeys(keys), keys, values, self.func)
 
 
 class ResidualWithPerGroupStatistic(VectorAction):
@@ -397,14 +411,10 @@ class ResidualWithPerGroupStatistic(VectorAction):
         return tuple(self.buildAction.getInputSchema()) + ((self.groupKey, Vector),)
 
     def __call__(self, data: KeyedData, **kwargs) -> Vector:
+        keys = data[self.groupKey]
         values = self.buildAction(data, **kwargs)
-        df = pd.DataFrame({"groupKey": data[self.groupKey], "value": values})
-        result = df.groupby("groupKey")["value"].aggregate(self.func)
-
-        joinedDf = df.join(result, on="groupKey", validate="m:1", lsuffix="_individual", rsuffix="_group")
-
-        result = joinedDf["value_individual"] - joinedDf["value_group"]
-        return np.array(result)
+        index = GroupIndex.fromKeys(keys)
+        return np.asarray(values) - index.broadcast(_perGroupStatistic(index, keys, values, self.func))
 
 
 class IsMatchedObjectSameClass(VectorAction):
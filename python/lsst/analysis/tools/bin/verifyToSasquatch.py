@@ -27,12 +27,20 @@ import argparse
 import copy
 import datetime
 import logging
-from collections import defaultdict
-from collections.abc import Iterable, Mapping
+import os
+import time
+from collections import defaultdict, deque
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
 
 import lsst.verify
 from lsst.analysis.tools.interfaces import MetricMeasurementBundle
-from lsst.analysis.tools.interfaces.datastore import SasquatchDispatcher
+from lsst.analysis.tools.interfaces.datastore import (
+    SasquatchDispatcher,
+    SasquatchDispatchPartialFailure,
+    SasquatchSpool,
+)
 from lsst.daf.butler import Butler, DataCoordinate, DatasetRef
 
 logging.basicConfig()
@@ -89,6 +97,25 @@ def makeParser():
         "multiple times.",
     )
 
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="The number of metric values to read, and of requests to make to Sasquatch, at once "
+        "(default: 1).",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=100,
+        help="The number of bundles of metric values to upload together (default: 100).",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        help="Path of a file recording the bundles which have been uploaded. Bundles already recorded "
+        "there are skipped, so an interrupted upload may be resumed by running the same command again.",
+    )
+
     api_group = parser.add_argument_group("Sasquatch API arguments")
     api_group.add_argument(
         "--namespace",
@@ -102,6 +129,12 @@ def makeParser():
         help=f"Root URL of Sasquatch proxy server (default: {_BASE_URL}).",
     )
     api_group.add_argument("--token", default="na", help="Authentication token for the proxy server.")
+    api_group.add_argument(
+        "--spool",
+        help="Path of a local spool file to write the metric values to before uploading them. Entries "
+        "already in the spool, including any left by a SasquatchDatastore or an earlier interrupted "
+        "upload, are sent as well, and any which cannot be sent are kept for a later run.",
+    )
 
     return parser
 
@@ -161,8 +194,148 @@ class _AppendDict(argparse.Action):
         setattr(namespace, self.dest, mapping)
 
 
+def _fetch_metric(butler: Butler, ref: DatasetRef) -> lsst.verify.Measurement:
+    """Read a metric value, using its relative (unqualified) name.
+
+    Parameters
+    ----------
+    butler : `lsst.daf.butler.Butler`
+        The Butler repository containing the metric value.
+    ref : `lsst.daf.butler.DatasetRef`
+        The ``MetricValue`` dataset.
+
+    Returns
+    -------
+    value : `lsst.verify.Measurement`
+        The metric value.
+    """
+    value = butler.get(ref)
+    # MeasurementMetricBundle doesn't validate input.
+    if not isinstance(value, lsst.verify.Measurement):
+        raise ValueError(f"{ref} is not a metric value.")
+
+    # HACK: in general, metric names are fully qualified, and this becomes
+    # the InfluxDB field name. lsst.verify-style metrics have unique names
+    # already, so remove the package qualification.
+    return lsst.verify.Measurement(
+        value.metric_name.metric, value.quantity, value.blobs.values(), value.extras, value.notes
+    )
+
+
+def _fetch_metrics(
+    butler: Butler, refs: Sequence[DatasetRef], workers: int = 1
+) -> Iterator[tuple[DatasetRef, lsst.verify.Measurement]]:
+    """Read metric values, several at once.
+
+    Parameters
+    ----------
+    butler : `lsst.daf.butler.Butler`
+        The Butler repository containing the metric values.
+    refs : `~collections.abc.Sequence` [`lsst.daf.butler.DatasetRef`]
+        The ``MetricValue`` datasets.
+    workers : `int`, optional
+        The number of metric values to read at once.
+
+    Yields
+    ------
+    ref : `lsst.daf.butler.DatasetRef`
+        Each dataset, in the order given.
+    value : `lsst.verify.Measurement`
+        Its metric value, see `_fetch_metric`.
+    """
+    if workers <= 1:
+        for ref in refs:
+            yield ref, _fetch_metric(butler, ref)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Bound the number of values read ahead of those yielded.
+        pending: deque[tuple[DatasetRef, Future]] = deque()
+        for ref in refs:
+            pending.append((ref, executor.submit(_fetch_metric, butler, ref)))
+            if len(pending) >= 4 * workers:
+                ref, future = pending.popleft()
+                yield ref, future.result()
+        while pending:
+            ref, future = pending.popleft()
+            yield ref, future.result()
+
+
+def _group_metrics(
+    metricValues: Iterable[DatasetRef], skip: Iterable[str] = ()
+) -> Mapping[tuple[str, str, DataCoordinate], list[DatasetRef]]:
+    """Group metric values by the bundle they belong in.
+
+    Parameters
+    ----------
+    metricValues : `~collections.abc.Iterable` [`lsst.daf.butler.DatasetRef`]
+        The datasets to bundle.
+    skip : `~collections.abc.Iterable` [`str`], optional
+        The `_bundle_name` of bundles to leave out.
+
+    Returns
+    -------
+    groups : `~collections.abc.Mapping`
+        The datasets of each bundle, keyed by a tuple of (run, dataset type,
+        data ID).
+    """
+    skip = set(skip)
+    groups: defaultdict[tuple[str, str, DataCoordinate], list[DatasetRef]] = defaultdict(list)
+    for ref in metricValues:
+        key = (ref.run, ref.datasetType.name, ref.dataId)
+        if _bundle_name(key) not in skip:
+            groups[key].append(ref)
+    return groups
+
+
+def _bundle_name(key: tuple[str, str, DataCoordinate]) -> str:
+    """Return a string identifying a bundle, such as in a checkpoint file."""
+    run, datasetType, dataId = key
+    return f"{run}/{datasetType}/{dataId}"
+
+
+def _iter_bundles(
+    butler: Butler, groups: Mapping[tuple[str, str, DataCoordinate], list[DatasetRef]], workers: int = 1
+) -> Iterator[tuple[tuple[str, str, DataCoordinate], MetricMeasurementBundle]]:
+    """Read metric values into bundles, yielding each bundle as soon as its
+    values have been read.
+
+    Parameters
+    ----------
+    butler : `lsst.daf.butler.Butler`
+        The Butler repository containing the metric values.
+    groups : `~collections.abc.Mapping`
+        The datasets of each bundle, as returned by `_group_metrics`.
+    workers : `int`, optional
+        The number of metric values to read at once.
+
+    Yields
+    ------
+    key : `tuple`
+        The run, dataset type and data ID of the bundle.
+    bundle : `lsst.analysis.tools.interfaces.MetricMeasurementBundle`
+        The bundle.
+    """
+    refs = [ref for group in groups.values() for ref in group]
+    remaining = {key: len(group) for key, group in groups.items()}
+    bundles: defaultdict[tuple[str, str, DataCoordinate], MetricMeasurementBundle] = defaultdict(
+        MetricMeasurementBundle
+    )
+    for ref, value in _fetch_metrics(butler, refs, workers):
+        # These metrics weren't created by actions. Sasquatch requires that
+        # each actionId produce the same metrics on every run (see
+        # https://sasquatch.lsst.io/user-guide/avro.html), so choose something
+        # unique to the metric.
+        actionId = value.metric_name.metric
+
+        key = (ref.run, ref.datasetType.name, ref.dataId)
+        bundles[key].setdefault(actionId, []).append(value)
+        remaining[key] -= 1
+        if not remaining[key]:
+            yield key, bundles.pop(key)
+
+
 def _bundle_metrics(
-    butler: Butler, metricValues: Iterable[DatasetRef]
+    butler: Butler, metricValues: Iterable[DatasetRef], workers: int = 1
 ) -> Mapping[tuple[str, str, DataCoordinate], MetricMeasurementBundle]:
     """Organize free metric values into metric bundles while preserving as much
     information as practical.
@@ -174,6 +347,8 @@ def _bundle_metrics(
     metricValues : `~collections.abc.Iterable` [`lsst.daf.butler.DatasetRef`]
         The datasets to bundle. All references must point to ``MetricValue``
         datasets.
+    workers : `int`, optional
+        The number of metric values to read at once.
 
     Returns
     -------
@@ -186,28 +361,109 @@ def _bundle_metrics(
         (unqualified) names even if the input measurements were
         fully-qualified.
     """
-    bundles = defaultdict(MetricMeasurementBundle)
-    for ref in metricValues:
-        value = butler.get(ref)
-        # MeasurementMetricBundle doesn't validate input.
-        if not isinstance(value, lsst.verify.Measurement):
-            raise ValueError(f"{ref} is not a metric value.")
-
-        # HACK: in general, metric names are fully qualified, and this becomes
-        # the InfluxDB field name. lsst.verify-style metrics have unique names
-        # already, so remove the package qualification.
-        value = lsst.verify.Measurement(
-            value.metric_name.metric, value.quantity, value.blobs.values(), value.extras, value.notes
-        )
-        # These metrics weren't created by actions. Sasquatch requires that
-        # each actionId produce the same metrics on every run (see
-        # https://sasquatch.lsst.io/user-guide/avro.html), so choose something
-        # unique to the metric.
-        actionId = value.metric_name.metric
+    return dict(_iter_bundles(butler, _group_metrics(metricValues), workers))
 
-        bundle = bundles[(ref.run, ref.datasetType.name, ref.dataId)]
-        bundle.setdefault(actionId, []).append(value)
-    return bundles
+
+class _Progress:
+    """Log the progress of an upload at regular intervals.
+
+    Parameters
+    ----------
+    total : `int`
+        The number of bundles to upload.
+    interval : `float`, optional
+        The minimum number of seconds between messages.
+    """
+
+    def __init__(self, total: int, interval: float = 10.0):
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self._start = self._last = time.monotonic()
+
+    def update(self, count: int) -> None:
+        """Record that bundles have been uploaded.
+
+        Parameters
+        ----------
+        count : `int`
+            The number of bundles.
+        """
+        self.done += count
+        now = time.monotonic()
+        if now - self._last >= self.interval or self.done == self.total:
+            self._last = now
+            _LOG.info(
+                "Uploaded %d of %d bundles (%.1f bundles/s).",
+                self.done,
+                self.total,
+                self.done / max(now - self._start, 1e-9),
+            )
+
+
+def _read_checkpoint(path: str | None) -> set[str]:
+    """Read the names of the bundles recorded in a checkpoint file, if it
+    exists.
+    """
+    if path is None or not os.path.exists(path):
+        return set()
+    with open(path) as checkpoint:
+        return {line.rstrip("\n") for line in checkpoint if line.strip()}
+
+
+def _upload(
+    batch: Sequence[tuple[tuple[str, str, DataCoordinate], MetricMeasurementBundle]],
+    dispatcher: SasquatchDispatcher,
+    spool: SasquatchSpool | None,
+    args: argparse.Namespace,
+) -> int:
+    """Upload a batch of bundles, or add them to a spool, and record them in
+    the checkpoint file.
+
+    Returns
+    -------
+    failed : `int`
+        The number of bundles with records which were not sent. Those bundles
+        are not recorded in the checkpoint file, so are retried when the
+        upload is resumed. Bundles from which records or fields which could
+        not be encoded were left out are recorded, as retrying them would
+        leave out the same ones.
+    """
+    arguments: list[tuple[MetricMeasurementBundle, dict[str, Any]]] = [
+        (
+            bundle,
+            dict(
+                run=run,
+                datasetType=datasetType,
+                timestamp=args.date_created,
+                datasetIdentifier=args.dataset,
+                identifierFields=dataId,
+                extraFields=args.extra,
+            ),
+        )
+        for (run, datasetType, dataId), bundle in batch
+    ]
+    unsent: frozenset[int] = frozenset()
+    if spool is not None:
+        # Bundles are keyed as the SasquatchDatastore keys them, so that a
+        # dataset spooled by both is only sent once.
+        for bundle, kwargs in arguments:
+            spool.putBundle(bundle, **kwargs)
+    else:
+        try:
+            dispatcher.dispatchBundles(arguments)
+        except SasquatchDispatchPartialFailure as err:
+            unsent = frozenset(range(len(batch))) if err.unsent is None else err.unsent
+            if unsent:
+                _LOG.error("Failed to upload %d of a batch of %d bundles: %s", len(unsent), len(batch), err)
+            else:
+                _LOG.warning("Records or fields of a batch of %d bundles were left out: %s", len(batch), err)
+    if args.checkpoint:
+        with open(args.checkpoint, "a") as checkpoint:
+            checkpoint.writelines(
+                f"{_bundle_name(key)}\n" for position, (key, _) in enumerate(batch) if position not in unsent
+            )
+    return len(unsent)
 
 
 def main():
@@ -220,16 +476,32 @@ def main():
     metricValues = butler.registry.queryDatasets(metricTypes, where=args.where, findFirst=True)
     _LOG.info("Found %d metric values in %s.", metricValues.count(), args.collections)
 
-    bundles = _bundle_metrics(butler, metricValues)
-    dispatcher = SasquatchDispatcher(url=args.base_url, token=args.token, namespace=args.namespace)
+    uploaded = _read_checkpoint(args.checkpoint)
+    if uploaded:
+        _LOG.info("Skipping %d bundles already uploaded according to %s.", len(uploaded), args.checkpoint)
+    groups = _group_metrics(metricValues, skip=uploaded)
+
+    dispatcher = SasquatchDispatcher(
+        url=args.base_url, token=args.token, namespace=args.namespace, maxWorkers=args.workers
+    )
+    spool = SasquatchSpool(args.spool, dispatcher) if args.spool else None
     _LOG.info("Uploading to %s @ %s...", args.namespace, args.base_url)
-    for (run, datasetType, dataId), bundle in bundles.items():
-        dispatcher.dispatch(
-            bundle,
-            run=run,
-            datasetType=datasetType,
-            timestamp=args.date_created,
-            datasetIdentifier=args.dataset,
-            identifierFields=dataId,
-            extraFields=args.extra,
-        )
+    progress = _Progress(len(groups))
+    failed = 0
+    batch = []
+    for key, bundle in _iter_bundles(butler, groups, args.workers):
+        batch.append((key, bundle))
+        if len(batch) >= args.batch_size:
+            failed += _upload(batch, dispatcher, spool, args)
+            progress.update(len(batch))
+            batch = []
+    if batch:
+        failed += _upload(batch, dispatcher, spool, args)
+        progress.update(len(batch))
+    if failed:
+        _LOG.warning("%d bundles were not uploaded in full.", failed)
+
+    if spool is not None:
+        _LOG.info("Sent %d spooled bundles.", spool.flush())
+        if remaining := len(spool):
+            _LOG.warning("%d bundles could not be sent and remain in %s.", remaining, args.spool)
@@ -19,9 +19,16 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+from ._actionCache import *
 from ._actions import *
 from ._analysisTools import *
+from ._arrowKeyedData import *
 from ._interfaces import *
+from ._maskedKeyedData import *
 from ._metricMeasurementBundle import *
+from ._planner import *
+from ._quantileSketch import *
 from ._stages import *
+from ._streaming import *
 from ._task import *
+from ._vectorStatistics import *
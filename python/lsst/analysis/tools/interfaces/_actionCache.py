@@ -0,0 +1,545 @@
+# This file is part of analysis_tools.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+__all__ = ("ActionCache", "ActionCacheStats", "evaluateAction")
+
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterable, Mapping, MutableMapping
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+from lsst.pex.config import Config
+from lsst.pex.config.configurableActions import ConfigurableActionStruct
+
+from ._actions import AnalysisAction
+from ._interfaces import KeyedData
+from ._maskedKeyedData import MaskedKeyedData
+
+# Keyword arguments which never influence the value an action computes, or
+# which are handled explicitly by the cache.
+_IGNORED_KWARGS = frozenset(("plotInfo", "metric_tags", "actionCache", "vectorStatistics"))
+
+_PRIMITIVES = (str, int, float, bool, type(None))
+
+_ROOT_TOKEN = ("root",)
+
+
+class _TaggedData(dict):
+    """A `dict` of data derived from the input of an `ActionCache`, tagged
+    with a token which uniquely describes how it was derived.
+    """
+
+    __slots__ = ("cacheToken",)
+
+
+def _describe(value: Any, types: set[type]) -> str:
+    """Describe a configuration value, including the types of any nested
+    configurations, accumulating the nested types into ``types``.
+    """
+    match value:
+        case Config():
+            types.add(type(value))
+            fields = ", ".join(f"{name}={_describe(v, types)}" for name, v in value.items())
+            return f"{type(value).__module__}.{type(value).__qualname__}({fields})"
+        case ConfigurableActionStruct():
+            return "{" + ", ".join(f"{name}: {_describe(v, types)}" for name, v in value.items()) + "}"
+        case _:
+            return repr(value)
+
+
+def _sizeOf(value: Any) -> int:
+    """Estimate the memory held by a cached value."""
+    match value:
+        case np.ndarray():
+            return value.nbytes
+        case Mapping():
+            return sum(_sizeOf(v) for v in value.values())
+        case tuple() | list():
+            return sum(_sizeOf(v) for v in value)
+        case _:
+            return sys.getsizeof(value)
+
+
+def _copy(value: Any) -> Any:
+    """Copy the array values of a result, so that the copy held by the cache
+    is not modified by consumers writing to theirs, and consumers do not
+    modify arrays the cache does not own.
+    """
+    match value:
+        case np.ndarray():
+            return value.copy()
+        case dict():
+            return {k: _copy(v) for k, v in value.items()}
+    return value
+
+
+@dataclass
+class ActionCacheStats:
+    """Summary of the activity of an `ActionCache`."""
+
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    nbytes: int
+
+    @property
+    def hitRate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ActionCache:
+    r"""Memoize the results of `AnalysisAction`\ s evaluated on the input data
+    of a single quantum.
+
+    Many `AnalysisTool`\ s configured on the same task evaluate identical
+    actions (for instance the same flag or signal to noise selectors) on the
+    same input data. This cache keys results on the configuration of an
+    action along with the formatted keyword arguments (band, etc.) it was
+    called with, so each distinct action is evaluated only once.
+
+    Results are only cached when an action is evaluated on the data the cache
+    was created for, or on data derived from it which was tagged with
+    `tagSelection` (such as the output of a `BasePrep`). Keyword arguments
+    which are not simple values are only considered part of a key if they
+    were supplied when the cache was created, as those objects are guaranteed
+    to be constant for the lifetime of the cache. Calls with any other keyword
+    arguments (such as a ``mask``) bypass the cache.
+
+    The cache holds its own copy of array results, and each consumer receives
+    another copy, so that consumers may modify the arrays they receive.
+    Entries are evicted in least recently used order once the total memory
+    held exceeds ``maxBytes``.
+
+    A plan of expected evaluations, such as one made with an `ActionPlanner`,
+    may be supplied with `setPlan`. In that case only results which will be
+    requested more than once are cached, and each is released as soon as its
+    last expected consumer has received it.
+
+    Parameters
+    ----------
+    data : `KeyedData`
+        The data which cached actions will be evaluated on.
+    maxBytes : `int`, optional
+        Maximum number of bytes the cached results may hold, if `None` the
+        size of the cache is unbounded.
+    **kwargs
+        Keyword arguments that will be passed to every action evaluated with
+        this cache, such as the inputs of a task.
+    """
+
+    def __init__(self, data: KeyedData, maxBytes: int | None = None, **kwargs: Any):
+        self._data = data
+        self.maxBytes = maxBytes
+        # Hold references to the constant kwargs so their ids can not be
+        # reused by other objects during the lifetime of the cache.
+        self._constants: dict[str, Any] = {
+            key: value
+            for key, value in kwargs.items()
+            if key not in _IGNORED_KWARGS and not isinstance(value, _PRIMITIVES)
+        }
+        self._actionKeys: dict[int, tuple[AnalysisAction, tuple[str, bool]]] = {}
+        self._plan: dict[Hashable, int] | None = None
+        self._entries: OrderedDict[Hashable, tuple[Any, dict[str, Any], int]] = OrderedDict()
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._nbytes = 0
+
+    @property
+    def stats(self) -> ActionCacheStats:
+        """The current hit, miss, and memory statistics of the cache."""
+        with self._lock:
+            return ActionCacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                entries=len(self._entries),
+                nbytes=self._nbytes,
+            )
+
+    def clear(self) -> None:
+        """Remove all entries from the cache."""
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def _actionKey(self, action: AnalysisAction) -> tuple[str, bool]:
+        """Return a description of the configuration of an action, and
+        whether its result depends on the band.
+        """
+        if (cached := self._actionKeys.get(id(action))) is not None:
+            return cached[1]
+        types: set[type] = set()
+        description = _describe(action, types)
+        bandDependent = "{band}" in description or any(getattr(t, "bandDependent", False) for t in types)
+        # Only frozen configurations are guaranteed not to change, so only
+        # remember the key for those.
+        if action._frozen:
+            self._actionKeys[id(action)] = (action, (description, bandDependent))
+        return description, bandDependent
+
+    def _kwargsKey(self, kwargs: Mapping[str, Any], bandDependent: bool = True) -> tuple | None:
+        items = []
+        for name in sorted(kwargs):
+            if name in _IGNORED_KWARGS or (name == "band" and not bandDependent):
+                continue
+            value = kwargs[name]
+            if isinstance(value, _PRIMITIVES):
+                items.append((name, value))
+            elif isinstance(value, (list, tuple)) and all(isinstance(v, _PRIMITIVES) for v in value):
+                items.append((name, tuple(value)))
+            elif self._constants.get(name) is value:
+                items.append((name, id(value)))
+            else:
+                return None
+        return tuple(items)
+
+    def dataToken(self, data: KeyedData) -> tuple[Hashable, frozenset[str]] | None:
+        """Return the token identifying how data was derived from the input
+        of the cache, along with the keys which were masked in the derivation.
+
+        Parameters
+        ----------
+        data : `KeyedData`
+            The data to identify.
+
+        Returns
+        -------
+        token : `tuple` or `None`
+            The token and masked keys, or `None` if the data is not known to
+            the cache.
+        """
+        if data is self._data:
+            return _ROOT_TOKEN, frozenset()
+        if isinstance(data, (_TaggedData, MaskedKeyedData)):
+            return data.cacheToken
+        return None
+
+    def selectionToken(
+        self, parentToken: Hashable, selectors: Iterable[AnalysisAction], **kwargs: Any
+    ) -> Hashable | None:
+        """Return the token for data selected from data identified by
+        ``parentToken`` with the combination of the given selectors.
+
+        Parameters
+        ----------
+        parentToken : `~collections.abc.Hashable`
+            The token of the data the selection was made from.
+        selectors : `~collections.abc.Iterable` of `AnalysisAction`
+            The selectors which were combined to make the selection.
+        **kwargs
+            The keyword arguments the selectors were called with.
+
+        Returns
+        -------
+        token : `~collections.abc.Hashable` or `None`
+            The token, or `None` if the selection can not be identified.
+        """
+        selectorKeys = [self._actionKey(s) for s in selectors]
+        bandDependent = any(dependent for _, dependent in selectorKeys)
+        if (kwargsKey := self._kwargsKey(kwargs, bandDependent)) is None:
+            return None
+        return ("selection", parentToken, tuple(sorted(key for key, _ in selectorKeys)), kwargsKey)
+
+    def tagSelection(
+        self,
+        selected: Mapping[str, Any],
+        parent: KeyedData,
+        selectors: Iterable[AnalysisAction],
+        maskedKeys: Iterable[str],
+        **kwargs: Any,
+    ) -> KeyedData:
+        """Tag data selected from data known to the cache, so that actions
+        evaluated on it may be cached.
+
+        Parameters
+        ----------
+        selected : `~collections.abc.Mapping`
+            The selected data. A `MaskedKeyedData` is tagged in place, any
+            other mapping is copied into a tagged `dict`.
+        parent : `KeyedData`
+            The data the selection was made from.
+        selectors : `~collections.abc.Iterable` of `AnalysisAction`
+            The selectors which were combined to make the selection.
+        maskedKeys : `~collections.abc.Iterable` of `str`
+            The keys in ``selected`` which had the selection applied, any
+            other keys are taken from ``parent`` unmodified.
+        **kwargs
+            The keyword arguments the selectors were called with.
+
+        Returns
+        -------
+        selected : `KeyedData`
+            The selected data, tagged if its derivation could be identified.
+        """
+        if (parentToken := self.dataToken(parent)) is None:
+            return selected
+        if (token := self.selectionToken(parentToken[0], selectors, **kwargs)) is None:
+            return selected
+        if isinstance(selected, MaskedKeyedData):
+            selected.cacheToken = (token, frozenset(maskedKeys))
+            return selected
+        result = _TaggedData(selected)
+        result.cacheToken = (token, frozenset(maskedKeys))
+        return result
+
+    def nodeKey(
+        self, action: AnalysisAction, token: Hashable, maskedKeys: frozenset[str], **kwargs: Any
+    ) -> Hashable | None:
+        """Return the key a call of an action on data identified by a token
+        would be cached with.
+
+        Parameters
+        ----------
+        action : `AnalysisAction`
+            The action to be called.
+        token : `~collections.abc.Hashable`
+            The token of the data the action is to be called with.
+        maskedKeys : `frozenset` of `str`
+            The keys of the data which had a selection applied.
+        **kwargs
+            The keyword arguments the action is to be called with.
+
+        Returns
+        -------
+        key : `~collections.abc.Hashable` or `None`
+            The key for the call, or `None` if the call can not be cached.
+        """
+        description, bandDependent = self._actionKey(action)
+        if (kwargsKey := self._kwargsKey(kwargs, bandDependent)) is None:
+            return None
+        if token == _ROOT_TOKEN:
+            return (description, kwargsKey, token)
+        # A key may be present in selected data either with or without the
+        # selection applied, so this must be part of the key.
+        inputs = tuple(
+            sorted((key, key in maskedKeys) for key, _ in action.getFormattedInputSchema(**kwargs))
+        )
+        return (description, kwargsKey, token, inputs)
+
+    def makeKey(self, action: AnalysisAction, data: KeyedData, **kwargs: Any) -> Hashable | None:
+        """Return the key a call of an action would be cached with.
+
+        Parameters
+        ----------
+        action : `AnalysisAction`
+            The action to be called.
+        data : `KeyedData`
+            The data the action is to be called with.
+        **kwargs
+            The keyword arguments the action is to be called with.
+
+        Returns
+        -------
+        key : `~collections.abc.Hashable` or `None`
+            The key for the call, or `None` if the call can not be cached.
+        """
+        if (token := self.dataToken(data)) is None:
+            return None
+        return self.nodeKey(action, token[0], token[1], **kwargs)
+
+    def setPlan(self, useCounts: Mapping[Hashable, int] | None) -> None:
+        """Restrict the cache to a plan of expected evaluations.
+
+        Parameters
+        ----------
+        useCounts : `~collections.abc.Mapping` or `None`
+            Mapping of cache keys to the number of times each is expected to
+            be evaluated. Only keys expected more than once are cached, and
+            their results are released after the expected number of uses.
+            If `None` any existing plan is removed.
+        """
+        with self._lock:
+            self._plan = None if useCounts is None else {k: n for k, n in useCounts.items() if n > 1}
+
+    def evaluate(self, action: AnalysisAction, data: KeyedData, **kwargs: Any) -> Any:
+        """Call an action, returning a cached result if one exists.
+
+        Any values an action adds to the ``plotInfo`` keyword argument while
+        it is evaluated are recorded and replayed for subsequent cache hits,
+        so that plot labels are unaffected by caching.
+
+        Parameters
+        ----------
+        action : `AnalysisAction`
+            The action to call.
+        data : `KeyedData`
+            The data to call the action with.
+        **kwargs
+            Keyword arguments to call the action with.
+
+        Returns
+        -------
+        result : `Any`
+            The result of calling the action.
+        """
+        if (key := self.makeKey(action, data, **kwargs)) is None:
+            return action(data, **kwargs)
+        plotInfo = kwargs.get("plotInfo")
+        with self._lock:
+            entry, store = self._lookup(key)
+        if entry is not None:
+            if isinstance(plotInfo, MutableMapping):
+                plotInfo.update(entry[1])
+            return _copy(entry[0])
+        if not store:
+            return action(data, **kwargs)
+
+        before = dict(plotInfo) if isinstance(plotInfo, MutableMapping) else {}
+        result = action(data, **kwargs)
+        plotUpdates: dict[str, Any] = {}
+        if isinstance(plotInfo, MutableMapping):
+            plotUpdates = {k: v for k, v in plotInfo.items() if k not in before or before[k] is not v}
+        self._insert(key, _copy(result), plotUpdates)
+        return result
+
+    def release(self, action: AnalysisAction, data: KeyedData, **kwargs: Any) -> None:
+        """Record that an evaluation of an action expected by the plan will
+        not be made, releasing its result if no other uses remain.
+
+        Parameters
+        ----------
+        action : `AnalysisAction`
+            The action which will not be called.
+        data : `KeyedData`
+            The data it would have been called with.
+        **kwargs
+            The keyword arguments it would have been called with.
+        """
+        if self._plan is None or (key := self.makeKey(action, data, **kwargs)) is None:
+            return
+        with self._lock:
+            if (remaining := self._plan.get(key)) is None:
+                return
+            if remaining > 1:
+                self._plan[key] = remaining - 1
+                return
+            del self._plan[key]
+            if (entry := self._entries.pop(key, None)) is not None:
+                self._nbytes -= entry[2]
+
+    def share(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Return a value computed by an action which other actions may
+        share, computing it only if it is not already cached.
+
+        This is for intermediate values, such as a match of positions, which
+        actions configured differently compute identically. Such values are
+        cached whatever the plan, until they are evicted or the cache is
+        discarded.
+
+        Parameters
+        ----------
+        key : `~collections.abc.Hashable`
+            A key describing everything the value depends on.
+        compute : `~collections.abc.Callable`
+            A function of no arguments computing the value.
+
+        Returns
+        -------
+        value : `Any`
+            The value, which is not copied so must not be modified.
+        """
+        key = ("shared", key)
+        with self._lock:
+            if (entry := self._entries.get(key)) is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+            self._misses += 1
+        # The lock is not held while computing, so that other threads are not
+        # blocked; a value computed by two threads at once is stored once.
+        value = compute()
+        self._insert(key, value, {}, planned=False)
+        return value
+
+    def _lookup(self, key: Hashable) -> tuple[tuple[Any, dict[str, Any], int] | None, bool]:
+        """Find the entry for a key, returning it along with whether a newly
+        computed result for the key should be stored. Must be called with the
+        lock held.
+        """
+        release = False
+        if self._plan is not None:
+            if (remaining := self._plan.get(key)) is None:
+                # Not expected to be shared, so not worth holding.
+                return None, False
+            if remaining > 1:
+                self._plan[key] = remaining - 1
+            else:
+                # This is the last expected use, so release the result.
+                del self._plan[key]
+                release = True
+        if release:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._nbytes -= entry[2]
+        elif (entry := self._entries.get(key)) is not None:
+            self._entries.move_to_end(key)
+        if entry is not None:
+            self._hits += 1
+        else:
+            self._misses += 1
+        return entry, not release
+
+    def _insert(self, key: Hashable, value: Any, plotUpdates: dict[str, Any], planned: bool = True) -> None:
+        size = _sizeOf(value)
+        with self._lock:
+            if key in self._entries or (self.maxBytes is not None and size > self.maxBytes):
+                return
+            if planned and self._plan is not None and key not in self._plan:
+                # All the expected uses happened while this was computed.
+                return
+            self._entries[key] = (value, plotUpdates, size)
+            self._nbytes += size
+            while self.maxBytes is not None and self._nbytes > self.maxBytes:
+                _, (_, _, evictedSize) = self._entries.popitem(last=False)
+                self._nbytes -= evictedSize
+                self._evictions += 1
+
+
+def evaluateAction(action: AnalysisAction, data: KeyedData, **kwargs: Any) -> Any:
+    """Call an action, using the `ActionCache` supplied in the keyword
+    arguments with the name ``actionCache`` if there is one.
+
+    Parameters
+    ----------
+    action : `AnalysisAction`
+        The action to call.
+    data : `KeyedData`
+        The data to call the action with.
+    **kwargs
+        Keyword arguments to call the action with.
+
+    Returns
+    -------
+    result : `Any`
+        The result of calling the action.
+    """
+    if (cache := kwargs.get("actionCache")) is None:
+        return action(data, **kwargs)
+    return cache.evaluate(action, data, **kwargs)
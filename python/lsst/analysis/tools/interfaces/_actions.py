@@ -40,7 +40,7 @@ __all__ = (
 import warnings
 from abc import abstractmethod
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Iterable
+from typing import TYPE_CHECKING, Any, Iterable
 
 import lsst.pex.config as pexConfig
 from lsst.pex.config.configurableActions import ConfigurableAction, ConfigurableActionField
@@ -63,6 +63,14 @@ class AnalysisAction(ConfigurableAction):
         if "getInputSchema" not in dir(cls):
             raise NotImplementedError(f"Class {cls} must implement method getInputSchema")
 
+    bandDependent: bool = False
+    """Whether the result of this action depends on the ``band`` keyword
+    argument in ways other than through ``{band}`` templates in its
+    configuration, for instance by reading the band directly or by adding it
+    to a plot label. This is used to determine which results may be shared
+    between bands.
+    """
+
     # This is a descriptor that functions like a function in most contexts
     # and can be treated as such
     applyContext = ContextApplier()
@@ -158,6 +166,28 @@ class VectorAction(AnalysisAction):
     def __call__(self, data: KeyedData, **kwargs) -> Vector:
         raise NotImplementedError("This is not implemented on the base class")
 
+    def getRowFilters(self, **kwargs) -> list[tuple[str, str, Any]] | None:
+        """Return comparisons which select the same rows as the boolean
+        mask returned when this action is called with the same arguments.
+
+        This allows selections to be applied while a dataset is read, see
+        `AnalysisPipelineTask.loadData`. Actions which do not return a mask,
+        or whose mask can not be expressed this way, should return `None`.
+
+        Parameters
+        ----------
+        **kwargs
+            The keyword arguments the action would be called with.
+
+        Returns
+        -------
+        filters : `list` of `tuple` [`str`, `str`, `~typing.Any`] or `None`
+            Comparisons of the form ``(column, operator, value)``, where
+            operator is one of ``==``, ``!=``, ``<``, ``<=``, ``>`` or
+            ``>=``, which must all be true for a row to be selected.
+        """
+        return None
+
 
 class TensorAction(AnalysisAction):
     """A `TensorAction` is an `AnalysisAction` that returns a `Tensor` when
@@ -191,6 +221,26 @@ class ScalarAction(AnalysisAction):
         """
         raise NotImplementedError("This is not implemented on the base class")
 
+    def getStatisticNames(self) -> Iterable[str]:
+        """Return the names of the statistics of the vector keyed by this
+        action's ``vectorKey`` that its result is computed from.
+
+        Actions returning names here read the statistics from a
+        `VectorStatistics`, which they obtain from the
+        `VectorStatisticsCache` passed in their keyword arguments as
+        ``vectorStatistics`` if there is one. Callers invoking several actions
+        on the same data may plan them with such a cache, so that the vector
+        is masked and stripped of NaN values once, and all of the statistics
+        needed are computed together.
+
+        Returns
+        -------
+        names : `Iterable` [`str`]
+            Names from `VectorStatistics.statistics`, which are empty for
+            actions not using shared statistics.
+        """
+        return ()
+
     def getMask(self, **kwargs) -> Vector | slice:
         """Extract a mask if one is passed as key word args, otherwise return
         an empty slice object that can still be used in a getitem call.
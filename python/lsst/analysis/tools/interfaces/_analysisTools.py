@@ -36,6 +36,7 @@ from lsst.pex.config.configurableActions import ConfigurableActionField
 from lsst.pipe.base import Pipeline
 from lsst.verify import Measurement
 
+from ._actionCache import ActionCache
 from ._actions import AnalysisAction, JointAction, JointResults, NoPlot, PlotAction
 from ._interfaces import KeyedData, KeyedDataSchema, KeyedResults, PlotTypes
 from ._stages import BasePrep, BaseProcess, BaseProduce
@@ -157,7 +158,33 @@ class AnalysisTool(AnalysisAction):
     key/value.
     """
 
+    batchBands: bool | Field[bool] = False
+    """If this value is set to True, calling this `AnalysisTool` for multiple
+    bands evaluates the prep and process stage actions which do not depend on
+    the band only once, sharing their results between the bands through an
+    `ActionCache`. This has no effect if the caller supplies its own
+    ``actionCache`` keyword argument, which is then used instead.
+
+    The evaluations of all the bands are planned before the first is made,
+    so that only results used by more than one band are held, each released
+    after its last use, as when an `AnalysisPipelineTask` plans its actions.
+    """
+
+    batchBandsMaxMemory: int | Field[int] = 4096
+    """The maximum memory, in MiB, the results shared between bands may hold
+    when ``batchBands`` is True. Least recently used results are evicted once
+    this is exceeded. Values less than 1 impose no limit.
+    """
+
     def __call__(self, data: KeyedData, **kwargs) -> KeyedResults:
+        return self._callBands(self._call_single, data, **kwargs)
+
+    def _callBands(
+        self, function: Callable[..., KeyedResults], data: KeyedData | None, **kwargs
+    ) -> KeyedResults:
+        """Call a function in place of `_call_single` for each band the tool
+        is run in, merging the results as `__call__` does.
+        """
         bands = kwargs.pop("bands", None)
         if "plotInfo" in kwargs and kwargs.get("plotInfo") is not None:
             if "plotName" not in kwargs["plotInfo"] or kwargs["plotInfo"]["plotName"] is None:
@@ -167,13 +194,23 @@ class AnalysisTool(AnalysisAction):
                 # Some tasks require a "band" key for naming. This shouldn't
                 # affect the results. DM-35813 should make this unnecessary.
                 kwargs["band"] = "analysisTools"
-            return self._call_single(data, **kwargs)
+            return function(data, **kwargs)
+        if self.batchBands and len(bands) > 1 and kwargs.get("actionCache") is None:
+            # Imported here as the planner depends on this module.
+            from ._planner import ActionPlanner
+
+            maxMemory = self.batchBandsMaxMemory
+            cache = ActionCache(data, maxBytes=maxMemory * 2**20 if maxMemory > 0 else None, **kwargs)
+            cache.setPlan(
+                ActionPlanner(cache).plan({self.identity or "": self}, bands=bands, **kwargs).useCounts()
+            )
+            kwargs["actionCache"] = cache
         results: KeyedResults = {}
         for band in bands:
             kwargs["band"] = band
             if "plotInfo" in kwargs:
                 kwargs["plotInfo"]["bands"] = band
-            subResult = self._call_single(data, **kwargs)
+            subResult = function(data, **kwargs)
             for key, value in subResult.items():
                 match value:
                     case PlotTypes():
@@ -0,0 +1,116 @@
+# This file is part of analysis_tools.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+__all__ = ("ArrowKeyedData",)
+
+from collections.abc import Iterator, MutableMapping
+from typing import Any
+
+import numpy as np
+import pyarrow as pa
+
+from ._interfaces import Vector
+
+
+def _toNumpy(array: pa.Array) -> np.ndarray:
+    """Convert an arrow array to numpy, without copying where possible."""
+    if pa.types.is_fixed_size_list(array.type):
+        # Multidimensional columns are stored as (possibly nested) fixed size
+        # lists of their flattened values.
+        values = _toNumpy(array.flatten())
+        return values.reshape(len(array), array.type.list_size, *values.shape[1:])
+    try:
+        return array.to_numpy(zero_copy_only=True)
+    except pa.ArrowInvalid:
+        # Booleans (which arrow packs into bits), arrays with nulls, and
+        # non-primitive types must be copied.
+        return array.to_numpy(zero_copy_only=False)
+
+
+class ArrowKeyedData(MutableMapping[str, Any]):
+    """`KeyedData` backed by the columns of an arrow table.
+
+    Each column is converted to a numpy `Vector` the first time its key is
+    read, after which the converted vector is kept for subsequent reads.
+    Numeric columns held in a single chunk without nulls are exposed as read
+    only views of the arrow buffers, so no data is copied. Other columns are
+    copied once.
+
+    Values may be assigned, these shadow the columns of the table and do not
+    modify it.
+
+    Parameters
+    ----------
+    table : `pyarrow.Table`
+        The table holding the data.
+    """
+
+    def __init__(self, table: pa.Table):
+        self._table = table
+        self._keys = dict.fromkeys(table.column_names)
+        self._values: dict[str, Any] = {}
+
+    @property
+    def table(self) -> pa.Table:
+        """The table holding the data (`pyarrow.Table`)."""
+        return self._table
+
+    @property
+    def numRows(self) -> int:
+        """The number of rows in the table (`int`)."""
+        return self._table.num_rows
+
+    def __getitem__(self, key: str) -> Vector:
+        if key in self._values:
+            return self._values[key]
+        if key not in self._keys:
+            raise KeyError(key)
+        column = self._table.column(key)
+        if column.num_chunks == 1:
+            value = _toNumpy(column.chunk(0))
+        else:
+            value = _toNumpy(column.combine_chunks())
+        self._values[key] = value
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._keys[key] = None
+        self._values[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self._keys:
+            raise KeyError(key)
+        del self._keys[key]
+        self._values.pop(key, None)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._keys
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(keys={list(self._keys)}, rows={self.numRows})"
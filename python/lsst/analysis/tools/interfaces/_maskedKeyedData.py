@@ -0,0 +1,142 @@
+# This file is part of analysis_tools.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+__all__ = ("MaskedKeyedData",)
+
+from collections.abc import Hashable, Iterable, Iterator, MutableMapping
+from typing import Any
+
+import numpy as np
+
+from ._interfaces import KeyedData, Vector
+
+
+class MaskedKeyedData(MutableMapping[str, Any]):
+    """A lazily evaluated view of selected rows of `KeyedData`.
+
+    Rather than copying every selected vector up front, the rows of a vector
+    are only gathered the first time its key is read, after which the
+    gathered vector is kept for subsequent reads. Keys which are not masked
+    are passed through from the parent data unmodified.
+
+    Values may be assigned to the view, these shadow the parent data and do
+    not modify it.
+
+    Parameters
+    ----------
+    data : `KeyedData`
+        The parent data to select rows from.
+    keys : `~collections.abc.Iterable` of `str`
+        The keys of ``data`` which are accessible through this view.
+    maskedKeys : `~collections.abc.Iterable` of `str`
+        The subset of ``keys`` which should have the selection applied.
+    index : `Vector` of `int`, optional
+        The indices of the selected rows. If `None`, no selection is applied
+        to any key.
+    """
+
+    def __init__(
+        self,
+        data: KeyedData,
+        keys: Iterable[str],
+        maskedKeys: Iterable[str],
+        index: Vector | None = None,
+    ):
+        self._data = data
+        self._keys = dict.fromkeys(keys)
+        self._maskedKeys = frozenset(maskedKeys)
+        self._index = index
+        self._values: dict[str, Any] = {}
+        self.cacheToken: tuple[Hashable, frozenset[str]] | None = None
+        """Token identifying the derivation of this view along with the keys
+        which were masked, used by an `ActionCache` (`tuple` or `None`).
+        """
+
+    @property
+    def index(self) -> Vector | None:
+        """The indices of the selected rows, or `None` if there is no
+        selection (`Vector` or `None`).
+        """
+        return self._index
+
+    @property
+    def maskedKeys(self) -> frozenset[str]:
+        """The keys which have the selection applied (`frozenset` [`str`])."""
+        return self._maskedKeys if self._index is not None else frozenset()
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._values:
+            return self._values[key]
+        if key not in self._keys:
+            raise KeyError(key)
+        value = self._data[key]
+        if self._index is not None and key in self._maskedKeys:
+            # Positional indexing is required, which pandas only supports
+            # through iloc.
+            value = value.iloc[self._index] if hasattr(value, "iloc") else value[self._index]
+        self._values[key] = value
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._keys[key] = None
+        self._values[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self._keys:
+            raise KeyError(key)
+        del self._keys[key]
+        self._values.pop(key, None)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._keys
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __repr__(self) -> str:
+        rows = "all" if self._index is None else len(self._index)
+        return f"{type(self).__name__}(keys={list(self._keys)}, rows={rows})"
+
+    @staticmethod
+    def combineMasks(index: Vector | None, mask: Vector) -> Vector:
+        """Restrict an index of selected rows to those also selected by a
+        boolean mask.
+
+        Parameters
+        ----------
+        index : `Vector` of `int` or `None`
+            The current selection, `None` if all rows are selected.
+        mask : `Vector` of `bool`
+            Mask of all rows, `True` where a row is selected.
+
+        Returns
+        -------
+        index : `Vector` of `int`
+            The indices of rows selected by both ``index`` and ``mask``.
+        """
+        if index is None:
+            return np.flatnonzero(mask)
+        return index[np.asarray(mask)[index]]
@@ -0,0 +1,186 @@
+# This file is part of analysis_tools.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+__all__ = ("ActionNode", "ActionGraph", "ActionPlanner")
+
+from collections.abc import Hashable, Iterable, Iterator, Mapping
+from dataclasses import dataclass, field
+from typing import Any
+
+from ._actionCache import _ROOT_TOKEN, ActionCache
+from ._actions import AnalysisAction
+from ._analysisTools import AnalysisTool
+from ._stages import BasePrep, BaseProcess
+
+
+@dataclass
+class ActionNode:
+    """A single distinct evaluation in an `ActionGraph`."""
+
+    key: Hashable
+    """The key identifying this evaluation, this is the key the result will
+    be cached with in an `ActionCache`.
+    """
+
+    action: AnalysisAction | None
+    """The action to evaluate, or `None` if this node represents the
+    selection made by a prep stage.
+    """
+
+    consumers: list[str] = field(default_factory=list)
+    """The names of the tools which request this evaluation, a name appears
+    once for each band the tool is evaluated in.
+    """
+
+    @property
+    def uses(self) -> int:
+        """The number of times this evaluation is requested."""
+        return len(self.consumers)
+
+
+@dataclass
+class ActionGraph:
+    r"""The evaluations made by the prep and process stages of a set of
+    `AnalysisTool`\ s, with structurally identical evaluations merged into
+    single nodes.
+    """
+
+    nodes: dict[Hashable, ActionNode] = field(default_factory=dict)
+    """Mapping of node key to node."""
+
+    requests: int = 0
+    """The number of evaluations the tools would make without merging."""
+
+    def add(self, key: Hashable, action: AnalysisAction | None, consumer: str) -> None:
+        """Add a requested evaluation, merging it with any existing identical
+        evaluation.
+        """
+        if (node := self.nodes.get(key)) is None:
+            node = self.nodes[key] = ActionNode(key, action)
+        node.consumers.append(consumer)
+        self.requests += 1
+
+    def useCounts(self) -> dict[Hashable, int]:
+        """Return the number of times each action node will be requested,
+        suitable for `ActionCache.setPlan`.
+        """
+        return {key: node.uses for key, node in self.nodes.items() if node.action is not None}
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+
+class ActionPlanner:
+    r"""Build the merged `ActionGraph` of the prep and process stages of a
+    set of `AnalysisTool`\ s.
+
+    Each `AnalysisTool` normally evaluates its own prep, process, and produce
+    chain independently, so tools which differ only in their produce stage
+    repeat all of the same selections and computations. The planner walks
+    the selectors of each `BasePrep` and the build actions of each
+    `BaseProcess` for every band a tool will be evaluated in, identifying
+    each evaluation with the key an `ActionCache` would store it under. As
+    identical evaluations share a key they are merged into a single node.
+
+    The planner only plans how long results are cached; the tools still
+    evaluate their own stages. Supplying the `ActionGraph.useCounts` of the
+    resulting graph to an `ActionCache` with `ActionCache.setPlan` causes
+    each merged node to be evaluated once per band when first requested,
+    held only while further requests for it are outstanding, and never
+    cached at all if only one tool requests it.
+
+    Tools with stages other than `BasePrep` and `BaseProcess`, or which
+    propagate their input data, are evaluated as normal and contribute no
+    nodes for the stages the planner does not understand.
+
+    Parameters
+    ----------
+    cache : `ActionCache`
+        The cache the plan will be executed with, used to create the keys of
+        the nodes.
+    """
+
+    def __init__(self, cache: ActionCache):
+        self.cache = cache
+
+    @staticmethod
+    def _toolKwargs(
+        tool: AnalysisTool, bands: Iterable[str] | None, kwargs: Mapping[str, Any]
+    ) -> Iterator[dict[str, Any]]:
+        # This mirrors how AnalysisTool.__call__ sets up each call.
+        base = {key: value for key, value in kwargs.items() if key != "bands"}
+        if not tool.parameterizedBand or bands is None:
+            base.setdefault("band", "analysisTools")
+            yield base
+            return
+        for band in bands:
+            yield base | {"band": band}
+
+    def plan(
+        self, tools: Mapping[str, AnalysisTool], bands: Iterable[str] | None = None, **kwargs: Any
+    ) -> ActionGraph:
+        """Build the merged graph of evaluations made by the given tools.
+
+        Parameters
+        ----------
+        tools : `~collections.abc.Mapping` of `str` to `AnalysisTool`
+            The tools to plan, keyed by name.
+        bands : `~collections.abc.Iterable` of `str`, optional
+            The bands parameterized tools will be evaluated in.
+        **kwargs
+            Any other keyword arguments the tools will be called with.
+
+        Returns
+        -------
+        graph : `ActionGraph`
+            The merged graph of evaluations.
+        """
+        graph = ActionGraph()
+        bands = None if bands is None else list(bands)
+        for name, tool in tools.items():
+            if not isinstance(tool.prep, BasePrep):
+                continue
+            for toolKwargs in self._toolKwargs(tool, bands, kwargs):
+                self._planTool(graph, name, tool, toolKwargs)
+        return graph
+
+    def _planTool(self, graph: ActionGraph, name: str, tool: AnalysisTool, kwargs: dict[str, Any]) -> None:
+        prep: BasePrep = tool.prep
+        selectorKeys = []
+        for selector in prep.selectors:
+            if (key := self.cache.nodeKey(selector, _ROOT_TOKEN, frozenset(), **kwargs)) is None:
+                return
+            graph.add(key, selector, name)
+            selectorKeys.append(key)
+        if (token := self.cache.selectionToken(_ROOT_TOKEN, prep.selectors, **kwargs)) is None:
+            return
+        graph.add(token, None, name)
+
+        if tool.propagateData or not isinstance(tool.process, BaseProcess):
+            return
+        maskedKeys = (
+            frozenset(key.format_map(kwargs) for key in prep.vectorKeys) if selectorKeys else frozenset()
+        )
+        for action in tool.process.buildActions:
+            if (key := self.cache.nodeKey(action, token, maskedKeys, **kwargs)) is not None:
+                graph.add(key, action, name)
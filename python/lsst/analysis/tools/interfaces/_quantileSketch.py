@@ -0,0 +1,345 @@
+# This file is part of analysis_tools.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+__all__ = ("QuantileSketch",)
+
+import json
+from collections.abc import Iterable
+from typing import Any
+
+import numpy as np
+import scipy.stats as sps
+
+from ._interfaces import Vector
+
+
+def _weightedQuantile(values: np.ndarray, weights: np.ndarray, q: float) -> float:
+    """Return the value below which a fraction ``q`` of the total weight of
+    sorted values lies.
+    """
+    cumulative = np.cumsum(weights)
+    index = np.searchsorted(cumulative, q * cumulative[-1], side="right")
+    return float(values[min(index, values.size - 1)])
+
+
+class QuantileSketch:
+    """A mergeable sketch of the distribution of the non-NaN values of a
+    stream of vectors, from which quantiles may be estimated.
+
+    This is a KLL sketch (Karnin, Lang & Liberty 2016). Values are held in a
+    hierarchy of compactors, in which each value at level ``h`` stands for
+    ``2**h`` of the values added. Once a level holds more values than its
+    capacity they are sorted, and every other one is promoted to the next
+    level, starting from a random offset. The capacity of the highest level
+    is ``k``, and the capacities of the levels below decrease geometrically,
+    so a sketch holds ``O(k)`` values however many it has been given. The
+    rank of a quantile estimate is typically in error by less than ``2 / k``
+    of the number of values, see `fromRankError`.
+
+    Until the values given exceed the capacity of a single level they are
+    all held, and quantiles are exact.
+
+    Sketches of different parts of a dataset, for instance of each patch of
+    a tract, may be merged to estimate quantiles of the whole. Sketches are
+    serialized with `json`, and restored with `parse_obj`.
+
+    Parameters
+    ----------
+    k : `int`, optional
+        The capacity of the highest level, which sets the accuracy of the
+        sketch.
+    seed : `int`, optional
+        Seed of the random offsets used when compacting, so that sketches of
+        the same values are identical.
+    """
+
+    def __init__(self, k: int = 200, seed: int | None = 0):
+        if k < 2:
+            raise ValueError(f"The sketch capacity must be at least 2, not {k}")
+        self.k = k
+        self.count = 0
+        """The number of values added to the sketch (`int`)."""
+        self.min = np.nan
+        """The smallest value added to the sketch (`float`)."""
+        self.max = np.nan
+        """The largest value added to the sketch (`float`)."""
+        self._levels: list[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    @classmethod
+    def fromRankError(cls, rankError: float, seed: int | None = 0) -> QuantileSketch:
+        """Construct a sketch whose quantile estimates have ranks typically
+        in error by less than a given fraction of the number of values.
+
+        Parameters
+        ----------
+        rankError : `float`
+            The fractional error in rank.
+        seed : `int`, optional
+            Seed of the random offsets used when compacting.
+
+        Returns
+        -------
+        sketch : `QuantileSketch`
+            An empty sketch.
+        """
+        if not 0 < rankError < 1:
+            raise ValueError(f"The rank error must be between 0 and 1, not {rankError}")
+        return cls(max(int(np.ceil(2 / rankError)), 2), seed)
+
+    @classmethod
+    def fromSketches(cls, sketches: Iterable[QuantileSketch], seed: int | None = 0) -> QuantileSketch:
+        """Merge sketches into a new sketch.
+
+        Parameters
+        ----------
+        sketches : `~collections.abc.Iterable` [`QuantileSketch`]
+            The sketches to merge, which are not modified.
+        seed : `int`, optional
+            Seed of the random offsets used when compacting.
+
+        Returns
+        -------
+        sketch : `QuantileSketch`
+            A sketch of all the values the sketches were given, with the
+            largest capacity of any of them.
+        """
+        sketches = list(sketches)
+        result = cls(max((sketch.k for sketch in sketches), default=200), seed)
+        for sketch in sketches:
+            result.merge(sketch)
+        return result
+
+    @property
+    def json(self) -> str:
+        """The sketch serialized as JSON (`str`)."""
+        return json.dumps(
+            {
+                "k": self.k,
+                "count": self.count,
+                "min": None if np.isnan(self.min) else self.min,
+                "max": None if np.isnan(self.max) else self.max,
+                "levels": [items.tolist() for items in self._levels],
+            }
+        )
+
+    @classmethod
+    def parse_obj(cls, data: dict[str, Any], seed: int | None = 0) -> QuantileSketch:
+        """Restore a sketch from the decoded contents of its `json`.
+
+        Parameters
+        ----------
+        data : `dict` [`str`, `~typing.Any`]
+            The decoded JSON.
+        seed : `int`, optional
+            Seed of the random offsets used when compacting, for values
+            added to the restored sketch.
+
+        Returns
+        -------
+        sketch : `QuantileSketch`
+            The restored sketch.
+        """
+        sketch = cls(data["k"], seed)
+        sketch.count = data["count"]
+        sketch.min = np.nan if data["min"] is None else data["min"]
+        sketch.max = np.nan if data["max"] is None else data["max"]
+        sketch._levels = [np.array(items, dtype=float) for items in data["levels"]] or [np.empty(0)]
+        return sketch
+
+    def __len__(self) -> int:
+        return sum(level.size for level in self._levels)
+
+    @property
+    def exact(self) -> bool:
+        """Whether every value added is still held, so quantiles are exact
+        (`bool`).
+        """
+        return len(self._levels) == 1
+
+    def update(self, values: Vector) -> None:
+        """Add values to the sketch, NaN values are ignored.
+
+        Parameters
+        ----------
+        values : `Vector`
+            The values to add.
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if not values.size:
+            return
+        self._extend(values.size, float(values.min()), float(values.max()))
+        self._levels[0] = np.concatenate((self._levels[0], values))
+        self._compress()
+
+    def merge(self, other: QuantileSketch) -> None:
+        """Add the values summarized by another sketch to this one.
+
+        Parameters
+        ----------
+        other : `QuantileSketch`
+            The sketch to merge, which is not modified.
+        """
+        if not other.count:
+            return
+        self._extend(other.count, other.min, other.max)
+        for level, items in enumerate(other._levels):
+            if level == len(self._levels):
+                self._levels.append(items.copy())
+            else:
+                self._levels[level] = np.concatenate((self._levels[level], items))
+        self._compress()
+
+    def _extend(self, count: int, minimum: float, maximum: float) -> None:
+        self.count += count
+        self.min = minimum if np.isnan(self.min) else min(self.min, minimum)
+        self.max = maximum if np.isnan(self.max) else max(self.max, maximum)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self._levels) - level - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self) -> None:
+        # Adding a level reduces the capacity of those below, so repeat until
+        # every level fits.
+        compacted = True
+        while compacted:
+            compacted = False
+            for level in range(len(self._levels)):
+                items = self._levels[level]
+                if items.size <= self._capacity(level):
+                    continue
+                if level + 1 == len(self._levels):
+                    self._levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd value out stays at this level, so that the total
+                # weight of the sketch is conserved.
+                kept = items.size % 2
+                promoted = items[kept + self._rng.integers(2) :: 2]
+                self._levels[level] = items[:kept]
+                self._levels[level + 1] = np.concatenate((self._levels[level + 1], promoted))
+                compacted = True
+
+    def items(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return the values held by the sketch with their weights.
+
+        Returns
+        -------
+        values : `numpy.ndarray`
+            The values held, in ascending order.
+        weights : `numpy.ndarray`
+            The number of values added which each held value stands for.
+        """
+        values = np.concatenate(self._levels)
+        weights = np.concatenate(
+            [np.full(items.size, 2**level, dtype=np.int64) for level, items in enumerate(self._levels)]
+        )
+        order = np.argsort(values, kind="stable")
+        return values[order], weights[order]
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile of the values added.
+
+        Parameters
+        ----------
+        q : `float`
+            The quantile, between 0 and 1.
+
+        Returns
+        -------
+        value : `float`
+            The estimated quantile, or NaN if no values have been added. This
+            is interpolated as by `numpy.quantile` while the sketch is exact.
+        """
+        if not 0 <= q <= 1:
+            raise ValueError(f"Quantiles must be between 0 and 1, not {q}")
+        if not self.count:
+            return np.nan
+        if q == 0:
+            return self.min
+        if q == 1:
+            return self.max
+        if self.exact:
+            return float(np.quantile(self._levels[0], q))
+        return _weightedQuantile(*self.items(), q)
+
+    def rank(self, value: float) -> float:
+        """Estimate the fraction of the values added which are less than or
+        equal to a value.
+
+        Parameters
+        ----------
+        value : `float`
+            The value.
+
+        Returns
+        -------
+        rank : `float`
+            The estimated fraction, or NaN if no values have been added.
+        """
+        if not self.count:
+            return np.nan
+        values, weights = self.items()
+        return float(weights[: np.searchsorted(values, value, side="right")].sum() / self.count)
+
+    def deviationQuantile(self, center: float, q: float) -> float:
+        """Estimate a quantile of the absolute deviations of the values added
+        from a center, such as the median.
+
+        Parameters
+        ----------
+        center : `float`
+            The value deviations are measured from.
+        q : `float`
+            The quantile, between 0 and 1.
+
+        Returns
+        -------
+        value : `float`
+            The estimated quantile of the deviations, or NaN if no values have
+            been added.
+        """
+        if not self.count:
+            return np.nan
+        if self.exact:
+            return float(np.quantile(np.abs(self._levels[0] - center), q))
+        values, weights = self.items()
+        deviations = np.abs(values - center)
+        order = np.argsort(deviations, kind="stable")
+        return _weightedQuantile(deviations[order], weights[order], q)
+
+    def sigmaMad(self) -> float:
+        """Estimate the median absolute deviation of the values added, scaled
+        to the standard deviation of a normal distribution.
+
+        Returns
+        -------
+        sigmaMad : `float`
+            The estimate, or NaN if no values have been added or their median
+            is not finite.
+        """
+        median = self.quantile(0.5)
+        if not np.isfinite(median):
+            return np.nan
+        return self.deviationQuantile(median, 0.5) / sps.norm.ppf(0.75)
@@ -23,16 +23,18 @@ from __future__ import annotations
 __all__ = ("BasePrep", "BaseProcess", "BaseMetricAction", "BaseProduce")
 
 import logging
-from collections import abc
-from typing import Any, Mapping, cast
+from collections import ChainMap, abc
+from typing import Any, Mapping
 
 import astropy.units as apu
+from astropy.table import Table
 from healsparse import HealSparseMap
 from lsst.pex.config import ListField
 from lsst.pex.config.configurableActions import ConfigurableActionStructField
 from lsst.pex.config.dictField import DictField
 from lsst.verify import Measurement
 
+from ._actionCache import evaluateAction
 from ._actions import (
     AnalysisAction,
     JointAction,
@@ -44,6 +46,8 @@ from ._actions import (
     VectorAction,
 )
 from ._interfaces import KeyedData, KeyedDataSchema, KeyedDataTypes, Scalar, Vector
+from ._maskedKeyedData import MaskedKeyedData
+from ._vectorStatistics import VectorStatisticsCache
 
 _LOG = logging.getLogger(__name__)
 
@@ -74,26 +78,35 @@ class BasePrep(KeyedDataAction):
         )
 
     def __call__(self, data: KeyedData, **kwargs) -> KeyedData:
-        mask: Vector | None = None
-        for selector in self.selectors:
-            subMask = selector(data, **kwargs)
-            if mask is None:
-                mask = subMask
-            else:
-                mask *= subMask  # type: ignore
-        result: dict[str, Any] = {}
+        # The selection is accumulated as an index of selected rows, which
+        # only ever shrinks, rather than as a full length boolean mask.
+        index: Vector | None = None
+        selectors = list(self.selectors)
+        for position, selector in enumerate(selectors):
+            index = MaskedKeyedData.combineMasks(index, evaluateAction(selector, data, **kwargs))
+            if len(index) == 0:
+                # Nothing further can be selected. The evaluations a plan
+                # expects of the remaining selectors will not be made, so
+                # their results must not be held for them.
+                if (cache := kwargs.get("actionCache")) is not None:
+                    for skipped in selectors[position + 1 :]:
+                        cache.release(skipped, data, **kwargs)
+                break
+        # Membership of an astropy Table compares against its rows, not its
+        # column names.
+        columns = data.colnames if isinstance(data, Table) else data
+        keys = []
         for key in sorted(set(self.keysToLoad).union(self.vectorKeys)):
             formattedKey = key.format_map(kwargs)
-            result[formattedKey] = cast(Vector, data[formattedKey])
-        if mask is not None:
-            # Convert to ordered set to avoid formatting duplicate keys
-            # multiple times
-            formattedKeys = list({key.format_map(kwargs): None for key in self.vectorKeys}.keys())
-            for tempFormat in formattedKeys:
-                # ignore type since there is not fully proper mypy support for
-                # vector type casting. In the future there will be, and this
-                # makes it clearer now what type things should be.
-                result[tempFormat] = cast(Vector, result[tempFormat])[mask]  # type: ignore
+            if formattedKey not in columns:
+                raise KeyError(f"Key {formattedKey} could not be found in input data")
+            keys.append(formattedKey)
+        # Vectors are only gathered when they are read.
+        result = MaskedKeyedData(data, keys, (key.format_map(kwargs) for key in self.vectorKeys), index)
+        if (cache := kwargs.get("actionCache")) is not None:
+            # Identify how the result was derived, so actions evaluated on it
+            # can be shared with other tools making the same selection.
+            return cache.tagSelection(result, data, self.selectors, result.maskedKeys, **kwargs)
         return result
 
     def addInputSchema(self, inputSchema: KeyedDataSchema) -> None:
@@ -157,28 +170,41 @@ class BaseProcess(KeyedDataAction):
                     yield from outSchema
 
     def __call__(self, data: KeyedData, **kwargs) -> KeyedData:
-        action: AnalysisAction
-        results = {}
-        data = dict(data)
-        for name, action in self.buildActions.items():
-            match action(data, **kwargs):
+        # Statistics supplied by the caller are only for the calculate
+        # actions.
+        statistics = kwargs.pop("vectorStatistics", None)
+        results = self._build(data, **kwargs)
+        view2 = ChainMap(dict(results), data)
+        # Scalar actions computing statistics of the same vector share them.
+        if statistics is None:
+            statistics = VectorStatisticsCache()
+        statistics.plan(self.calculateActions, **kwargs)
+        calcKwargs = kwargs | {"vectorStatistics": statistics}
+        for name, calcAction in self.calculateActions.items():
+            match calcAction(view2, **calcKwargs):
                 case abc.Mapping() as item:
                     for key, result in item.items():
                         results[key] = result
                 case item:
                     results[name] = item
-        view1 = data | results
-        for name, action in self.filterActions.items():
-            match action(view1, **kwargs):
+        return results
+
+    def _build(self, data: KeyedData, **kwargs) -> dict[str, Any]:
+        """Return the results of the build and filter actions."""
+        action: AnalysisAction
+        results = {}
+        for name, action in self.buildActions.items():
+            match evaluateAction(action, data, **kwargs):
                 case abc.Mapping() as item:
                     for key, result in item.items():
                         results[key] = result
                 case item:
                     results[name] = item
-
-        view2 = data | results
-        for name, calcAction in self.calculateActions.items():
-            match calcAction(view2, **kwargs):
+        # Use views rather than copies of the data, so that only the vectors
+        # which are read are materialized.
+        view1 = ChainMap(dict(results), data)
+        for name, action in self.filterActions.items():
+            match action(view1, **kwargs):
                 case abc.Mapping() as item:
                     for key, result in item.items():
                         results[key] = result
@@ -0,0 +1,590 @@
+# This file is part of analysis_tools.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+__all__ = ("ReservoirSample", "StreamingStatistics", "StreamingStatisticsCache", "StreamingToolRunner")
+
+from collections import ChainMap
+from collections.abc import Iterable, Iterator, Mapping
+from copy import deepcopy
+from dataclasses import dataclass, field
+from typing import Any
+
+import numpy as np
+from lsst.pex.config.configurableActions import ConfigurableActionStruct
+
+from ._actions import AnalysisAction
+from ._analysisTools import AnalysisTool
+from ._interfaces import KeyedData, KeyedResults, Scalar, Vector
+from ._quantileSketch import QuantileSketch
+from ._stages import BasePrep, BaseProcess
+from ._vectorStatistics import VectorStatistics
+
+
+class StreamingStatistics:
+    """Summary statistics of the non-NaN values of a vector given in chunks,
+    which may be merged with those of other chunks.
+
+    The counts, sum, extrema and moments are accumulated exactly, the mean
+    and variance being combined with the pairwise update of Chan, Golub &
+    LeVeque (1979). The median and sigmaMad are estimated from a
+    `QuantileSketch`. These are attributes of the same names as those of a
+    `VectorStatistics`, so actions reading them may be given either.
+
+    Parameters
+    ----------
+    sketchSize : `int`, optional
+        The capacity of the quantile sketch, or `None` to not estimate the
+        median and sigmaMad.
+    seed : `int`, optional
+        Seed of the quantile sketch.
+    """
+
+    statistics = frozenset(
+        (
+            "size",
+            "count",
+            "nanCount",
+            "sum",
+            "mean",
+            "std",
+            "rms",
+            "min",
+            "max",
+            "median",
+            "sigmaMad",
+            "quantileSketch",
+        )
+    )
+    """The names of the statistics which are accumulated, each of which is an
+    attribute of the same name.
+    """
+
+    def __init__(self, sketchSize: int | None = 200, seed: int | None = 0):
+        self.size = 0
+        """The number of values, including NaN values (`int`)."""
+        self.count = 0
+        """The number of non-NaN values (`int`)."""
+        self.sum: Scalar = 0
+        """The sum of the non-NaN values."""
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._sumSquares = 0.0
+        self._min = np.inf
+        self._max = -np.inf
+        self.sketch = None if sketchSize is None else QuantileSketch(sketchSize, seed)
+        """The sketch the quantiles are estimated from (`QuantileSketch` or
+        `None`).
+        """
+
+    @property
+    def nanCount(self) -> int:
+        """The number of NaN values (`int`)."""
+        return self.size - self.count
+
+    def update(self, values: Vector) -> None:
+        """Accumulate the statistics of a chunk of values.
+
+        Parameters
+        ----------
+        values : `Vector`
+            The values.
+        """
+        values = np.asarray(values).ravel()
+        size = values.size
+        if values.dtype.kind in "fc":
+            values = values[~np.isnan(values)]
+        self._combine(size, values.size, values.sum(), *self._moments(values))
+        if values.size:
+            self._min = min(self._min, float(values.min()))
+            self._max = max(self._max, float(values.max()))
+        if self.sketch is not None:
+            self.sketch.update(values)
+
+    def merge(self, other: StreamingStatistics) -> None:
+        """Add the statistics accumulated by another instance to these.
+
+        Parameters
+        ----------
+        other : `StreamingStatistics`
+            The statistics to merge, which are not modified.
+        """
+        self._combine(other.size, other.count, other.sum, other._mean, other._m2, other._sumSquares)
+        self._min = min(self._min, other._min)
+        self._max = max(self._max, other._max)
+        if self.sketch is not None:
+            if other.sketch is None:
+                raise ValueError("Statistics without a quantile sketch can not be merged into these")
+            self.sketch.merge(other.sketch)
+
+    @staticmethod
+    def _moments(values: np.ndarray) -> tuple[float, float, float]:
+        if not values.size:
+            return 0.0, 0.0, 0.0
+        values = values.astype(float, copy=False)
+        mean = float(values.mean())
+        deviations = values - mean
+        return mean, float(np.dot(deviations, deviations)), float(np.dot(values, values))
+
+    def _combine(
+        self, size: int, count: int, total: Scalar, mean: float, m2: float, sumSquares: float
+    ) -> None:
+        self.size += size
+        if not count:
+            return
+        combined = self.count + count
+        delta = mean - self._mean
+        self._mean += delta * count / combined
+        self._m2 += m2 + delta * delta * self.count * count / combined
+        self._sumSquares += sumSquares
+        self.sum = self.sum + total
+        self.count = combined
+
+    @property
+    def mean(self) -> Scalar:
+        """The mean of the non-NaN values, or NaN if there are none."""
+        return self._mean if self.count else np.nan
+
+    @property
+    def std(self) -> Scalar:
+        """The standard deviation of the non-NaN values, or NaN if there are
+        none.
+        """
+        return float(np.sqrt(self._m2 / self.count)) if self.count else np.nan
+
+    @property
+    def rms(self) -> Scalar:
+        """The root mean square of the non-NaN values, or NaN if there are
+        none.
+        """
+        return float(np.sqrt(self._sumSquares / self.count)) if self.count else np.nan
+
+    @property
+    def min(self) -> Scalar:
+        """The minimum of the non-NaN values, or NaN if there are none."""
+        return self._extremum("min", self._min)
+
+    @property
+    def max(self) -> Scalar:
+        """The maximum of the non-NaN values, or NaN if there are none."""
+        return self._extremum("max", self._max)
+
+    def _extremum(self, name: str, value: float) -> Scalar:
+        if self.size == 0:
+            # Match numpy, which has no extrema of an empty array.
+            raise ValueError(f"zero-size array to reduction operation {name} which has no identity")
+        return value if self.count else np.nan
+
+    @property
+    def median(self) -> Scalar:
+        """The estimated median of the non-NaN values, or NaN if there are
+        none.
+        """
+        return self._getSketch().quantile(0.5)
+
+    @property
+    def sigmaMad(self) -> Scalar:
+        """The estimated median absolute deviation of the non-NaN values,
+        scaled to the standard deviation of a normal distribution, or NaN if
+        there are no values.
+        """
+        return self._getSketch().sigmaMad()
+
+    def quantileSketch(self, rankError: float | None = None) -> QuantileSketch:
+        """Return the sketch the quantiles are estimated from.
+
+        Parameters
+        ----------
+        rankError : `float`, optional
+            Ignored, the accuracy of the sketch is set when these statistics
+            are constructed.
+
+        Returns
+        -------
+        sketch : `QuantileSketch`
+            The sketch of the non-NaN values.
+        """
+        return self._getSketch()
+
+    def _getSketch(self) -> QuantileSketch:
+        if self.sketch is None:
+            raise ValueError("Quantiles are not estimated by these statistics")
+        return self.sketch
+
+
+class StreamingStatisticsCache:
+    """Supply `StreamingStatistics` of vectors to actions in place of their
+    `VectorStatistics`.
+
+    This is passed to actions as the ``vectorStatistics`` keyword argument,
+    in the same way as a `VectorStatisticsCache`. Reads of other vectors, or
+    of masked vectors, are given the statistics of the vector passed.
+
+    Parameters
+    ----------
+    statistics : `~collections.abc.Mapping` [`str`, `StreamingStatistics`]
+        The statistics of each vector, by key.
+    """
+
+    def __init__(self, statistics: Mapping[str, StreamingStatistics]):
+        self._statistics = dict(statistics)
+
+    def plan(self, actions: Iterable[Any], **kwargs: Any) -> None:
+        """Do nothing, the statistics to supply are accumulated in advance."""
+
+    def get(
+        self, key: str, vector: Vector, mask: Vector | None = None
+    ) -> StreamingStatistics | VectorStatistics:
+        """Return the statistics of a vector.
+
+        Parameters
+        ----------
+        key : `str`
+            The key the vector was read with.
+        vector : `Vector`
+            The vector.
+        mask : `Vector`, optional
+            The mask selecting values of the vector, if any.
+
+        Returns
+        -------
+        statistics : `StreamingStatistics` or `VectorStatistics`
+            The accumulated statistics of the vector, if it is not masked and
+            they were accumulated, otherwise the statistics of the masked
+            vector.
+        """
+        if mask is None and (statistics := self._statistics.get(key)) is not None:
+            return statistics
+        return VectorStatistics(vector, mask)
+
+
+def _take(value: Any, rows: np.ndarray) -> Any:
+    # Positional indexing is required, which pandas only supports through
+    # iloc.
+    return value.iloc[rows] if hasattr(value, "iloc") else value[rows]
+
+
+def _concatenate(first: Any, second: Any) -> Any:
+    if isinstance(first, np.ma.MaskedArray) or isinstance(second, np.ma.MaskedArray):
+        return np.ma.concatenate((first, second))
+    return np.concatenate((first, second))
+
+
+class ReservoirSample:
+    """A uniform random sample, of bounded size, of the rows of `KeyedData`
+    given in chunks.
+
+    Every row is assigned a random priority, and the rows with the smallest
+    priorities are kept. Only rows of a chunk with priorities below the
+    largest kept are gathered, so once the sample is full little of each
+    chunk is copied. Samples of different chunks may be merged. The rows
+    kept are in the order they were added.
+
+    Parameters
+    ----------
+    size : `int`
+        The maximum number of rows kept.
+    seed : `int`, optional
+        Seed of the row priorities, so that samples of the same rows are
+        identical.
+    """
+
+    def __init__(self, size: int, seed: int | None = 0):
+        if size < 1:
+            raise ValueError(f"The sample size must be at least 1, not {size}")
+        self.size = size
+        self.numRows = 0
+        """The number of rows the sample was drawn from (`int`)."""
+        self._rng = np.random.default_rng(seed)
+        self._priorities = np.empty(0)
+        self._columns: dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return self._priorities.size
+
+    @property
+    def data(self) -> dict[str, Any]:
+        """The sampled rows of each key (`dict` [`str`, `Vector`])."""
+        return dict(self._columns)
+
+    def add(self, data: KeyedData, keys: Iterable[str], numRows: int | None = None) -> None:
+        """Sample rows of a chunk of data.
+
+        Parameters
+        ----------
+        data : `KeyedData`
+            The chunk of data.
+        keys : `~collections.abc.Iterable` [`str`]
+            The keys of the vectors to sample, each of which has a value for
+            every row. These must be the same for every chunk.
+        numRows : `int`, optional
+            The number of rows of the chunk, if `None` this is the length of
+            the vector of the first key.
+        """
+        keys = list(keys)
+        if numRows is None:
+            numRows = len(data[keys[0]]) if keys else 0
+        self.numRows += numRows
+        priorities = self._rng.random(numRows)
+        if len(self) == self.size:
+            # Only rows with priorities below the largest kept are sampled.
+            rows = np.flatnonzero(priorities < self._priorities.max())
+        else:
+            rows = np.arange(numRows)
+        self._insert(priorities[rows], {key: _take(data[key], rows) for key in keys})
+
+    def merge(self, other: ReservoirSample) -> None:
+        """Add the rows sampled by another instance to this sample.
+
+        Parameters
+        ----------
+        other : `ReservoirSample`
+            The sample to merge, which is not modified.
+        """
+        self.numRows += other.numRows
+        self._insert(other._priorities, other._columns)
+
+    def _insert(self, priorities: np.ndarray, columns: Mapping[str, Any]) -> None:
+        if self._columns and set(columns) != set(self._columns):
+            raise ValueError(
+                f"Rows of {sorted(columns)} can not be added to a sample of {sorted(self._columns)}"
+            )
+        if self._columns:
+            priorities = np.concatenate((self._priorities, priorities))
+            columns = {key: _concatenate(self._columns[key], value) for key, value in columns.items()}
+        if priorities.size > self.size:
+            keep = np.sort(np.argpartition(priorities, self.size - 1)[: self.size])
+            priorities = priorities[keep]
+            columns = {key: _take(value, keep) for key, value in columns.items()}
+        self._priorities = priorities
+        self._columns = dict(columns)
+
+
+def _nestedActions(action: AnalysisAction) -> Iterator[AnalysisAction]:
+    """Yield the actions configured within an action."""
+    for _, value in action.items():
+        match value:
+            case AnalysisAction():
+                yield value
+            case ConfigurableActionStruct():
+                for _, item in value.items():
+                    if isinstance(item, AnalysisAction):
+                        yield item
+
+
+@dataclass
+class _BandState:
+    """The sample and statistics accumulated by a `StreamingToolRunner` for
+    a single band.
+    """
+
+    sample: ReservoirSample
+    statistics: dict[str, StreamingStatistics]
+    sampled: list[str]
+    constants: dict[str, Any] = field(default_factory=dict)
+
+
+class StreamingToolRunner:
+    """Run an `AnalysisTool` over data which is given in chunks, without
+    holding all of the data at once.
+
+    The prep stage and the build and filter actions of the process stage are
+    applied to each chunk as it is given. The statistics read by the
+    calculate actions, which they declare with
+    `ScalarAction.getStatisticNames`, are accumulated from every chunk as
+    `StreamingStatistics`, and a `ReservoirSample` of the prepared rows is
+    kept. When all the chunks have been given, the process stage is run on
+    the sample, with the calculate actions reading the accumulated
+    statistics, and the produce stage on the result. Plots are therefore made
+    from the sample, while metrics computed from the supported statistics
+    cover all the rows. Calculate actions reading other quantities are
+    computed from the sample, these are listed by `sampled`.
+
+    Tools whose prep or process stage are not a `BasePrep` or `BaseProcess`,
+    or which propagate their input data, are instead run on a sample of the
+    rows of the input data.
+
+    Parameters
+    ----------
+    tool : `AnalysisTool`
+        The tool to run.
+    sampleSize : `int`, optional
+        The maximum number of rows sampled for each band.
+    sketchSize : `int`, optional
+        The capacity of the quantile sketches used to estimate medians and
+        sigmaMads.
+    seed : `int`, optional
+        Seed of the samples and sketches, so that results are reproducible.
+    **kwargs
+        The keyword arguments the tool would be called with.
+    """
+
+    def __init__(
+        self,
+        tool: AnalysisTool,
+        sampleSize: int = 100_000,
+        sketchSize: int = 200,
+        seed: int | None = 0,
+        **kwargs: Any,
+    ):
+        self.tool = tool
+        self.sampleSize = sampleSize
+        self.sketchSize = sketchSize
+        self.seed = seed
+        self._kwargs = dict(kwargs)
+        if "plotInfo" in kwargs:
+            # Calling a tool modifies the plotInfo, so the tool is given its
+            # own.
+            self._kwargs["plotInfo"] = deepcopy(kwargs["plotInfo"])
+        self.streamed = (
+            not tool.propagateData
+            and isinstance(tool.prep, BasePrep)
+            and isinstance(tool.process, BaseProcess)
+        )
+        """Whether the tool is run on the data as it is streamed, rather than
+        on a sample of the input data (`bool`).
+        """
+        self._updated = False
+        self._states: dict[str, _BandState] = {}
+        self._inputSample = None if self.streamed else ReservoirSample(sampleSize, seed)
+
+    @property
+    def sampled(self) -> list[str]:
+        """The names of the calculate actions of the tool which are computed
+        from the sample, rather than from statistics of all the rows
+        (`list` [`str`]).
+        """
+        if not self.streamed:
+            return list(getattr(self.tool.process, "calculateActions", {}).fieldNames)
+        names: dict[str, None] = {}
+        for state in self._states.values():
+            names.update(dict.fromkeys(state.sampled))
+        return list(names)
+
+    def update(self, data: KeyedData) -> None:
+        """Process a chunk of the input data.
+
+        Parameters
+        ----------
+        data : `KeyedData`
+            The chunk of data, which must have the same keys as every other
+            chunk.
+        """
+        self._updated = True
+        if self._inputSample is not None:
+            self._inputSample.add(data, self._inputKeys(data))
+        else:
+            self.tool._callBands(self._updateBand, data, **self._kwargs)
+
+    def finish(self) -> KeyedResults:
+        """Run the tool on the data accumulated from the chunks.
+
+        Returns
+        -------
+        results : `KeyedResults`
+            The results of the tool, as returned when it is called.
+        """
+        if not self._updated:
+            raise RuntimeError(f"No data was given to run {self.tool.identity or 'the tool'} on")
+        if self._inputSample is not None:
+            return self.tool(self._inputSample.data, **self._kwargs)
+        return self.tool._callBands(self._finishBand, None, **self._kwargs)
+
+    def _inputKeys(self, data: KeyedData) -> list[str]:
+        keys: dict[str, None] = {}
+        for band in self._kwargs.get("bands") or [""]:
+            for key, _ in self.tool.getFormattedInputSchema(band=band):
+                try:
+                    data[key]
+                except KeyError:
+                    # Not every key of a tool need be read when it is run.
+                    continue
+                keys[key] = None
+        return list(keys)
+
+    def _newState(self, **kwargs) -> _BandState:
+        """Plan the statistics to accumulate for the calculate actions called
+        with the given arguments.
+        """
+        names: dict[str, set[str]] = {}
+        reads: dict[str, set[str]] = {}
+        excluded: set[str] = set()
+        sampled = []
+        for name, action in self.tool.process.calculateActions.items():
+            exact = True
+            reads[name] = set()
+            stack = [action]
+            while stack:
+                current = stack.pop()
+                nested = list(_nestedActions(current))
+                stack.extend(nested)
+                if statisticNames := set(getattr(current, "getStatisticNames", tuple)()):
+                    key = current.vectorKey.format_map(kwargs)
+                    reads[name].add(key)
+                    if statisticNames <= StreamingStatistics.statistics:
+                        names.setdefault(key, set()).update(statisticNames)
+                    else:
+                        excluded.add(key)
+                elif not nested:
+                    # This computes its result from the data it is given.
+                    exact = False
+            if not exact:
+                sampled.append(name)
+        # Every action reading a vector which can not be accumulated is
+        # computed from the sample, so actions reading it stay consistent.
+        sampled.extend(name for name in reads if reads[name] & excluded and name not in sampled)
+        statistics = {
+            key: StreamingStatistics(
+                self.sketchSize if keyNames & {"median", "sigmaMad", "quantileSketch"} else None, self.seed
+            )
+            for key, keyNames in names.items()
+            if key not in excluded
+        }
+        return _BandState(ReservoirSample(self.sampleSize, self.seed), statistics, sampled)
+
+    def _updateBand(self, data: KeyedData, **kwargs) -> KeyedResults:
+        kwargs["metric_tags"] = list(self.tool.metric_tags or ())
+        if (state := self._states.get(kwargs["band"])) is None:
+            state = self._states[kwargs["band"]] = self._newState(**kwargs)
+        prepped = self.tool.prep(data, **kwargs)
+        vectorKeys = {key.format_map(kwargs) for key in self.tool.prep.vectorKeys}
+        state.sample.add(prepped, sorted(vectorKeys))
+        for key in prepped:
+            if key not in vectorKeys:
+                state.constants[key] = prepped[key]
+        if state.statistics:
+            view = ChainMap(self.tool.process._build(prepped, **kwargs), prepped)
+            for key, statistics in state.statistics.items():
+                statistics.update(view[key])
+        return {}
+
+    def _finishBand(self, data: None, **kwargs) -> KeyedResults:
+        # Only the sample is run on, which no cache was created for.
+        kwargs.pop("actionCache", None)
+        kwargs["metric_tags"] = list(self.tool.metric_tags or ())
+        state = self._states[kwargs["band"]]
+        processed = self.tool.process(
+            state.sample.data | state.constants,
+            vectorStatistics=StreamingStatisticsCache(state.statistics),
+            **kwargs,
+        )
+        return self.tool._process_single_results(self.tool.produce(processed, **kwargs))
@@ -35,31 +35,39 @@ __all__ = ("AnalysisBaseConnections", "AnalysisBaseConfig", "AnalysisPipelineTas
 
 import datetime
 import logging
+import multiprocessing
+import os
 import warnings
 import weakref
-from collections.abc import Iterable
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from copy import deepcopy
 from typing import TYPE_CHECKING, Any, Mapping, MutableMapping, cast
 
 import matplotlib.pyplot as plt
+import numpy as np
 from lsst.verify import Measurement
 
 if TYPE_CHECKING:
     from lsst.daf.butler import DeferredDatasetHandle
     from lsst.pipe.base import QuantumContext
 
-from lsst.daf.butler import DataCoordinate
-from lsst.pex.config import Field, ListField
+from lsst.daf.butler import DataCoordinate, StorageClass, StorageClassFactory
+from lsst.pex.config import ChoiceField, Field, ListField
 from lsst.pex.config.configurableActions import ConfigurableActionStructField
 from lsst.pipe.base import Instrument, PipelineTask, PipelineTaskConfig, PipelineTaskConnections, Struct
 from lsst.pipe.base import connectionTypes as ct
 from lsst.pipe.base.connections import InputQuantizedConnection, OutputQuantizedConnection
 from lsst.pipe.base.pipelineIR import ConfigIR, ParametersIR
 
-from ._actions import JointAction, MetricAction, NoMetric
+from ._actionCache import ActionCache
+from ._actions import JointAction, MetricAction, NoMetric, NoPlot, PlotAction
 from ._analysisTools import AnalysisTool
-from ._interfaces import KeyedData, PlotTypes
+from ._arrowKeyedData import ArrowKeyedData
+from ._interfaces import KeyedData, KeyedResults, PlotTypes
 from ._metricMeasurementBundle import MetricMeasurementBundle
+from ._planner import ActionPlanner
+from ._stages import BasePrep
 
 # TODO: This rcParams modification is a temporary solution, hiding
 # a matplotlib warning indicating too many figures have been opened.
@@ -76,6 +84,94 @@ def _plotCloser(*args):
         plt.close(plot)
 
 
+# State shared with forked worker processes when the tools of a task are run
+# with the process executionMode. This is set in the parent immediately before
+# the worker pool is created, so that the children inherit the configured
+# tools and the (read only) input data through copy-on-write memory instead
+# of having them pickled and sent to each worker.
+_WORKER_STATE: tuple[Mapping[str, AnalysisTool], KeyedData, Mapping[str, Any]] | None = None
+
+
+def _runTool(tool: AnalysisTool, data: KeyedData, kwargs: Mapping[str, Any]) -> KeyedResults:
+    """Run a single tool, making sure it sees its own copy of the plotInfo."""
+    toolKwargs = dict(kwargs)
+    toolKwargs["plotInfo"] = deepcopy(kwargs.get("plotInfo"))
+    return tool(data, **toolKwargs)
+
+
+def _makesPlots(tool: AnalysisTool) -> bool:
+    """Return whether a tool produces any plots."""
+    match tool.produce:
+        case PlotAction():
+            return True
+        case JointAction(plot=NoPlot()):
+            return False
+        case JointAction():
+            return True
+    return False
+
+
+def _runToolInWorker(name: str) -> KeyedResults:
+    """Run the tool with the given name inside a forked worker process."""
+    if _WORKER_STATE is None:
+        raise RuntimeError("Worker process was started without any tools to run")
+    tools, data, kwargs = _WORKER_STATE
+    return _runTool(tools[name], data, kwargs)
+
+
+def _availableCores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# Functions evaluating the comparisons returned by
+# `VectorAction.getRowFilters`.
+_COMPARISONS = {
+    "==": np.equal,
+    "!=": np.not_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+}
+
+
+def _filterRows(data: KeyedData, filters: Iterable[tuple[str, str, Any]]) -> KeyedData:
+    """Return only the rows of a loaded dataset which satisfy all of the
+    given comparisons, keeping the type of the dataset.
+    """
+    mask = None
+    for column, comparison, value in filters:
+        temp = np.asarray(_COMPARISONS[comparison](np.asarray(data[column]), value))
+        mask = temp if mask is None else mask & temp
+    if mask is None or mask.all():
+        return data
+    if isinstance(data, Mapping):
+        return {key: value[mask] for key, value in data.items()}
+    if hasattr(data, "num_rows"):
+        # An arrow table, which can not be indexed with a mask.
+        return data.filter(mask)
+    return data[mask]
+
+
+def _storageClassParameters(
+    handle: DeferredDatasetHandle, storageClass: str | StorageClass | None = None
+) -> Iterable[str]:
+    """Return the names of the read parameters supported by the storage class
+    a handle will load its dataset with, or by the given storage class
+    override.
+    """
+    if storageClass is None:
+        storageClass = handle.storageClass
+    if storageClass is None and (ref := getattr(handle, "ref", None)) is not None:
+        storageClass = ref.datasetType.storageClass
+    if isinstance(storageClass, str):
+        storageClass = StorageClassFactory().getStorageClass(storageClass)
+    return getattr(storageClass, "parameters", ())
+
+
 class AnalysisBaseConnections(
     PipelineTaskConnections, dimensions={}, defaultTemplates={"outputName": "Placeholder"}
 ):
@@ -273,6 +369,59 @@ class AnalysisBaseConfig(PipelineTaskConfig, pipelineConnections=AnalysisBaseCon
         default="run_timestamp",
         check=_timestampValidator,
     )
+    executionMode = ChoiceField[str](
+        doc="How the configured atools are executed within a single quantum. Results are always merged "
+        "in the order the atools are configured, independent of the mode chosen.",
+        allowed={
+            "serial": "Run each tool one after another.",
+            "thread": "Run tools concurrently in a pool of threads. This is best suited to tools which "
+            "spend most of their time in numpy calls that release the GIL. As matplotlib is not thread "
+            "safe, only tools which produce no plots are run in the pool, tools which produce plots are "
+            "run one after another in the task's own thread.",
+            "process": "Run tools concurrently in a pool of forked processes. The input data is shared "
+            "read only with the workers through copy-on-write memory, and results are sent back to the "
+            "task. This is best suited to tools which are bound by the GIL.",
+        },
+        default="serial",
+    )
+    numWorkers = Field[int](
+        doc="Maximum number of concurrent workers used when executionMode is not serial. Values less "
+        "than 1 use the number of cores available to the process.",
+        default=0,
+    )
+    cacheActions = Field[bool](
+        doc="Share the results of identically configured actions, evaluated on the input data with the "
+        "same arguments (e.g. band), between all the atools of this task.",
+        default=False,
+    )
+    actionCacheMaxMemory = Field[int](
+        doc="Maximum memory, in MiB, the shared action results may hold when cacheActions is True. "
+        "Least recently used results are evicted once this is exceeded. Values less than 1 impose "
+        "no limit.",
+        default=4096,
+    )
+    planActions = Field[bool](
+        doc="Plan the prep and process stages of all the atools before running them, merging "
+        "identical evaluations. Only results used by more than one tool are then shared, each released "
+        "after its last use. Implies cacheActions.",
+        default=False,
+    )
+    pushDownSelections = Field[bool](
+        doc="Apply the flag and range selections made by the prep stage of every one of the atools "
+        "while loading the input data, so rows no tool would select are never loaded. The selections "
+        "are passed to the read as filters, allowing parquet row groups to be skipped using their "
+        "statistics, when the storage class supports it and are otherwise applied immediately after "
+        "the read. This must only be enabled for tasks which use the loaded data solely as input to the "
+        "atools.",
+        default=False,
+    )
+    loadArrowData = Field[bool](
+        doc="Load the input data as an arrow table wrapped in an ArrowKeyedData, which exposes each "
+        "column as a numpy view of the arrow buffers, rather than converting it to the python type of "
+        "the input dataset type. This must only be enabled for tasks which only access the loaded data "
+        "by key.",
+        default=False,
+    )
 
     def applyConfigOverrides(
         self,
@@ -366,38 +515,134 @@ class AnalysisPipelineTask(PipelineTask):
             # unfiltered numpy warnings.
             for warning in ():
                 warnings.filterwarnings("error", warning, RuntimeWarning)
-            results = Struct()
-            results.metrics = MetricMeasurementBundle(
-                dataset_identifier=self.config.dataset_identifier,
-                reference_package=self.config.reference_package,
-                timestamp_version=self.config.timestamp_version,
-            )
-            # copy plot info to be sure each action sees its own copy
-            plotInfo = kwargs.get("plotInfo")
-            plotKey = f"{self.config.connections.outputName}_{{name}}"
-            weakrefArgs = []
-            for name, action in self.config.atools.items():
-                kwargs["plotInfo"] = deepcopy(plotInfo)
-                actionResult = action(data, **kwargs)
-                metricAccumulate = []
-                for resultName, value in actionResult.items():
-                    match value:
-                        case PlotTypes():
-                            setattr(results, plotKey.format(name=resultName), value)
-                            weakrefArgs.append(value)
-                        case Measurement():
-                            metricAccumulate.append(value)
-                # only add the metrics if there are some
-                if metricAccumulate:
-                    results.metrics[name] = metricAccumulate
-            # Wrap the return struct in a finalizer so that when results is
-            # garbage collected the plots will be closed.
-            # TODO: This finalize step closes all open plots at the conclusion
-            # of a task. When DM-39114 is implemented, this step should not
-            # be required and may be removed.
-            weakref.finalize(results, _plotCloser, *weakrefArgs)
+            if self.config.cacheActions or self.config.planActions:
+                maxMemory = self.config.actionCacheMaxMemory
+                cache = ActionCache(data, maxBytes=maxMemory * 2**20 if maxMemory > 0 else None, **kwargs)
+                if self.config.planActions:
+                    graph = ActionPlanner(cache).plan(self.config.atools, **kwargs)
+                    cache.setPlan(graph.useCounts())
+                    self.log.verbose(
+                        "Planned %d action evaluations as %d distinct nodes", graph.requests, len(graph)
+                    )
+                kwargs["actionCache"] = cache
+            results = self._gatherResults(self._iterToolResults(data, **kwargs))
+            if (cache := kwargs.pop("actionCache", None)) is not None:
+                stats = cache.stats
+                self.log.verbose(
+                    "Action cache had %d hits and %d misses, holding %d results in %d bytes",
+                    stats.hits,
+                    stats.misses,
+                    stats.entries,
+                    stats.nbytes,
+                )
+        return results
+
+    def _gatherResults(self, toolResults: Iterable[tuple[str, KeyedResults]]) -> Struct:
+        """Collect the plots and metrics produced by each tool into the
+        outputs of the task.
+
+        Parameters
+        ----------
+        toolResults : `~collections.abc.Iterable` [`tuple`]
+            Pairs of the name each tool was configured with, and the
+            `KeyedResults` it produced.
+
+        Returns
+        -------
+        results : `~lsst.pipe.base.Struct`
+            The accumulated results of all the plots and metrics.
+        """
+        results = Struct()
+        results.metrics = MetricMeasurementBundle(
+            dataset_identifier=self.config.dataset_identifier,
+            reference_package=self.config.reference_package,
+            timestamp_version=self.config.timestamp_version,
+        )
+        plotKey = f"{self.config.connections.outputName}_{{name}}"
+        weakrefArgs = []
+        for name, actionResult in toolResults:
+            metricAccumulate = []
+            for resultName, value in actionResult.items():
+                match value:
+                    case PlotTypes():
+                        setattr(results, plotKey.format(name=resultName), value)
+                        weakrefArgs.append(value)
+                    case Measurement():
+                        metricAccumulate.append(value)
+            # only add the metrics if there are some
+            if metricAccumulate:
+                results.metrics[name] = metricAccumulate
+        # Wrap the return struct in a finalizer so that when results is
+        # garbage collected the plots will be closed.
+        # TODO: This finalize step closes all open plots at the conclusion
+        # of a task. When DM-39114 is implemented, this step should not
+        # be required and may be removed.
+        weakref.finalize(results, _plotCloser, *weakrefArgs)
         return results
 
+    def _iterToolResults(self, data: KeyedData, **kwargs) -> Iterator[tuple[str, KeyedResults]]:
+        """Run all the configured tools, yielding their results.
+
+        Tools are run according to the ``executionMode`` config, but the
+        results are always yielded in the order the tools are configured so
+        that the merged outputs are deterministic.
+
+        Parameters
+        ----------
+        data : `KeyedData`
+            The input data to run all the tools on.
+        **kwargs
+            Additional arguments passed through to each tool.
+
+        Yields
+        ------
+        name : `str`
+            The name the tool was configured with.
+        result : `KeyedResults`
+            The results produced by the tool.
+        """
+        tools = dict(self.config.atools.items())
+        numWorkers = min(
+            len(tools), self.config.numWorkers if self.config.numWorkers > 0 else _availableCores()
+        )
+        mode = self.config.executionMode
+        if mode == "process" and "fork" not in multiprocessing.get_all_start_methods():
+            self.log.warning("Process execution requires fork support, falling back to threads")
+            mode = "thread"
+        if mode == "serial" or numWorkers < 2:
+            for name, tool in tools.items():
+                yield name, _runTool(tool, data, kwargs)
+            return
+
+        global _WORKER_STATE
+        executor: Executor
+        if mode == "thread":
+            executor = ThreadPoolExecutor(max_workers=numWorkers)
+        else:
+            _WORKER_STATE = (tools, data, kwargs)
+            executor = ProcessPoolExecutor(
+                max_workers=numWorkers, mp_context=multiprocessing.get_context("fork")
+            )
+        try:
+            with executor:
+                if mode == "thread":
+                    # Tools which produce plots are run in this thread, while
+                    # the others run in the pool.
+                    futures = {
+                        name: executor.submit(_runTool, tool, data, kwargs)
+                        for name, tool in tools.items()
+                        if not _makesPlots(tool)
+                    }
+                else:
+                    futures = {name: executor.submit(_runToolInWorker, name) for name in tools}
+                for name, tool in tools.items():
+                    if (future := futures.get(name)) is not None:
+                        yield name, future.result()
+                    else:
+                        yield name, _runTool(tool, data, kwargs)
+        finally:
+            _WORKER_STATE = None
+
     def run(self, *, data: KeyedData | None = None, **kwargs) -> Struct:
         """Produce the outputs associated with this `PipelineTask`.
 
@@ -427,12 +672,18 @@ class AnalysisPipelineTask(PipelineTask):
         """
         if data is None:
             raise ValueError("data must not be none")
+        self._setDefaultArguments(kwargs)
+        return self._runTools(data, **kwargs)
+
+    def _setDefaultArguments(self, kwargs: MutableMapping[str, Any]) -> None:
+        """Add the bands and plotInfo to the arguments passed to the tools,
+        if they were not given.
+        """
         if "bands" not in kwargs:
             kwargs["bands"] = list(self.config.bands)
         if "plotInfo" not in kwargs:
             kwargs["plotInfo"] = _StandinPlotInfo()
         kwargs["plotInfo"]["bands"] = kwargs["bands"]
-        return self._runTools(data, **kwargs)
 
     def runQuantum(
         self,
@@ -566,7 +817,12 @@ class AnalysisPipelineTask(PipelineTask):
         self._populatePlotInfoWithDataId(plotInfo, dataId)
         return plotInfo
 
-    def loadData(self, handle: DeferredDatasetHandle, names: Iterable[str] | None = None) -> KeyedData:
+    def loadData(
+        self,
+        handle: DeferredDatasetHandle,
+        names: Iterable[str] | None = None,
+        filters: Iterable[tuple[str, str, Any]] | None = None,
+    ) -> KeyedData:
         """Load the minimal set of keyed data from the input dataset.
 
         Parameters
@@ -579,15 +835,47 @@ class AnalysisPipelineTask(PipelineTask):
             is called to generate the names.
             For most purposes these are the names of columns to load from
             a catalog or data frame.
+        filters : `Iterable` of `tuple` [`str`, `str`, `~typing.Any`], optional
+            Comparisons, as returned by `VectorAction.getRowFilters`, which
+            all must be true for a row to be loaded. If `None`, `names` is
+            `None`, and the ``pushDownSelections`` config is set, then the
+            `collectInputFilters` method is called to generate the filters.
 
         Returns
         -------
         result: `KeyedData`
-            The dataset with only the specified keys loaded.
+            The dataset with only the specified keys and rows loaded. If
+            `names` is `None` and the ``loadArrowData`` config is set this is
+            an `ArrowKeyedData`.
         """
+        storageClass = None
         if names is None:
             names = self.collectInputNames()
-        return cast(KeyedData, handle.get(parameters={"columns": names}))
+            if filters is None and self.config.pushDownSelections:
+                filters = self.collectInputFilters(names)
+            if self.config.loadArrowData:
+                storageClass = "ArrowTable"
+        if not (filters := list(filters or ())):
+            data = handle.get(parameters={"columns": names}, storageClass=storageClass)
+        elif "filters" in _storageClassParameters(handle, storageClass):
+            try:
+                data = handle.get(
+                    parameters={"columns": names, "filters": filters}, storageClass=storageClass
+                )
+            except (NotImplementedError, TypeError, ValueError) as err:
+                # Comparisons which can not be made against the stored types
+                # (e.g. comparing an integer flag column with True) are
+                # rejected before any rows are read.
+                self.log.verbose("Could not filter rows while reading, filtering after read: %s", err)
+                data = handle.get(parameters={"columns": names}, storageClass=storageClass)
+        else:
+            data = handle.get(parameters={"columns": names}, storageClass=storageClass)
+        if filters:
+            # This is a no-op if the filters were applied by the read.
+            data = _filterRows(data, filters)
+        if storageClass is not None:
+            return ArrowKeyedData(data)
+        return cast(KeyedData, data)
 
     def collectInputNames(self) -> Iterable[str]:
         """Get the names of the inputs.
@@ -610,3 +898,39 @@ class AnalysisPipelineTask(PipelineTask):
                 for key, _ in action.getFormattedInputSchema(band=band):
                     inputs.add(key)
         return inputs
+
+    def collectInputFilters(self, names: Iterable[str] | None = None) -> list[tuple[str, str, Any]]:
+        """Get the row selections common to all of the configured tools.
+
+        A row which fails any of these selections would be discarded by the
+        prep stage of every tool, in every band it is run in, and so need
+        not be loaded. Only tools whose prep stage is a `BasePrep` are
+        understood, if any other tool is configured, or a tool propagates
+        its input data, no filters are returned.
+
+        Parameters
+        ----------
+        names : `Iterable` of `str`, optional
+            The names of the keys which will be loaded, filters on any other
+            keys are dropped. If `None` then the `collectInputNames` method
+            is called to generate the names.
+
+        Returns
+        -------
+        filters : `list` of `tuple` [`str`, `str`, `~typing.Any`]
+            Comparisons, as returned by `VectorAction.getRowFilters`, which
+            all must be true for a row to be used by any tool.
+        """
+        names = set(self.collectInputNames() if names is None else names)
+        common: list[tuple[str, str, Any]] | None = None
+        for tool in self.config.atools:
+            if tool.propagateData or not isinstance(tool.prep, BasePrep):
+                return []
+            # This mirrors the band each call made by the tool in run sees.
+            bands = self.config.bands if tool.parameterizedBand else ["analysisTools"]
+            for band in bands:
+                filters = []
+                for selector in tool.prep.selectors:
+                    filters.extend(selector.getRowFilters(band=band) or ())
+                common = filters if common is None else [item for item in common if item in filters]
+        return [item for item in common or () if item[0] in names]
@@ -0,0 +1,342 @@
+# This file is part of analysis_tools.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+__all__ = ("VectorStatistics", "VectorStatisticsCache")
+
+from collections.abc import Iterable
+from typing import Any
+
+import numpy as np
+import scipy.stats as sps
+
+from ._interfaces import Scalar, Vector
+from ._quantileSketch import QuantileSketch
+
+
+class VectorStatistics:
+    """Summary statistics of the non-NaN values of a vector, computed from a
+    single buffer.
+
+    The vector is masked and stripped of NaN values once, into a buffer owned
+    by this object. Order statistics, such as the median, are found by
+    partially partitioning that buffer in place, and each rank found is
+    remembered, so computing several statistics of the same vector costs
+    little more than computing one. Statistics are computed when first read,
+    use `compute` to compute several at once.
+
+    Parameters
+    ----------
+    values : `Vector`
+        The values of the vector.
+    mask : `Vector`, optional
+        A boolean mask or index selecting the values to compute statistics
+        of, all values are used if `None`.
+    """
+
+    statistics = frozenset(
+        (
+            "size",
+            "count",
+            "nanCount",
+            "sum",
+            "mean",
+            "std",
+            "rms",
+            "min",
+            "max",
+            "median",
+            "sigmaMad",
+            "quantileSketch",
+            "values",
+        )
+    )
+    """The names of the statistics which may be computed, each of which is
+    an attribute of the same name. Actions reading the non-NaN ``values``
+    themselves, or their `orderStatistics`, declare ``values``.
+    """
+
+    def __init__(self, values: Vector, mask: Vector | None = None):
+        try:
+            values = np.from_dlpack(values)
+        except AttributeError:
+            values = np.asarray(values)
+        if mask is not None:
+            values = values[mask]
+        values = values.ravel()
+        # Either way the buffer is a copy, which may be reordered in place.
+        if values.dtype.kind in "fc":
+            self._buffer = values[~np.isnan(values)]
+        else:
+            self._buffer = values.copy()
+        self.size = values.size
+        """The number of values, including NaN values (`int`)."""
+        self.count = self._buffer.size
+        """The number of non-NaN values (`int`)."""
+        self.nanCount = self.size - self.count
+        """The number of NaN values (`int`)."""
+        self._ranks: dict[int, Scalar] = {}
+        self._results: dict[str, Scalar] = {}
+        self._sketches: dict[float, QuantileSketch] = {}
+
+    @property
+    def values(self) -> Vector:
+        """A read only view of the non-NaN values, in an unspecified order
+        (`Vector`).
+        """
+        view = self._buffer.view()
+        view.flags.writeable = False
+        return view
+
+    def compute(self, names: Iterable[str]) -> None:
+        """Compute several statistics together.
+
+        All of the order statistics needed are found by a single partition of
+        the values.
+
+        Parameters
+        ----------
+        names : `~collections.abc.Iterable` [`str`]
+            The names of the statistics, each of which is one of
+            `statistics`.
+        """
+        names = set(names)
+        if unknown := names - self.statistics:
+            raise ValueError(
+                f"Unsupported statistics {sorted(unknown)}, must be in {sorted(self.statistics)}"
+            )
+        if names & {"median", "sigmaMad"}:
+            self.orderStatistics(self._medianRanks(self.count))
+        # Sketches depend on the rank error they are read with.
+        for name in names - {"quantileSketch"}:
+            getattr(self, name)
+
+    def orderStatistics(self, ranks: Iterable[int]) -> list[Scalar]:
+        """Return values of the given ranks among the non-NaN values.
+
+        Parameters
+        ----------
+        ranks : `~collections.abc.Iterable` [`int`]
+            The ranks, counting from zero for the smallest value.
+
+        Returns
+        -------
+        values : `list`
+            The value of each rank.
+        """
+        ranks = list(ranks)
+        if missing := sorted(set(ranks).difference(self._ranks)):
+            self._buffer.partition(missing)
+            self._ranks.update(zip(missing, self._buffer[missing]))
+        return [self._ranks[rank] for rank in ranks]
+
+    @staticmethod
+    def _medianRanks(count: int) -> tuple[int, ...]:
+        return ((count - 1) // 2, count // 2) if count else ()
+
+    @property
+    def sum(self) -> Scalar:
+        """The sum of the non-NaN values."""
+        if (result := self._results.get("sum")) is None:
+            result = self._results["sum"] = self._buffer.sum()
+        return result
+
+    @property
+    def mean(self) -> Scalar:
+        """The mean of the non-NaN values, or NaN if there are none."""
+        if (result := self._results.get("mean")) is None:
+            result = self._results["mean"] = float(self.sum / self.count) if self.count else np.nan
+        return result
+
+    @property
+    def std(self) -> Scalar:
+        """The standard deviation of the non-NaN values, or NaN if there are
+        none.
+        """
+        if (result := self._results.get("std")) is None:
+            if self.count:
+                deviations = self._buffer - self.mean
+                result = float(np.sqrt(np.mean(deviations * deviations)))
+            else:
+                result = np.nan
+            self._results["std"] = result
+        return result
+
+    @property
+    def rms(self) -> Scalar:
+        """The root mean square of the non-NaN values, or NaN if there are
+        none.
+        """
+        if (result := self._results.get("rms")) is None:
+            result = self._results["rms"] = (
+                float(np.sqrt(np.mean(np.square(self._buffer, dtype=np.float64)))) if self.count else np.nan
+            )
+        return result
+
+    @property
+    def min(self) -> Scalar:
+        """The minimum of the non-NaN values, or NaN if there are none."""
+        return self._extremum("min")
+
+    @property
+    def max(self) -> Scalar:
+        """The maximum of the non-NaN values, or NaN if there are none."""
+        return self._extremum("max")
+
+    def _extremum(self, name: str) -> Scalar:
+        if (result := self._results.get(name)) is None:
+            if self.size == 0:
+                # Match numpy, which has no extrema of an empty array.
+                raise ValueError(f"zero-size array to reduction operation {name} which has no identity")
+            result = self._results[name] = float(getattr(self._buffer, name)()) if self.count else np.nan
+        return result
+
+    @property
+    def median(self) -> Scalar:
+        """The median of the non-NaN values, or NaN if there are none."""
+        if (result := self._results.get("median")) is None:
+            if self.count:
+                lower, upper = self.orderStatistics(self._medianRanks(self.count))
+                # Average in floating point, as numpy does, so that boolean
+                # and small integer values neither saturate nor overflow.
+                result = (float(lower) + float(upper)) / 2
+            else:
+                result = np.nan
+            self._results["median"] = result
+        return result
+
+    @property
+    def sigmaMad(self) -> Scalar:
+        """The median absolute deviation of the non-NaN values, scaled to the
+        standard deviation of a normal distribution, or NaN if there are no
+        values. This matches `lsst.analysis.tools.math.nanSigmaMad`.
+        """
+        if (result := self._results.get("sigmaMad")) is None:
+            median = self.median
+            if not self.count or not np.isfinite(median):
+                # The deviations from an infinite median are undefined.
+                result = np.nan
+            else:
+                deviations = np.abs(self._buffer - median)
+                ranks = self._medianRanks(self.count)
+                deviations.partition(ranks)
+                result = float((deviations[ranks[0]] + deviations[ranks[1]]) / 2 / sps.norm.ppf(0.75))
+            self._results["sigmaMad"] = result
+        return result
+
+    def quantileSketch(self, rankError: float) -> QuantileSketch:
+        """Return a sketch of the non-NaN values, from which quantiles may be
+        estimated and which may be merged with sketches of other vectors.
+
+        Parameters
+        ----------
+        rankError : `float`
+            The fractional error in rank of the quantiles estimated, see
+            `QuantileSketch.fromRankError`.
+
+        Returns
+        -------
+        sketch : `QuantileSketch`
+            The sketch, which is shared by all callers asking for the same
+            rank error and must not be modified.
+        """
+        if (sketch := self._sketches.get(rankError)) is None:
+            sketch = self._sketches[rankError] = QuantileSketch.fromRankError(rankError)
+            sketch.update(self._buffer)
+        return sketch
+
+
+class VectorStatisticsCache:
+    """Share `VectorStatistics` between actions computing statistics of the
+    same vector with the same mask.
+
+    The actions to be called are planned first, so that the statistics each
+    vector is read for are computed together, and the buffer of a vector is
+    released after the last planned action reading it has been called.
+    Vectors which only one planned action reads are not cached.
+
+    Notes
+    -----
+    A cache is passed to actions in their keyword arguments with the name
+    ``vectorStatistics``, see
+    `ScalarAction.getStatisticNames`.
+    """
+
+    def __init__(self) -> None:
+        self._uses: dict[str, int] = {}
+        self._names: dict[str, set[str]] = {}
+        self._entries: dict[tuple, tuple[VectorStatistics, Vector, Vector | None]] = {}
+
+    def plan(self, actions: Iterable[Any], **kwargs: Any) -> None:
+        """Record the statistics actions will read.
+
+        Parameters
+        ----------
+        actions : `~collections.abc.Iterable`
+            The actions which will be called.
+        **kwargs
+            The keyword arguments the actions will be called with.
+        """
+        for action in actions:
+            names = tuple(getattr(action, "getStatisticNames", tuple)())
+            if not names:
+                continue
+            try:
+                key = action.vectorKey.format_map(kwargs)
+            except (AttributeError, KeyError):
+                continue
+            self._uses[key] = self._uses.get(key, 0) + 1
+            self._names.setdefault(key, set()).update(names)
+
+    def get(self, key: str, vector: Vector, mask: Vector | None = None) -> VectorStatistics:
+        """Return the statistics of a vector.
+
+        Parameters
+        ----------
+        key : `str`
+            The key the vector was read with.
+        vector : `Vector`
+            The vector.
+        mask : `Vector`, optional
+            The mask selecting values of the vector, if any.
+
+        Returns
+        -------
+        statistics : `VectorStatistics`
+            The statistics of the masked vector.
+        """
+        remaining = self._uses.get(key, 0) - 1
+        entryKey = (key, None if mask is None else id(mask))
+        entry = self._entries.pop(entryKey, None)
+        # The vector and mask are held by the entry, so their ids are not
+        # reused while it exists.
+        if entry is None or entry[1] is not vector or entry[2] is not mask:
+            statistics = VectorStatistics(vector, mask)
+            statistics.compute(self._names.get(key, ()))
+            entry = (statistics, vector, mask)
+        if remaining > 0:
+            # Keep the statistics for the other actions planned to read them.
+            self._uses[key] = remaining
+            self._entries[entryKey] = entry
+        else:
+            self._uses.pop(key, None)
+        return entry[0]
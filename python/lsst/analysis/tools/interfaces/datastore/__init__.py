@@ -1,2 +1,3 @@
 from ._dispatcher import *
 from ._sasquatchDatastore import *
+from ._spool import *
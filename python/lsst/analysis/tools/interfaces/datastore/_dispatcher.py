@@ -30,15 +30,18 @@ import json
 import logging
 import math
 import re
-from collections.abc import Mapping, MutableMapping, Sequence
+import threading
+from collections.abc import Callable, Hashable, Iterable, Iterator, Mapping, MutableMapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Any, cast
+from typing import TYPE_CHECKING, Any, TypeVar, cast
 from uuid import UUID, uuid4
 
 import requests
 from lsst.daf.butler import DatasetRef
 from lsst.resources import ResourcePath
 from lsst.utils.packages import getEnvironmentPackages
+from requests.adapters import HTTPAdapter
 
 if TYPE_CHECKING:
     from .. import MetricMeasurementBundle
@@ -64,11 +67,40 @@ IDENTIFIER_KEYS = [
     "day_obs",
 ]
 
+# Topics known to exist, keyed by the url and namespace of the proxy server.
+# These are shared by all dispatchers in a process, so that each topic is
+# created at most once.
+_KNOWN_TOPICS: dict[tuple[str, str], set[str]] = {}
+_KNOWN_TOPICS_LOCK = threading.Lock()
+
+# Encoders of records into avro, keyed by the namespace, the metric, and the
+# names and types of the fields of the records. A given metric produces
+# records of the same form every time, so these are shared by all
+# dispatchers in a process.
+_AVRO_ENCODERS: dict[tuple[str, str, tuple[tuple[str, Hashable], ...]], _AvroEncoder] = {}
+_AVRO_ENCODERS_LOCK = threading.Lock()
+
+_T = TypeVar("_T")
+_R = TypeVar("_R")
+
 
 class SasquatchDispatchPartialFailure(RuntimeError):
-    """This indicates that a Sasquatch dispatch was partially successful."""
+    """This indicates that a Sasquatch dispatch was partially successful.
 
-    pass
+    Parameters
+    ----------
+    *args
+        The arguments of `RuntimeError`.
+    unsent : `~collections.abc.Iterable` [`int`], optional
+        The positions, among the bundles dispatched together, of those with
+        records which were not sent. Other bundles were sent, though records
+        or fields which could not be encoded may have been left out of them.
+        `None` if it is not known which bundles were sent.
+    """
+
+    def __init__(self, *args: Any, unsent: Iterable[int] | None = None):
+        super().__init__(*args)
+        self.unsent = None if unsent is None else frozenset(unsent)
 
 
 class SasquatchDispatchFailure(RuntimeError):
@@ -157,6 +189,37 @@ def _tag2VersionTime(productStr: str) -> tuple[str, float]:
     return version, minTime.timestamp()
 
 
+@dataclass(frozen=True)
+class _AvroEncoder:
+    """The avro schema of records of a given form, and the fields which must
+    be removed from those records to match it.
+    """
+
+    schema: str
+    """The json encoded avro schema."""
+
+    dropped: tuple[str, ...]
+    """The fields for which no schema could be generated."""
+
+    def encode(self, record: MutableMapping[str, Any]) -> None:
+        """Remove the fields of a record which are not in the schema.
+
+        Parameters
+        ----------
+        record : `MutableMapping`
+            The record, which is modified in place.
+        """
+        for key in self.dropped:
+            del record[key]
+
+
+def _typeSignature(value: Any) -> Hashable:
+    """Return the types which determine the avro schema of a value."""
+    if isinstance(value, Sequence) and not isinstance(value, str):
+        return type(value), frozenset(map(type, value))
+    return type(value)
+
+
 @dataclass
 class SasquatchDispatcher:
     """This class mediates the transfer of MetricMeasurementBundles to a
@@ -172,15 +235,32 @@ class SasquatchDispatcher:
     namespace: str = "lsst.dm"
     """The namespace in Sasquatch in which to write the uploaded metrics"""
 
+    maxWorkers: int = 1
+    """The maximum number of requests made to the proxy server at once"""
+
+    maxBatchSize: int = 1000
+    """The maximum number of records sent to a topic in a single request"""
+
     def __post_init__(self) -> None:
         match ResourcePath(self.url).scheme:
             case "http" | "https":
                 pass
             case _:
                 raise ValueError("Proxy server must be locatable with either http or https")
+        if self.maxWorkers < 1:
+            raise ValueError(f"maxWorkers must be at least 1, not {self.maxWorkers}")
+        if self.maxBatchSize < 1:
+            raise ValueError(f"maxBatchSize must be at least 1, not {self.maxBatchSize}")
 
         self._cluster_id: str | None = None
 
+        # Connections to the proxy server are reused between requests, with
+        # one for each request which may be made at once.
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.maxWorkers)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
     @property
     def clusterId(self) -> str:
         """ClusterId of the Kafka proxy
@@ -198,7 +278,7 @@ class SasquatchDispatcher:
         """Get Sasquatch kafka cluster ID."""
 
         headers = {"content-type": "application/json"}
-        r = requests.get(f"{self.url}/v3/clusters", headers=headers)
+        r = self._session.get(f"{self.url}/v3/clusters", headers=headers)
 
         if r.status_code == requests.codes.ok:
             cluster_id = r.json()["data"][0]["cluster_id"]
@@ -222,7 +302,15 @@ class SasquatchDispatcher:
             If this does not encounter an error it will return a True success
             code, else it will return a False code.
 
+        Notes
+        -----
+        Topics which have been created, or found to exist, are remembered for
+        the lifetime of the process, and are not created again.
         """
+        with _KNOWN_TOPICS_LOCK:
+            knownTopics = _KNOWN_TOPICS.setdefault((self.url, self.namespace), set())
+            if topic_name in knownTopics:
+                return True
 
         headers = {"content-type": "application/json"}
 
@@ -232,19 +320,66 @@ class SasquatchDispatcher:
             "replication_factor": REPLICATION_FACTOR,
         }
 
-        r = requests.post(
+        r = self._session.post(
             f"{self.url}/v3/clusters/{self.clusterId}/topics", json=topic_config, headers=headers
         )
 
         if r.status_code == requests.codes.created:
             log.debug("Created topic %s.%s", self.namespace, topic_name)
-            return True
         elif r.status_code == requests.codes.bad_request:
             log.debug("Topic %s.%s already exists.", self.namespace, topic_name)
-            return True
         else:
             log.error("Uknown error occured creating kafka topic %s %s", r.status_code, r.json())
             return False
+        with _KNOWN_TOPICS_LOCK:
+            knownTopics.add(topic_name)
+        return True
+
+    def _map(self, function: Callable[[_T], _R], items: Sequence[_T]) -> Iterator[_R]:
+        """Call a function on each of a sequence of items, making up to
+        `maxWorkers` calls at once.
+
+        Parameters
+        ----------
+        function : `~collections.abc.Callable`
+            The function to call.
+        items : `~collections.abc.Sequence`
+            The items to call it on.
+
+        Returns
+        -------
+        results : `~collections.abc.Iterator`
+            The result of each call, in the order of the items.
+        """
+        if self.maxWorkers == 1 or len(items) < 2:
+            return map(function, items)
+        with ThreadPoolExecutor(max_workers=min(self.maxWorkers, len(items))) as executor:
+            # Gather the results before the executor is shut down.
+            return iter(list(executor.map(function, items)))
+
+    def _createTopics(self, topics: Iterable[str]) -> set[str]:
+        """Create the kafka topics in Sasquatch which are not known to exist.
+
+        Parameters
+        ----------
+        topics : `~collections.abc.Iterable` [`str`]
+            The names of the topics to create.
+
+        Returns
+        -------
+        created : `set` [`str`]
+            The names of the topics which exist.
+        """
+        topics = set(topics)
+        with _KNOWN_TOPICS_LOCK:
+            known = topics & _KNOWN_TOPICS.get((self.url, self.namespace), set())
+        unknown = sorted(topics - known)
+        if unknown:
+            # Find the cluster id once, rather than in each request.
+            self.clusterId
+        return known | {
+            topic for topic, status in zip(unknown, self._map(self._create_topic, unknown)) if status
+        }
 
     def _generateAvroSchema(self, metric: str, record: MutableMapping[str, Any]) -> tuple[str, bool]:
         """Infer the Avro schema from the record payload.
@@ -297,6 +432,39 @@ class SasquatchDispatcher:
 
         return json.dumps(schema), resultsTrimmed
 
+    def _getAvroEncoder(self, metric: str, record: Mapping[str, Any]) -> _AvroEncoder:
+        """Return the encoder of records of the same form as a record.
+
+        Schemas are generated once for each form of record, and are cached
+        for the lifetime of the process.
+
+        Parameters
+        ----------
+        metric : `str`
+            The name of the metric
+        record : `Mapping`
+            The prepared record, which is not modified.
+
+        Returns
+        -------
+        encoder : `_AvroEncoder`
+            The encoder.
+        """
+        key = (
+            self.namespace,
+            metric,
+            tuple((field, _typeSignature(value)) for field, value in record.items()),
+        )
+        with _AVRO_ENCODERS_LOCK:
+            encoder = _AVRO_ENCODERS.get(key)
+        if encoder is None:
+            encoded = dict(record)
+            schema, _ = self._generateAvroSchema(metric, encoded)
+            encoder = _AvroEncoder(schema, tuple(field for field in record if field not in encoded))
+            with _AVRO_ENCODERS_LOCK:
+                _AVRO_ENCODERS[key] = encoder
+        return encoder
+
     def _python2Avro(self, value: Any) -> Mapping:
         """Map python type to avro schema
 
@@ -671,43 +839,160 @@ class SasquatchDispatcher:
             extraFields=extraFields,
         )
 
-        headers = {"content-type": "application/vnd.kafka.avro.v2+json"}
-        data: dict[str, Any] = dict()
-        partialUpload = False
-        uploadFailed = []
+        self._upload([metricRecords], recordsTrimmed)
 
-        for metric, record in metricRecords.items():
-            # create the kafka topic if it does not already exist
-            if not self._create_topic(metric):
-                log.error("Topic not created, skipping dispatch of %s", metric)
-                continue
-            recordValue = record[0]["value"]
-            # Generate schemas for each record
-            data["value_schema"], schemaTrimmed = self._generateAvroSchema(metric, recordValue)
-            data["records"] = record
+    def dispatchBundles(self, bundles: Iterable[tuple[MetricMeasurementBundle, Mapping[str, Any]]]) -> None:
+        """Dispatch many `MetricMeasurementBundle` objects to Sasquatch.
 
-            if schemaTrimmed:
-                partialUpload = True
+        The records of all of the bundles are sent together, in one request
+        for each metric (or each `maxBatchSize` records of a metric), rather
+        than one request for each metric of each bundle.
 
-            r = requests.post(f"{self.url}/topics/{self.namespace}.{metric}", json=data, headers=headers)
+        Parameters
+        ----------
+        bundles : `~collections.abc.Iterable` [`tuple`]
+            Each bundle, with a mapping of the other keyword arguments
+            `dispatch` would be called with for it.
 
-            if r.status_code == requests.codes.ok:
-                log.debug("Succesfully sent data for metric %s", metric)
-                uploadFailed.append(False)
-            else:
-                log.error(
-                    "There was a problem submitting the metric %s: %s, %s", metric, r.status_code, r.json()
-                )
-                uploadFailed.append(True)
-                partialUpload = True
+        Raises
+        ------
+        SasquatchDispatchFailure
+            Raised if none of the records could be uploaded.
+        SasquatchDispatchPartialFailure
+            Raised if there were any errors in dispatching the bundles.
+        """
+        allRecords = []
+        recordsTrimmed = False
+        for bundle, kwargs in bundles:
+            metricRecords, trimmed = self._prepareBundle(bundle=bundle, **kwargs)
+            allRecords.append(metricRecords)
+            recordsTrimmed |= trimmed
+        self._upload(allRecords, recordsTrimmed)
+
+    def _upload(self, allRecords: Iterable[Mapping[str, list[Any]]], recordsTrimmed: bool) -> None:
+        """Send prepared records to Sasquatch.
+
+        Parameters
+        ----------
+        allRecords : `~collections.abc.Iterable` [`~collections.abc.Mapping`]
+            Mappings of metric name to records, as returned by
+            `_prepareBundle`.
+        recordsTrimmed : `bool`
+            Whether any records had to be skipped while preparing them.
+
+        Raises
+        ------
+        SasquatchDispatchFailure
+            Raised if none of the records could be uploaded.
+        SasquatchDispatchPartialFailure
+            Raised if there were any errors in dispatching the records.
+        """
+        uploadFailed, schemaTrimmed, unsent = self._send(allRecords)
 
         # There may be no metrics to try to upload, and thus the uploadFailed
         # list may be empty, check before issuing failure
         if len(uploadFailed) > 0 and all(uploadFailed):
             raise SasquatchDispatchFailure("All records were unable to be uploaded.")
 
-        if partialUpload or recordsTrimmed:
-            raise SasquatchDispatchPartialFailure("One or more records may not have been uploaded entirely")
+        if any(uploadFailed) or schemaTrimmed or recordsTrimmed:
+            raise SasquatchDispatchPartialFailure(
+                "One or more records may not have been uploaded entirely", unsent=unsent.keys()
+            )
+
+    def _send(
+        self, allRecords: Iterable[Mapping[str, list[Any]]]
+    ) -> tuple[list[bool], bool, dict[int, dict[str, list[Any]]]]:
+        """Send prepared records to Sasquatch, without raising if they could
+        not all be sent.
+
+        Parameters
+        ----------
+        allRecords : `~collections.abc.Iterable` [`~collections.abc.Mapping`]
+            Mappings of metric name to records, as returned by
+            `_prepareBundle`.
+
+        Returns
+        -------
+        uploadFailed : `list` [`bool`]
+            Whether each request failed, including those which were not made
+            because their topic could not be created.
+        schemaTrimmed : `bool`
+            Whether any fields had to be removed from records because a schema
+            could not be generated for them.
+        unsent : `dict` [`int`, `dict` [`str`, `list`]]
+            The records which were not sent, keyed by the position of the
+            mapping they were given in, then by metric name. Mappings all of
+            whose records were sent are absent.
+        """
+        schemaTrimmed = False
+
+        # Coalesce the records of each metric which share a schema, which
+        # those of the same metric from different bundles usually do. The
+        # mapping each record came from is kept, so that the records which
+        # could not be sent can be returned.
+        batches: dict[tuple[str, str], list[tuple[int, Any]]] = {}
+        for position, metricRecords in enumerate(allRecords):
+            for metric, records in metricRecords.items():
+                for record in records:
+                    # Find the schema of each record
+                    encoder = self._getAvroEncoder(metric, record["value"])
+                    if encoder.dropped:
+                        encoder.encode(record["value"])
+                        schemaTrimmed = True
+                    batches.setdefault((metric, encoder.schema), []).append((position, record))
+
+        # create the kafka topics if they do not already exist
+        created = self._createTopics(metric for metric, _ in batches)
+        uploadFailed = []
+        unsentRecords: list[tuple[str, list[tuple[int, Any]]]] = []
+        requestsToSend = []
+        requestRecords = []
+        for (metric, schema), records in batches.items():
+            if metric not in created:
+                log.error("Topic not created, skipping dispatch of %s", metric)
+                uploadFailed.append(True)
+                unsentRecords.append((metric, records))
+                continue
+            for start in range(0, len(records), self.maxBatchSize):
+                chunk = records[start : start + self.maxBatchSize]
+                requestsToSend.append((metric, schema, [record for _, record in chunk]))
+                requestRecords.append((metric, chunk))
+
+        for sent, (metric, records) in zip(self._map(self._postRecords, requestsToSend), requestRecords):
+            uploadFailed.append(not sent)
+            if not sent:
+                unsentRecords.append((metric, records))
+
+        unsent: dict[int, dict[str, list[Any]]] = {}
+        for metric, records in unsentRecords:
+            for position, record in records:
+                unsent.setdefault(position, {}).setdefault(metric, []).append(record)
+        return uploadFailed, schemaTrimmed, unsent
+
+    def _postRecords(self, request: tuple[str, str, list[Any]]) -> bool:
+        """Send records of a metric to its topic.
+
+        Parameters
+        ----------
+        request : `tuple` [`str`, `str`, `list`]
+            The name of the metric, the json encoded avro schema of the
+            records, and the records.
+
+        Returns
+        -------
+        status : `bool`
+            Whether the records were sent.
+        """
+        metric, schema, records = request
+        headers = {"content-type": "application/vnd.kafka.avro.v2+json"}
+        data = {"value_schema": schema, "records": records}
+        r = self._session.post(f"{self.url}/topics/{self.namespace}.{metric}", json=data, headers=headers)
+
+        if r.status_code == requests.codes.ok:
+            log.debug("Succesfully sent data for metric %s", metric)
+            return True
+        log.error("There was a problem submitting the metric %s: %s, %s", metric, r.status_code, r.json())
+        return False
 
     def dispatchRef(
         self,
@@ -743,24 +1028,73 @@ class SasquatchDispatcher:
         SasquatchDispatchPartialFailure
             Raised if there were any errors in dispatching a bundle.
         """
-        # Parse the relevant info out of the dataset ref.
+        self.dispatch(
+            bundle,
+            timestamp=timestamp,
+            extraFields=extraFields,
+            datasetIdentifier=datasetIdentifier,
+            **self._refArguments(ref),
+        )
+
+    def dispatchRefs(
+        self,
+        bundles: Iterable[tuple[MetricMeasurementBundle, DatasetRef]],
+        timestamp: datetime.datetime | None = None,
+        extraFields: Mapping | None = None,
+        datasetIdentifier: str | None = None,
+    ) -> None:
+        """Dispatch many `MetricMeasurementBundle` objects to Sasquatch with
+        known `DatasetRef` objects, see `dispatchBundles`.
+
+        Parameters
+        ----------
+        bundles : `~collections.abc.Iterable` [`tuple`]
+            Each bundle with its `DatasetRef`.
+        timestamp : `datetime.datetime`, optional
+            The timestamp to be associated with the measurements in the ingress
+            database. If this value is None, timestamp will be set by the run
+            time or current time.
+        extraFields: `Mapping`, optional
+            Extra mapping keys and values that will be added as fields to the
+            dispatched records if not None.
+        datasetIdentifier : `str`, optional
+            A string which will be used in creating unique identifier tags. If
+            None, a default value will be inserted.
+
+        Raises
+        ------
+        SasquatchDispatchFailure
+            Raised if none of the records could be uploaded.
+        SasquatchDispatchPartialFailure
+            Raised if there were any errors in dispatching the bundles.
+        """
+        self.dispatchBundles(
+            (
+                bundle,
+                dict(
+                    timestamp=timestamp,
+                    extraFields=extraFields,
+                    datasetIdentifier=datasetIdentifier,
+                    **self._refArguments(ref),
+                ),
+            )
+            for bundle, ref in bundles
+        )
+
+    @staticmethod
+    def _refArguments(ref: DatasetRef) -> dict[str, Any]:
+        """Parse the arguments of `dispatch` identifying a dataset out of its
+        `DatasetRef`.
+        """
         serializedRef = ref.to_simple()
-        id = serializedRef.id
         if serializedRef.run is None:
             run = "<unknown>"
         else:
             run = serializedRef.run
         dstype = serializedRef.datasetType
-        datasetType = dstype.name if dstype is not None else ""
-        dataRefMapping = serializedRef.dataId.dataId if serializedRef.dataId else None
-
-        self.dispatch(
-            bundle,
+        return dict(
             run=run,
-            timestamp=timestamp,
-            datasetType=datasetType,
-            id=id,
-            identifierFields=dataRefMapping,
-            extraFields=extraFields,
-            datasetIdentifier=datasetIdentifier,
+            datasetType=dstype.name if dstype is not None else "",
+            id=serializedRef.id,
+            identifierFields=serializedRef.dataId.dataId if serializedRef.dataId else None,
         )
@@ -37,6 +37,7 @@ from lsst.daf.butler.registry.interfaces import DatastoreRegistryBridge
 from lsst.resources import ResourcePath, ResourcePathExpression
 
 from . import SasquatchDispatcher
+from ._spool import SasquatchSpool
 
 if TYPE_CHECKING:
     from lsst.daf.butler import Config, DatasetType, LookupKey
@@ -99,6 +100,23 @@ class SasquatchDatastore(GenericBaseDatastore):
     "k1=v1;k2=v2".
     """
 
+    maxWorkers: int
+    """The maximum number of requests made to the restProxy at once.
+
+    This is read from the datastore config ``"maxWorkers"`` field, and is 1 if
+    that is not set.
+    """
+
+    spoolPath: str | None
+    """Path of a local `SasquatchSpool` which datasets are written to before
+    they are dispatched, or `None` to dispatch them directly.
+
+    The spool is read from the datastore config ``"spoolPath"`` field. It is
+    flushed by a background thread every ``"spoolFlushInterval"`` seconds
+    (default 10). Entries left in the spool when the process exits are sent
+    when it is next flushed, by this datastore or by ``verifyToSasquatch``.
+    """
+
     def __init__(
         self,
         config: DatastoreConfig,
@@ -133,7 +151,17 @@ class SasquatchDatastore(GenericBaseDatastore):
                 extra_fields[k] = v
         self.extra_fields = extra_fields if extra_fields else None
 
-        self._dispatcher = SasquatchDispatcher(self.restProxyUrl, self.accessToken, self.namespace)
+        self.maxWorkers = self.config.get("maxWorkers", 1)
+
+        self._dispatcher = SasquatchDispatcher(
+            self.restProxyUrl, self.accessToken, self.namespace, maxWorkers=self.maxWorkers
+        )
+
+        self.spoolPath = self.config.get("spoolPath")
+        self._spool: SasquatchSpool | None = None
+        if self.spoolPath is not None:
+            self._spool = SasquatchSpool(self.spoolPath, self._dispatcher)
+            self._spool.start(interval=self.config.get("spoolFlushInterval", 10.0))
 
     @classmethod
     def _create_from_config(
@@ -153,7 +181,10 @@ class SasquatchDatastore(GenericBaseDatastore):
 
     def put(self, inMemoryDataset: Any, ref: DatasetRef) -> None:
         if self.constraints.isAcceptable(ref):
-            self._dispatcher.dispatchRef(inMemoryDataset, ref, extraFields=self.extra_fields)
+            if self._spool is not None:
+                self._spool.put(inMemoryDataset, ref, extraFields=self.extra_fields)
+            else:
+                self._dispatcher.dispatchRef(inMemoryDataset, ref, extraFields=self.extra_fields)
         else:
             log.debug("Could not put dataset type %s with Sasquatch datastore", ref.datasetType)
             raise DatasetTypeNotSupportedError(
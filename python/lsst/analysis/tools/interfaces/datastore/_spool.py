@@ -0,0 +1,336 @@
+# This file is part of analysis_tools.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+__all__ = ("SasquatchSpool",)
+
+"""Durable spool of records waiting to be dispatched to Sasquatch"""
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Iterator, Mapping
+from contextlib import closing, contextmanager
+from typing import TYPE_CHECKING, Any
+
+import requests
+
+from ._dispatcher import SasquatchDispatcher
+
+if TYPE_CHECKING:
+    from lsst.daf.butler import DatasetRef
+
+    from .. import MetricMeasurementBundle
+
+
+log = logging.getLogger(__name__)
+
+
+class SasquatchSpool:
+    """A durable queue of records to dispatch to Sasquatch, held in a SQLite
+    database on local disk.
+
+    Bundles are prepared for dispatch and written to the spool, which is
+    flushed to Sasquatch separately, either by calling `flush` or by a
+    background thread started with `start`. Records which could not be sent
+    stay in the spool, and are retried with exponentially increasing delays,
+    so measurements are not lost while the proxy server is slow or down.
+    A spool left behind by an interrupted process may be flushed by another.
+
+    Parameters
+    ----------
+    path : `str`
+        The path of the SQLite database, which is created if it does not
+        exist.
+    dispatcher : `SasquatchDispatcher`
+        The dispatcher used to prepare and send records.
+    batchSize : `int`, optional
+        The maximum number of entries sent together when flushing.
+    initialDelay : `float`, optional
+        The delay in seconds before an entry which could not be sent is
+        retried for the first time. The delay doubles with each further
+        attempt.
+    maxDelay : `float`, optional
+        The maximum delay in seconds before an entry is retried.
+
+    Notes
+    -----
+    Each entry of the spool is keyed by the run, dataset type and data ID of
+    the dataset its records were prepared from (see `makeKey`), so a dataset
+    written to the spool again, by a `SasquatchDatastore` or by
+    ``verify_to_sasquatch.py``, replaces the records still waiting to be sent
+    rather than being sent twice.
+
+    The records of an entry which could not all be sent are replaced by those
+    which were not, so that records are not sent twice when the entry is
+    retried.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dispatcher: SasquatchDispatcher,
+        batchSize: int = 100,
+        initialDelay: float = 1.0,
+        maxDelay: float = 300.0,
+    ):
+        if batchSize < 1:
+            raise ValueError(f"batchSize must be at least 1, not {batchSize}")
+        self.path = os.path.abspath(path)
+        self.dispatcher = dispatcher
+        self.batchSize = batchSize
+        self.initialDelay = initialDelay
+        self.maxDelay = maxDelay
+        # Only one flush may send entries at a time, so that entries are not
+        # sent twice.
+        self._flushLock = threading.Lock()
+        self._stopEvent = threading.Event()
+        self._thread: threading.Thread | None = None
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS spool ("
+                "key TEXT PRIMARY KEY, "
+                "records TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, "
+                "next_attempt REAL NOT NULL DEFAULT 0)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection to the database, committing any changes made
+        through it on exit.
+
+        A connection is made for each use, so that the spool may be used from
+        several threads.
+        """
+        with closing(sqlite3.connect(self.path, timeout=60.0)) as connection:
+            with connection:
+                yield connection
+
+    @staticmethod
+    def makeKey(run: str, datasetType: str, identifierFields: Mapping[str, Any] | None = None) -> str:
+        """Make the key of the entry for the records of a dataset.
+
+        Parameters
+        ----------
+        run : `str`
+            The run of the dataset.
+        datasetType : `str`
+            The name of the dataset type of the dataset.
+        identifierFields : `~collections.abc.Mapping`, optional
+            The data ID of the dataset, either as a mapping or as a
+            `~lsst.daf.butler.DataCoordinate`.
+
+        Returns
+        -------
+        key : `str`
+            The key.
+        """
+        # The required values of a DataCoordinate are those of the data IDs
+        # of serialized dataset refs.
+        fields = getattr(identifierFields, "required", identifierFields) or {}
+        return json.dumps([run, datasetType, sorted((str(k), str(v)) for k, v in fields.items())])
+
+    def __len__(self) -> int:
+        with self._connect() as connection:
+            return connection.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def add(self, key: str, records: Mapping[str, list[Any]]) -> None:
+        """Add prepared records to the spool.
+
+        Parameters
+        ----------
+        key : `str`
+            The key identifying the records, such as a dataset id. Records
+            already in the spool with the same key are replaced.
+        records : `~collections.abc.Mapping` [`str`, `list`]
+            A mapping of metric name to records, as prepared by the
+            dispatcher.
+        """
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO spool (key, records) VALUES (?, ?)", (key, json.dumps(records))
+            )
+
+    def put(
+        self,
+        bundle: MetricMeasurementBundle,
+        ref: DatasetRef,
+        timestamp: datetime.datetime | None = None,
+        extraFields: Mapping | None = None,
+        datasetIdentifier: str | None = None,
+    ) -> None:
+        """Prepare a `MetricMeasurementBundle` with a known `DatasetRef` for
+        dispatch, and add it to the spool.
+
+        Parameters
+        ----------
+        bundle : `MetricMeasurementBundle`
+            The bundle containing metric values to upload.
+        ref : `DatasetRef`
+            The `Butler` dataset ref corresponding to the input
+            `MetricMeasurementBundle`.
+        timestamp : `datetime.datetime`, optional
+            The timestamp to be associated with the measurements in the ingress
+            database. If this value is None, timestamp will be set by the run
+            time or current time.
+        extraFields: `Mapping`, optional
+            Extra mapping keys and values that will be added as fields to the
+            dispatched record if not None.
+        datasetIdentifier : `str`, optional
+            A string which will be used in creating unique identifier tags. If
+            None, a default value will be inserted.
+        """
+        self.putBundle(
+            bundle,
+            timestamp=timestamp,
+            extraFields=extraFields,
+            datasetIdentifier=datasetIdentifier,
+            **SasquatchDispatcher._refArguments(ref),
+        )
+
+    def putBundle(self, bundle: MetricMeasurementBundle, key: str | None = None, **kwargs: Any) -> None:
+        """Prepare a `MetricMeasurementBundle` for dispatch, and add it to the
+        spool.
+
+        Parameters
+        ----------
+        bundle : `MetricMeasurementBundle`
+            The bundle containing metric values to upload.
+        key : `str`, optional
+            The key identifying the bundle in the spool. If `None`, the key
+            made by `makeKey` from the ``run``, ``datasetType`` and
+            ``identifierFields`` arguments is used.
+        **kwargs
+            The other arguments `SasquatchDispatcher.dispatch` would be called
+            with for the bundle.
+
+        Raises
+        ------
+        ValueError
+            Raised if neither a key nor a run and dataset type are given.
+        """
+        if key is None:
+            if kwargs.get("run") is None or kwargs.get("datasetType") is None:
+                raise ValueError("A key or the run and dataset type of the bundle are needed to spool it")
+            key = self.makeKey(kwargs["run"], kwargs["datasetType"], kwargs.get("identifierFields"))
+        records, recordsTrimmed = self.dispatcher._prepareBundle(bundle=bundle, **kwargs)
+        if recordsTrimmed:
+            log.warning("One or more records of %s could not be prepared and will not be uploaded", key)
+        self.add(key, records)
+
+    def flush(self) -> int:
+        """Send the entries of the spool which are due to be sent.
+
+        Entries are sent in batches. Entries all of whose records are sent
+        are removed from the spool. The records of other entries which could
+        not be sent are retried after a delay, and entries which are not yet
+        due to be retried are left in the spool.
+
+        Returns
+        -------
+        sent : `int`
+            The number of entries sent in full.
+        """
+        sent = 0
+        # Entries which could not be sent are not retried by the same flush.
+        start = time.time()
+        lastRow = 0
+        with self._flushLock:
+            while rows := self._due(start, lastRow):
+                lastRow = rows[-1][0]
+                allRecords = [json.loads(records) for _, _, records, _ in rows]
+                try:
+                    _, _, unsent = self.dispatcher._send(allRecords)
+                except requests.RequestException as err:
+                    log.warning("Could not reach Sasquatch: %s", err)
+                    unsent = dict(enumerate(allRecords))
+                # Entries are identified by rowid, which changes if an entry
+                # is replaced while it is being sent.
+                done = [(rowid,) for i, (rowid, _, _, _) in enumerate(rows) if i not in unsent]
+                with self._connect() as connection:
+                    connection.executemany("DELETE FROM spool WHERE rowid = ?", done)
+                sent += len(done)
+                if unsent:
+                    self._postpone([(rows[i][0], records, rows[i][3]) for i, records in unsent.items()])
+        return sent
+
+    def _due(self, start: float, lastRow: int) -> list[tuple[int, str, str, int]]:
+        with self._connect() as connection:
+            return connection.execute(
+                "SELECT rowid, key, records, attempts FROM spool "
+                "WHERE next_attempt <= ? AND rowid > ? ORDER BY rowid LIMIT ?",
+                (start, lastRow, self.batchSize),
+            ).fetchall()
+
+    def _postpone(self, entries: list[tuple[int, Mapping[str, list[Any]], int]]) -> None:
+        now = time.time()
+        updates = []
+        for rowid, records, attempts in entries:
+            delay = min(self.initialDelay * 2 ** min(attempts, 30), self.maxDelay)
+            updates.append((json.dumps(records), attempts + 1, now + delay, rowid))
+        log.warning("Could not send %d spooled entries in full, they will be retried", len(entries))
+        with self._connect() as connection:
+            connection.executemany(
+                "UPDATE spool SET records = ?, attempts = ?, next_attempt = ? WHERE rowid = ?", updates
+            )
+
+    def start(self, interval: float = 10.0) -> None:
+        """Start flushing the spool in a background thread.
+
+        Parameters
+        ----------
+        interval : `float`, optional
+            The number of seconds between flushes.
+        """
+        if self._thread is not None:
+            return
+        self._stopEvent.clear()
+
+        def run() -> None:
+            while not self._stopEvent.wait(interval):
+                try:
+                    self.flush()
+                except Exception:
+                    log.exception("Failed to flush the Sasquatch spool %s", self.path)
+
+        self._thread = threading.Thread(target=run, name="SasquatchSpool", daemon=True)
+        self._thread.start()
+
+    def stop(self, flush: bool = True) -> None:
+        """Stop flushing the spool in the background.
+
+        Parameters
+        ----------
+        flush : `bool`, optional
+            Whether to flush the spool once more after stopping.
+        """
+        if self._thread is not None:
+            self._stopEvent.set()
+            self._thread.join()
+            self._thread = None
+        if flush:
+            self.flush()
@@ -19,7 +19,10 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+from __future__ import annotations
+
 __all__ = (
+    "GroupIndex",
     "cos",
     "divide",
     "isPercent",
@@ -35,7 +38,9 @@ __all__ = (
     "sqrt",
 )
 
+import threading
 import warnings
+import weakref
 from typing import cast
 
 import astropy.units as u
@@ -205,3 +210,202 @@ def sqrt(values: Scalar | Vector) -> Scalar | Vector:
         warnings.filterwarnings(filterwarnings_action, numpy_invalid_value_sqrt)
         result = np.sqrt(values)
     return result
+
+
+class GroupIndex:
+    """An index of the rows of a vector ordered by the group each row belongs
+    to, allowing statistics to be computed for every group at once.
+
+    The rows are sorted by their group key once, after which each group
+    occupies a contiguous segment of the sorted rows. Statistics are then
+    computed with segmented reductions over the sorted values rather than
+    group by group. Groups are ordered by their key, and rows whose key is
+    NaN do not belong to any group, matching the behavior of
+    `pandas.DataFrame.groupby`.
+
+    Parameters
+    ----------
+    keys : `Vector`
+        The group key of each row.
+
+    Notes
+    -----
+    Use `fromKeys` to construct an index, so it is shared by everything
+    grouping on the same key vector. The key vector must therefore not be
+    modified in place after an index of it has been created.
+    """
+
+    reductions = frozenset(("count", "sum", "mean", "median", "std", "var", "min", "max", "sigmaMad"))
+    """The names of the statistics supported by `reduce`. These mirror the
+    equivalently named `pandas` aggregations, other than ``sigmaMad`` which
+    matches `nanSigmaMad`.
+    """
+
+    # Indexes of key vectors which are still alive, by the id of the vector.
+    _cache: dict[int, tuple[weakref.ref, GroupIndex]] = {}
+    _cacheLock = threading.Lock()
+
+    def __init__(self, keys: Vector):
+        keys = np.asarray(keys)
+        order = np.argsort(keys)
+        if keys.dtype.kind in "fc":
+            # NaN keys sort last and belong to no group.
+            order = order[: np.count_nonzero(~np.isnan(keys))]
+        sortedKeys = keys[order]
+        starts = np.flatnonzero(sortedKeys[1:] != sortedKeys[:-1]) + 1
+        self.order = order
+        """The rows belonging to a group, ordered by group (`Vector`)."""
+        self.offsets = np.concatenate(([0], starts, [len(order)])) if len(order) else np.zeros(1, dtype=int)
+        """The position in `order` at which each group starts, followed by
+        the number of grouped rows (`Vector`).
+        """
+        self.uniqueKeys = sortedKeys[self.offsets[:-1]]
+        """The key of each group, in ascending order (`Vector`)."""
+        self.sizes = np.diff(self.offsets)
+        """The number of rows in each group (`Vector`)."""
+        self.inverse = np.full(len(keys), -1, dtype=np.intp)
+        """The group number of each row, or -1 for rows with a NaN key
+        (`Vector`).
+        """
+        self.inverse[order] = np.repeat(np.arange(len(self.sizes)), self.sizes)
+
+    @classmethod
+    def fromKeys(cls, keys: Vector) -> GroupIndex:
+        """Return the index of a vector of group keys, reusing the index
+        already built for the same vector if there is one.
+
+        Parameters
+        ----------
+        keys : `Vector`
+            The group key of each row.
+
+        Returns
+        -------
+        index : `GroupIndex`
+            The index of the keys.
+        """
+        if not isinstance(keys, np.ndarray):
+            # Only arrays are guaranteed to be the same object each time the
+            # same vector is read.
+            return cls(keys)
+        with cls._cacheLock:
+            ref, index = cls._cache.get(id(keys), (None, None))
+            if ref is not None and ref() is keys:
+                return index
+        index = cls(keys)
+        with cls._cacheLock:
+            cls._cache[id(keys)] = (weakref.ref(keys), index)
+        # Forget the index once nothing else refers to the keys.
+        weakref.finalize(keys, cls._cache.pop, id(keys), None)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+    def reduce(self, values: Vector, func: str) -> Vector:
+        """Compute a statistic of the non-NaN values of every group.
+
+        Parameters
+        ----------
+        values : `Vector`
+            The value of each row.
+        func : `str`
+            The name of the statistic, one of `reductions`.
+
+        Returns
+        -------
+        result : `Vector`
+            The statistic of each group, in the order of `uniqueKeys`. Groups
+            with too few non-NaN values have a NaN statistic, or a zero
+            count or sum.
+        """
+        if func not in self.reductions:
+            raise ValueError(f"Unsupported group statistic {func}, must be one of {sorted(self.reductions)}")
+        values = np.asarray(values)[self.order]
+        if len(self) == 0:
+            return np.zeros(0, dtype=int if func == "count" else float)
+        starts = self.offsets[:-1]
+        if values.dtype.kind not in "fc":
+            if func in ("min", "max"):
+                # Keep the type of values which can not be NaN.
+                return (np.minimum if func == "min" else np.maximum).reduceat(values, starts)
+            values = values.astype(float)
+        valid = ~np.isnan(values)
+        counts = np.add.reduceat(valid, starts)
+        match func:
+            case "count":
+                return counts
+            case "min":
+                return np.fmin.reduceat(values, starts)
+            case "max":
+                return np.fmax.reduceat(values, starts)
+            case "median":
+                return self._segmentMedian(values, counts)
+            case "sigmaMad":
+                medians = self._segmentMedian(values, counts)
+                deviations = np.abs(values - np.repeat(medians, self.sizes))
+                return self._segmentMedian(deviations, counts) / sps.norm.ppf(0.75)
+        sums = np.add.reduceat(np.where(valid, values, 0.0), starts)
+        if func == "sum":
+            return sums
+        means = np.divide(sums, counts, out=np.full(len(self), np.nan), where=counts > 0)
+        if func == "mean":
+            return means
+        residuals = np.where(valid, values - np.repeat(means, self.sizes), 0.0)
+        variances = np.divide(
+            np.add.reduceat(residuals**2, starts),
+            counts - 1,
+            out=np.full(len(self), np.nan),
+            where=counts > 1,
+        )
+        return variances if func == "var" else np.sqrt(variances)
+
+    def _segmentMedian(self, values: Vector, counts: Vector) -> Vector:
+        """Compute the median of the non-NaN values of every group, given
+        values ordered by group.
+        """
+        values = self._sortWithinGroups(values)
+        starts = self.offsets[:-1]
+        lower = values[starts + np.maximum(counts - 1, 0) // 2]
+        upper = values[starts + counts // 2 - (counts == 0)]
+        return np.where(counts > 0, (lower + upper) / 2, np.nan)
+
+    def _sortWithinGroups(self, values: Vector) -> Vector:
+        """Sort values ordered by group within each group, with NaN values
+        at the end of each group.
+        """
+        # Groups with similar sizes are padded with NaN to the same width,
+        # so each group is sorted as a row of a 2D array. This avoids sorting
+        # all of the values at once, and uses at most twice the memory of
+        # the values.
+        result = np.empty_like(values)
+        widths = np.ceil(np.log2(np.maximum(self.sizes, 1))).astype(int)
+        for width in np.unique(widths):
+            members = np.flatnonzero(widths == width)
+            sizes = self.sizes[members]
+            rows = np.repeat(np.arange(len(members)), sizes)
+            columns = np.arange(len(rows)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+            positions = np.repeat(self.offsets[members], sizes) + columns
+            padded = np.full((len(members), 2**width), np.nan)
+            padded[rows, columns] = values[positions]
+            padded.sort(axis=1)
+            result[positions] = padded[rows, columns]
+        return result
+
+    def broadcast(self, groupValues: Vector) -> Vector:
+        """Return the value of the group each row belongs to.
+
+        Parameters
+        ----------
+        groupValues : `Vector`
+            A value for each group, in the order of `uniqueKeys`.
+
+        Returns
+        -------
+        result : `Vector`
+            The value of each row's group, or NaN for rows with a NaN key.
+        """
+        result = np.full(len(self.inverse), np.nan)
+        grouped = self.inverse >= 0
+        result[grouped] = np.asarray(groupValues)[self.inverse[grouped]]
+        return result
@@ -92,8 +92,14 @@ class AstrometricCatalogMatchTask(CatalogMatchTask):
         )
 
         skymap = inputs.pop("skymap")
-        loadedRefCat = self._loadRefCat(loaderTask, skymap[tract])
-        outputs = self.run(targetCatalog=table, refCatalog=loadedRefCat, bands=self.config.bands)
+        cacheKey = self._refCatCacheKey(inputs["refCat"], butlerQC.quantum.dataId["skymap"], tract)
+        loadedRefCat = self._loadRefCat(loaderTask, skymap[tract], cacheKey=cacheKey)
+        selections = {"matchedCatalog": self.config}
+        for name, selection in self.config.extraMatchSelections.items():
+            selections[f"matchedCatalog_{name}"] = selection
+        outputs = self.runMultiple(
+            targetCatalog=table, refCatalog=loadedRefCat, bands=self.config.bands, selections=selections
+        )
 
         butlerQC.put(outputs, outputRefs)
 
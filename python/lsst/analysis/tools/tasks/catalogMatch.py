@@ -19,14 +19,21 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-__all__ = ("CatalogMatchConfig", "CatalogMatchTask")
+__all__ = ("CatalogMatchConfig", "CatalogMatchSelectionConfig", "CatalogMatchTask", "ReferenceCatalogCache")
 
+import dataclasses
+import functools
+import hashlib
+import json
+import os
+import shutil
+import tempfile
 
 import lsst.geom
 import lsst.pex.config as pexConfig
 import lsst.pipe.base as pipeBase
 import numpy as np
-from astropy.table import Table, hstack, vstack
+from astropy.table import Column, MaskedColumn, Table
 from astropy.time import Time
 from lsst.pex.config.configurableActions import ConfigurableActionStructField
 from lsst.pipe.tasks.loadReferenceCatalog import LoadReferenceCatalogTask
@@ -79,6 +86,33 @@ class CatalogMatchConnections(
         dimensions=("tract", "skymap"),
     )
 
+    def __init__(self, *, config=None):
+        super().__init__(config=config)
+        # Each extra selection is matched with the main one, and written to
+        # its own output.
+        for name in config.extraMatchSelections:
+            setattr(
+                self,
+                f"matchedCatalog_{name}",
+                dataclasses.replace(self.matchedCatalog, name=f"{self.matchedCatalog.name}_{name}"),
+            )
+
+
+class CatalogMatchSelectionConfig(pexConfig.Config):
+    """A selection of the target catalog whose matches are made together
+    with those of the catalog selected by `CatalogMatchConfig`.
+    """
+
+    selectorBands = pexConfig.ListField[str](
+        doc="Band to use when selecting objects, primarily for extendedness.",
+        default=["i"],
+    )
+
+    sourceSelectorActions = ConfigurableActionStructField[VectorAction](
+        doc="What types of sources to use.",
+        default={},
+    )
+
 
 class CatalogMatchConfig(pipeBase.PipelineTaskConfig, pipelineConnections=CatalogMatchConnections):
     referenceCatalogLoader = pexConfig.ConfigurableField(
@@ -180,12 +214,228 @@ class CatalogMatchConfig(pipeBase.PipelineTaskConfig, pipelineConnections=Catalo
         default=False,
     )
 
+    matchMethod = pexConfig.ChoiceField[str](
+        doc="How to match the target catalog to the reference catalog.",
+        default="radius",
+        allowed={
+            "radius": "Keep the pairs of objects within the match radius.",
+            "nearest": "Find the nCandidates nearest reference objects within the match radius of each "
+            "target, assign targets to reference objects one-to-one, nearest pairs first, and add "
+            "columns describing how ambiguous each match is.",
+        },
+    )
+
+    nCandidates = pexConfig.Field[int](
+        doc="The number of nearest reference objects to consider for each target, if matchMethod is "
+        "'nearest'.",
+        default=3,
+        check=lambda x: x >= 1,
+    )
+
+    ambiguityRatio = pexConfig.Field[float](
+        doc="Matches made with matchMethod 'nearest' are flagged as ambiguous if the ratio of the distances "
+        "of the target to its nearest and second-nearest candidates is at least this.",
+        default=0.5,
+    )
+
+    extraMatchSelections = pexConfig.ConfigDictField(
+        keytype=str,
+        itemtype=CatalogMatchSelectionConfig,
+        doc="Other selections of the target catalog to match at the same time, keyed by a name which "
+        "is appended to the name of the matched catalog to name their outputs. The reference catalog "
+        "is loaded and indexed, and the target catalog read, once for all of them. Only used by "
+        "tract-level tasks.",
+        default={},
+    )
+
+    refCatCacheDir = pexConfig.Field[str](
+        doc="Directory in which to cache the reference catalog loaded for each tract, so that other "
+        "quanta matching to the same tract and reference catalog memory-map it rather than "
+        "loading it again. If None, reference catalogs are not cached.",
+        default=None,
+        optional=True,
+    )
+
     def setDefaults(self):
         super().setDefaults()
         self.referenceCatalogLoader.doReferenceSelection = False
         self.referenceCatalogLoader.doApplyColorTerms = False
 
 
+def _fillValue(dtype):
+    """Return the value that fills the missing rows of a column of a given
+    `numpy.dtype`.
+    """
+    if dtype.kind in "fc":
+        return np.nan
+    elif dtype.kind in "US":
+        return ""
+    return np.zeros((), dtype=dtype).item()
+
+
+def _takeColumn(name, column, indices, nRows):
+    """Make a column whose first rows are taken from another column.
+
+    Parameters
+    ----------
+    name : `str`
+        The name of the new column.
+    column : `astropy.table.Column`
+        The column to take rows from.
+    indices : `numpy.ndarray` [`int`]
+        The indices of the rows to take.
+    nRows : `int`
+        The number of rows of the new column. Rows beyond those taken are
+        filled according to the type of the column, and masked.
+
+    Returns
+    -------
+    newColumn : `astropy.table.Column` or `astropy.table.MaskedColumn`
+        The new column, which is masked if the column was or if rows are
+        missing.
+    """
+    values = np.asarray(column)
+    unit = getattr(column, "unit", None)
+    description = getattr(column, "description", None)
+    data = np.empty((nRows,) + values.shape[1:], dtype=values.dtype)
+    data[: len(indices)] = values[indices]
+    columnMask = getattr(column, "mask", None)
+    if len(indices) == nRows and columnMask is None:
+        return Column(data, name=name, unit=unit, description=description)
+    data[len(indices) :] = _fillValue(values.dtype)
+    mask = np.ones(data.shape, dtype=bool)
+    mask[: len(indices)] = False if columnMask is None else np.asarray(columnMask)[indices]
+    return MaskedColumn(data, name=name, mask=mask, unit=unit, description=description)
+
+
+def _assignGreedily(targetIndices, refIndices, dists):
+    """Assign targets to reference objects one-to-one, greedily by distance.
+
+    Parameters
+    ----------
+    targetIndices : `numpy.ndarray` [`int`]
+        The targets of the candidate pairs.
+    refIndices : `numpy.ndarray` [`int`]
+        The reference objects of the candidate pairs.
+    dists : `numpy.ndarray` [`float`]
+        The distances between the candidate pairs.
+
+    Returns
+    -------
+    assigned : `numpy.ndarray` [`bool`]
+        Whether each candidate pair is assigned.
+
+    Notes
+    -----
+    The assignment is that made by taking the candidate pairs in order of
+    distance, with ties kept in their input order, and keeping each whose
+    target and reference object are both unassigned. Rather than looping
+    over the pairs, each round assigns every pair which is the first
+    remaining pair of both its target and its reference object, and drops
+    the other pairs of those, which gives the same assignment. The pairs are
+    sorted once, and each round only considers the pairs still unresolved.
+    """
+    assigned = np.zeros(len(dists), dtype=bool)
+    targetTaken = np.zeros(np.max(targetIndices, initial=-1) + 1, dtype=bool)
+    refTaken = np.zeros(np.max(refIndices, initial=-1) + 1, dtype=bool)
+    # Pairs are kept in order of distance, so the first remaining pair of a
+    # target or reference object is its nearest.
+    remaining = np.argsort(dists, kind="stable")
+    while remaining.size:
+        targets = targetIndices[remaining]
+        refs = refIndices[remaining]
+        first = np.zeros(remaining.size, dtype=bool)
+        first[np.unique(targets, return_index=True)[1]] = True
+        firstRef = np.zeros(remaining.size, dtype=bool)
+        firstRef[np.unique(refs, return_index=True)[1]] = True
+        first &= firstRef
+        assigned[remaining[first]] = True
+        targetTaken[targets[first]] = True
+        refTaken[refs[first]] = True
+        remaining = remaining[~(targetTaken[targets] | refTaken[refs])]
+    return assigned
+
+
+class ReferenceCatalogCache:
+    """A cache on disk of loaded reference catalogs.
+
+    Each catalog is stored as a directory holding a ``.npy`` file for every
+    column, which are memory-mapped when the catalog is read, so quanta
+    sharing a catalog (on the same node, or through a shared filesystem)
+    neither load it from the reference catalog shards again nor each hold a
+    copy in memory. Magnitudes and their errors are stored in single
+    precision.
+
+    Parameters
+    ----------
+    directory : `str`
+        The directory of the cache, which is created if it does not exist.
+    """
+
+    compactColumns = ("refMag", "refMagErr")
+    """Columns stored in single precision (`tuple` [`str`])."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest())
+
+    def get(self, key):
+        """Read a catalog from the cache.
+
+        Parameters
+        ----------
+        key : `str`
+            The key identifying the catalog.
+
+        Returns
+        -------
+        catalog : `astropy.table.Table` or `None`
+            The catalog, with memory-mapped columns, or `None` if it is not
+            in the cache.
+        """
+        path = self._path(key)
+        try:
+            with open(os.path.join(path, "columns.json")) as f:
+                names = json.load(f)
+        except FileNotFoundError:
+            return None
+        columns = [np.load(os.path.join(path, f"{i}.npy"), mmap_mode="r") for i in range(len(names))]
+        return Table(columns, names=names, copy=False)
+
+    def put(self, key, catalog):
+        """Write a catalog to the cache.
+
+        Parameters
+        ----------
+        key : `str`
+            The key identifying the catalog.
+        catalog : `astropy.table.Table`
+            The catalog. If a catalog with the same key is already in the
+            cache it is kept.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        # The catalog is written to a temporary directory which is then
+        # renamed, so that it is never read in part.
+        tempDir = tempfile.mkdtemp(dir=self.directory, prefix=".tmp")
+        try:
+            for i, name in enumerate(catalog.colnames):
+                values = np.asarray(catalog[name])
+                if name in self.compactColumns:
+                    values = values.astype(np.float32)
+                np.save(os.path.join(tempDir, f"{i}.npy"), values)
+            with open(os.path.join(tempDir, "columns.json"), "w") as f:
+                json.dump(catalog.colnames, f)
+            os.rename(tempDir, self._path(key))
+        except OSError:
+            # Another quantum cached the same catalog first.
+            if not os.path.isdir(self._path(key)):
+                raise
+        finally:
+            shutil.rmtree(tempDir, ignore_errors=True)
+
+
 class CatalogMatchTask(pipeBase.PipelineTask):
     """The base task for matching catalogs. Figures out which columns
     it needs to grab for the downstream tasks and then matches the
@@ -223,15 +473,57 @@ class CatalogMatchTask(pipeBase.PipelineTask):
         Applies the suffix, _target, to the catalog being matched
         and _ref to the reference catalog being matched to.
         """
-        # Apply the selectors to the catalog
-        mask = np.ones(len(targetCatalog), dtype=bool)
-        for selector in self.config.sourceSelectorActions:
-            for band in self.config.selectorBands:
-                mask &= selector(targetCatalog, band=band).astype(bool)
+        return self.runMultiple(
+            targetCatalog=targetCatalog,
+            refCatalog=refCatalog,
+            bands=bands,
+            selections={"matchedCatalog": self.config},
+        )
+
+    def runMultiple(self, *, targetCatalog, refCatalog, bands, selections):
+        """Match a catalog to a reference catalog once, and return the
+        matches of several selections of the catalog.
+
+        Parameters
+        ----------
+        `targetCatalog` : astropy.table.Table
+            The catalog to be matched
+        `refCatalog` : astropy.table.Table
+            The catalog to be matched to
+        `bands` : list
+            A list of bands to apply the selectors in
+        `selections` : dict
+            The selections of the catalog to return the matches of, keyed by
+            name. Each is a config with ``selectorBands`` and
+            ``sourceSelectorActions`` fields, such as a
+            `CatalogMatchSelectionConfig` or the config of this task.
 
-        targetCatalog = targetCatalog[mask]
+        Returns
+        -------
+        `result` : lsst.pipe.base.Struct
+            The matched catalog (astropy.table.Table) of each selection, with
+            the same name as the selection.
 
-        if (len(targetCatalog) == 0) or (len(refCatalog)) == 0:
+        Notes
+        -----
+        The reference catalog is indexed and queried once, for all of the
+        targets in any selection, and the matches of each selection are
+        picked out of the pairs found. The matched catalog of each selection
+        is the same as `run` would return if configured with it.
+        """
+        # Apply the selectors of each selection to the catalog
+        masks = {}
+        for name, selection in selections.items():
+            mask = np.ones(len(targetCatalog), dtype=bool)
+            for selector in selection.sourceSelectorActions:
+                for band in selection.selectorBands:
+                    mask &= selector(targetCatalog, band=band).astype(bool)
+            masks[name] = mask
+
+        queryIndices = np.flatnonzero(functools.reduce(np.logical_or, masks.values()))
+        loadedRefCatalog = refCatalog
+
+        if (len(queryIndices) == 0) or (len(refCatalog)) == 0:
             refMatchIndices = np.array([], dtype=np.int64)
             targetMatchIndices = np.array([], dtype=np.int64)
             dists = np.array([], dtype=np.float64)
@@ -248,76 +540,207 @@ class CatalogMatchTask(pipeBase.PipelineTask):
             refDecs = refCatalog[self.config.refDecColumn]
             refRaDecFiniteMask = np.isfinite(refRas) & np.isfinite(refDecs)
             refCatalog = refCatalog[refRaDecFiniteMask]
+            targetRas = np.asarray(targetCatalog[self.config.targetRaColumn])[queryIndices]
+            targetDecs = np.asarray(targetCatalog[self.config.targetDecColumn])[queryIndices]
             with Matcher(refCatalog[self.config.refRaColumn], refCatalog[self.config.refDecColumn]) as m:
-                idx, refMatchIndices, targetMatchIndices, dists = m.query_radius(
-                    targetCatalog[self.config.targetRaColumn],
-                    targetCatalog[self.config.targetDecColumn],
-                    self.config.matchRadius / 3600.0,
-                    return_indices=True,
-                )
+                if self.config.matchMethod == "nearest":
+                    dists, refMatchIndices = m.query_knn(
+                        targetRas,
+                        targetDecs,
+                        k=self.config.nCandidates,
+                        distance_upper_bound=self.config.matchRadius / 3600.0,
+                        return_distances=True,
+                    )
+                    # Targets with fewer candidates than requested are given
+                    # missing neighbors, with infinite distances.
+                    dists = np.reshape(dists, (len(queryIndices), -1))
+                    refMatchIndices = np.reshape(refMatchIndices, dists.shape)
+                    found = np.isfinite(dists) & (refMatchIndices < len(refCatalog))
+                    targetMatchIndices = np.nonzero(found)[0]
+                    refMatchIndices = refMatchIndices[found]
+                    dists = dists[found]
+                else:
+                    idx, refMatchIndices, targetMatchIndices, dists = m.query_radius(
+                        targetRas,
+                        targetDecs,
+                        self.config.matchRadius / 3600.0,
+                        return_indices=True,
+                    )
+            targetMatchIndices = queryIndices[targetMatchIndices]
 
             # Convert degrees to arcseconds.
             dists *= 3600.0
 
-        targetCatalogMatched = targetCatalog[targetMatchIndices]
-        refCatalogMatched = refCatalog[refMatchIndices]
+        matchedCatalogs = {}
+        for name, mask in masks.items():
+            keep = mask[targetMatchIndices]
+            pairs = (refMatchIndices[keep], targetMatchIndices[keep], dists[keep])
+            matchColumns = {}
+            if self.config.matchMethod == "nearest":
+                # The candidates of each target do not depend on the other
+                # targets, so each selection is assigned from its own.
+                pairs, matchColumns = self._assignNearest(*pairs)
+            matchedCatalogs[name] = self._makeMatchedCatalog(
+                targetCatalog,
+                # Nothing was filtered from the reference catalog if there
+                # were no targets to match.
+                refCatalog if mask.any() else loadedRefCatalog,
+                *pairs,
+                bands,
+                matchColumns,
+            )
+        return pipeBase.Struct(**matchedCatalogs)
+
+    def _assignNearest(self, refCandidateIndices, targetCandidateIndices, candidateDists):
+        """Assign targets to reference objects one-to-one from their nearest
+        candidates, and measure how ambiguous each match is.
 
-        targetCols = targetCatalogMatched.columns.copy()
-        for col in targetCols:
-            targetCatalogMatched.rename_column(col, col + "_target")
-        refCols = refCatalogMatched.columns.copy()
-        for col in refCols:
-            refCatalogMatched.rename_column(col, col + "_ref")
+        Parameters
+        ----------
+        `refCandidateIndices` : numpy.ndarray
+            The indices of the reference objects of the candidate pairs
+        `targetCandidateIndices` : numpy.ndarray
+            The indices of the targets of the candidate pairs
+        `candidateDists` : numpy.ndarray
+            The distances between the candidate pairs, in arcseconds
+
+        Returns
+        -------
+        `pairs` : tuple [numpy.ndarray]
+            The reference indices, target indices and distances of the
+            assigned pairs, in order of distance.
+        `matchColumns` : dict [str, numpy.ndarray]
+            Measures of the ambiguity of each assigned pair:
+
+            - ``matchCandidates``: the number of candidates of the target
+              (at most ``nCandidates``);
+            - ``matchRefCandidates``: the number of targets the reference
+              object is a candidate of;
+            - ``matchDistanceRatio``: the ratio of the distances to the
+              nearest and second-nearest candidates of the target, or NaN if
+              it has one candidate;
+            - ``matchAmbiguous``: whether the ratio is at least
+              ``ambiguityRatio``, or the reference object is a candidate of
+              another target.
+        """
+        # Group the candidates of each target, nearest first.
+        order = np.lexsort((candidateDists, targetCandidateIndices))
+        targets = targetCandidateIndices[order]
+        dists = candidateDists[order]
+        firsts = np.flatnonzero(np.diff(targets, prepend=-1))
+        uniqueTargets = targets[firsts]
+        nCandidates = np.diff(firsts, append=len(targets))
+        distanceRatio = np.full(len(firsts), np.nan)
+        hasSecond = nCandidates > 1
+        distanceRatio[hasSecond] = dists[firsts[hasSecond]] / dists[firsts[hasSecond] + 1]
+        uniqueRefs, nRefCandidates = np.unique(refCandidateIndices, return_counts=True)
+
+        assigned = np.flatnonzero(
+            _assignGreedily(targetCandidateIndices, refCandidateIndices, candidateDists)
+        )
+        assigned = assigned[np.argsort(candidateDists[assigned], kind="stable")]
+        refIndices = refCandidateIndices[assigned]
+        targetIndices = targetCandidateIndices[assigned]
+
+        targetRows = np.searchsorted(uniqueTargets, targetIndices)
+        ratio = distanceRatio[targetRows]
+        refCandidates = nRefCandidates[np.searchsorted(uniqueRefs, refIndices)]
+        matchColumns = {
+            "matchCandidates": nCandidates[targetRows],
+            "matchRefCandidates": refCandidates,
+            "matchDistanceRatio": ratio,
+            "matchAmbiguous": (ratio >= self.config.ambiguityRatio) | (refCandidates > 1),
+        }
+        return (refIndices, targetIndices, candidateDists[assigned]), matchColumns
+
+    def _makeMatchedCatalog(
+        self, targetCatalog, refCatalog, refMatchIndices, targetMatchIndices, dists, bands, matchColumns=None
+    ):
+        """Make the table of matches, and of unmatched reference objects if
+        configured.
+
+        Parameters
+        ----------
+        `targetCatalog` : astropy.table.Table
+            The catalog that was matched
+        `refCatalog` : astropy.table.Table
+            The catalog that was matched to
+        `refMatchIndices` : numpy.ndarray
+            The indices of the matched rows of the reference catalog
+        `targetMatchIndices` : numpy.ndarray
+            The indices of the matched rows of the target catalog
+        `dists` : numpy.ndarray
+            The distances between the matches, in arcseconds
+        `bands` : list
+            The bands of the magnitudes of the reference catalog
+        `matchColumns` : dict, optional
+            Other columns describing each match, keyed by name
+
+        Returns
+        -------
+        `matchedCatalog` : astropy.table.Table
+        """
+        # Map the names of the output columns to the columns they are taken
+        # from once, and assemble each output column directly from the match
+        # indices.
+        refColumns = {}
+        for col in refCatalog.colnames:
+            if self.config.matchesRefCat and col in ("refMag", "refMagErr"):
+                continue
+            refColumns[col + "_ref"] = refCatalog[col]
+        if self.config.matchesRefCat:
+            for i, band in enumerate(bands):
+                refColumns[band + "_mag_ref"] = refCatalog["refMag"][:, i]
+                refColumns[band + "_magErr_ref"] = refCatalog["refMagErr"][:, i]
+
+        if self.config.returnNonMatches:
+            unmatched = np.ones(len(refCatalog), dtype=bool)
+            unmatched[refMatchIndices] = False
+            refIndices = np.concatenate([refMatchIndices, np.flatnonzero(unmatched)])
+        else:
+            refIndices = refMatchIndices
+        nMatched = len(refMatchIndices)
+        nRows = len(refIndices)
+
+        columns = []
+        for col in targetCatalog.colnames:
+            columns.append(_takeColumn(col + "_target", targetCatalog[col], targetMatchIndices, nRows))
+        for name, column in refColumns.items():
+            columns.append(_takeColumn(name, column, refIndices, nRows))
+        matchDistance = np.full(nRows, np.nan)
+        matchDistance[:nMatched] = dists
+        columns.append(Column(matchDistance, name="matchDistance"))
+        for name, values in (matchColumns or {}).items():
+            columns.append(_takeColumn(name, values, np.arange(nMatched), nRows))
 
         if self.config.returnNonMatches:
-            unmatchedIndices = list(set(np.arange(0, len(refCatalog))) - set(refMatchIndices))
-            refCatalogNotMatched = refCatalog[unmatchedIndices]
             # We need to set the relevant flag columns to
             # true or false so that they make it through the
             # selectors even though the none matched sources
             # don't have values for those columns.
-            trueFlagCols = []
-            falseFlagCols = []
+            flagValues = {}
             for selectorAction in [self.config.selectorActions, self.config.extraColumnSelectors]:
                 for selector in selectorAction:
                     try:
                         for flag in selector.selectWhenTrue:
-                            trueFlagCols.append(flag)
+                            flagValues[flag] = True
                         for flag in selector.selectWhenFalse:
-                            falseFlagCols.append(flag)
+                            flagValues[flag] = False
                     except AttributeError:
                         continue
-            for col in refCols:
-                refCatalogNotMatched.rename_column(col, col + "_ref")
-            for col in targetCols:
-                refCatalogNotMatched[col] = [np.nan] * len(refCatalogNotMatched)
-            for col in trueFlagCols:
-                refCatalogNotMatched[col] = [True] * len(refCatalogNotMatched)
-            for col in falseFlagCols:
-                refCatalogNotMatched[col] = [False] * len(refCatalogNotMatched)
-
-        if self.config.matchesRefCat:
-            for i, band in enumerate(bands):
-                refCatalogMatched[band + "_mag_ref"] = refCatalogMatched["refMag_ref"][:, i]
-                refCatalogMatched[band + "_magErr_ref"] = refCatalogMatched["refMagErr_ref"][:, i]
-            refCatalogMatched.remove_column("refMag_ref")
-            refCatalogMatched.remove_column("refMagErr_ref")
-
-            if self.config.returnNonMatches:
-                for i, band in enumerate(bands):
-                    refCatalogNotMatched[band + "_mag_ref"] = refCatalogNotMatched["refMag_ref"][:, i]
-                    refCatalogNotMatched[band + "_magErr_ref"] = refCatalogNotMatched["refMagErr_ref"][:, i]
-                refCatalogNotMatched.remove_column("refMag_ref")
-                refCatalogNotMatched.remove_column("refMagErr_ref")
-
-        tMatched = hstack([targetCatalogMatched, refCatalogMatched], join_type="exact")
-        tMatched["matchDistance"] = dists
-
-        if self.config.returnNonMatches:
-            refCatalogNotMatched["matchDistance"] = [np.nan] * len(refCatalogNotMatched)
-            tMatched = vstack([tMatched, refCatalogNotMatched])
-
-        return pipeBase.Struct(matchedCatalog=tMatched)
+            # The rows of the reference catalog that were not matched have
+            # the unsuffixed target columns, which the matched rows do not.
+            extraColumns = list(targetCatalog.colnames)
+            extraColumns += [flag for flag in flagValues if flag not in targetCatalog.colnames]
+            for col in extraColumns:
+                value = flagValues.get(col, np.nan)
+                data = np.full(nRows, value)
+                data[:nMatched] = _fillValue(data.dtype)
+                mask = np.zeros(nRows, dtype=bool)
+                mask[:nMatched] = True
+                columns.append(MaskedColumn(data, name=col, mask=mask))
+
+        return Table(columns, meta={**targetCatalog.meta, **refCatalog.meta}, copy=False)
 
     def prepColumns(self, bands):
         """Get all the columns needed for downstream tasks.
@@ -342,12 +765,17 @@ class CatalogMatchTask(pipeBase.PipelineTask):
         if self.config.patchColumn != "":
             columns.append(self.config.patchColumn)
 
-        selectorBands = list(set(list(bands) + self.config.selectorBands.list()))
-        for selectorAction in [
+        selectorBands = set(list(bands) + self.config.selectorBands.list())
+        selectorActions = [
             self.config.selectorActions,
             self.config.sourceSelectorActions,
             self.config.extraColumnSelectors,
-        ]:
+        ]
+        for selection in self.config.extraMatchSelections.values():
+            selectorBands.update(selection.selectorBands)
+            selectorActions.append(selection.sourceSelectorActions)
+        selectorBands = list(selectorBands)
+        for selectorAction in selectorActions:
             for selector in selectorAction:
                 for band in selectorBands:
                     selectorSchema = selector.getFormattedInputSchema(band=band)
@@ -355,7 +783,7 @@ class CatalogMatchTask(pipeBase.PipelineTask):
 
         return columns
 
-    def _loadRefCat(self, loaderTask, tractInfo):
+    def _loadRefCat(self, loaderTask, tractInfo, cacheKey=None):
         """Load the reference catalog that covers the
         catalog that is to be matched to.
 
@@ -365,6 +793,9 @@ class CatalogMatchTask(pipeBase.PipelineTask):
             lsst.pipe.tasks.loadReferenceCatalog.loadReferenceCatalogTask
         `tractInfo` : lsst.skymap.tractInfo.ExplicitTractInfo
             The tract information to get the sky location from
+        `cacheKey` : str, optional
+            A key identifying the reference catalog and tract, under which
+            the loaded catalog is cached if ``refCatCacheDir`` is set.
 
         Returns
         -------
@@ -377,6 +808,24 @@ class CatalogMatchTask(pipeBase.PipelineTask):
 
         epoch = Time(self.config.epoch, format="decimalyear")
 
+        cache = None
+        if self.config.refCatCacheDir is not None and cacheKey is not None:
+            cache = ReferenceCatalogCache(self.config.refCatCacheDir)
+            # The catalog loaded also depends on the configuration.
+            cacheKey = json.dumps(
+                [
+                    cacheKey,
+                    [center.getRa().asDegrees(), center.getDec().asDegrees(), radius.asDegrees()],
+                    list(self.config.filterNames),
+                    self.config.epoch,
+                    self.config.referenceCatalogLoader.toDict(),
+                ],
+                sort_keys=True,
+                default=str,
+            )
+            if (loadedRefCat := cache.get(cacheKey)) is not None:
+                return loadedRefCat
+
         # This is always going to return degrees.
         try:
             loadedRefCat = loaderTask.getSkyCircleCatalog(
@@ -385,4 +834,32 @@ class CatalogMatchTask(pipeBase.PipelineTask):
         except RuntimeError as e:
             raise pipeBase.NoWorkFound(e)
 
-        return Table(loadedRefCat)
+        loadedRefCat = Table(loadedRefCat)
+        if cache is not None:
+            cache.put(cacheKey, loadedRefCat)
+            # The catalog is read back, so that it is the same whether or not
+            # it was already cached.
+            return cache.get(cacheKey)
+        return loadedRefCat
+
+    def _refCatCacheKey(self, refCats, skymapName, tract):
+        """Make the key identifying the reference catalog of a tract in the
+        cache of loaded reference catalogs.
+
+        Parameters
+        ----------
+        `refCats` : list [DeferredDatasetHandle]
+            Handles for the shards of the reference catalog
+        `skymapName` : str
+            The name of the skymap
+        `tract` : int
+            The tract
+
+        Returns
+        -------
+        `cacheKey` : str
+            The key, which includes the ids of the shards, so that a
+            catalog which is ingested again is not read from the cache.
+        """
+        refCatIds = sorted(str(handle.ref.id) for handle in refCats)
+        return json.dumps([refCats[0].ref.datasetType.name, skymapName, tract, refCatIds])
@@ -27,14 +27,19 @@ __all__ = (
     "GatherResourceUsageConnections",
     "GatherResourceUsageTask",
     "ResourceUsageQuantumGraphBuilder",
+    "ResourceUsageStore",
 )
 
 import argparse
 import dataclasses
 import datetime
+import json
 import logging
+import os
 import re
+import uuid
 from collections.abc import Iterable, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
 import numpy as np
@@ -98,6 +103,17 @@ class ConsolidateResourceUsageConfig(
         doc="Input resource usage dataset type names",
         default=[],
     )
+    incremental_directory = Field[str](
+        doc=(
+            "Directory of a `ResourceUsageStore` that accumulates the "
+            "per-quantum resource usage of earlier runs.  If set, the input "
+            "tables (which must have been gathered with "
+            "GatherResourceUsageConfig.dataset_id set) are appended to the "
+            "store, and the summary is computed from everything it holds."
+        ),
+        default=None,
+        optional=True,
+    )
 
 
 class ConsolidateResourceUsageTask(PipelineTask):
@@ -109,12 +125,25 @@ class ConsolidateResourceUsageTask(PipelineTask):
     This is an unusual `PipelineTask` in that its input connection has
     dynamic dimensions, and its quanta are generally built via a custom
     quantum-graph builder defined in the same module.
+
+    In incremental mode (see
+    `ConsolidateResourceUsageConfig.incremental_directory`) the inputs hold
+    only the quanta that have not been summarized before, and are added to
+    a store of those that have.
     """
 
     ConfigClass = ConsolidateResourceUsageConfig
     _DefaultName = "consolidateResourceUsage"
 
     def run(self, **kwargs: Any) -> Struct:
+        if self.config.incremental_directory is not None:
+            store = ResourceUsageStore(self.config.incremental_directory)
+            for input_name, ru_table in kwargs.items():
+                if input_name.endswith("resource_usage"):
+                    store.append(input_name.replace("_resource_usage", ""), ru_table)
+            kwargs = {
+                f"{task_label}_resource_usage": ru_table for task_label, ru_table in store.read().items()
+            }
         quantiles = []
         for input_name, ru_table in kwargs.items():
             if not input_name.endswith("resource_usage"):
@@ -263,6 +292,28 @@ class GatherResourceUsageConfig(PipelineTaskConfig, pipelineConnections=GatherRe
         default=None,
         optional=True,
     )
+    max_workers = Field[int](
+        doc="Maximum number of threads used to load metadata datasets concurrently.",
+        default=1,
+        check=lambda x: x >= 1,
+    )
+    dataset_id = Field[bool](
+        doc=(
+            "Whether to add a ``dataset_id`` column holding the ID of the "
+            "metadata dataset each row was gathered from, as needed to "
+            "consolidate resource usage incrementally."
+        ),
+        default=False,
+    )
+    read_json = Field[bool](
+        doc=(
+            "Whether to parse metadata datasets stored as JSON directly, and "
+            "look up only the needed keys, rather than loading each as a "
+            "full TaskMetadata.  Datasets stored in other formats are always "
+            "loaded through the butler."
+        ),
+        default=False,
+    )
 
 
 class GatherResourceUsageTask(PipelineTask):
@@ -286,11 +337,16 @@ class GatherResourceUsageTask(PipelineTask):
       method.
     - ``{method}``: the time spent in a particular task or subtask
       method decorated with `lsst.utils.timer.timeMethod`.
+    - ``dataset_id``: the ID of the metadata dataset, as a string (only if
+      `GatherResourceUsageConfig.dataset_id` is set).
 
     All time durations are CPU times in seconds, and all columns are 64-bit
     floating point.  Methods or steps that did not run are given a duration of
     zero.
 
+    Metadata datasets are loaded by up to
+    `GatherResourceUsageConfig.max_workers` threads at once.
+
     It is expected that this task will be configured to run multiple times in
     most pipelines, often once for each other task in the pipeline.
     """
@@ -336,49 +392,128 @@ class GatherResourceUsageTask(PipelineTask):
         handles_by_data_id = {}
         for handle in input_metadata:
             handles_by_data_id[handle.dataId] = handle
-        n_rows = len(handles_by_data_id)
-        # Create a dict of empty column arrays that we'll ultimately make into
-        # a table.
-        columns = {
-            d: np.zeros(n_rows, dtype=_dtype_from_field_spec(universe.dimensions[d].primaryKey))
-            for d in dimensions.names
-        }
-        for attr_name in ("memory", "prep_time", "init_time", "run_time"):
-            if getattr(self.config, attr_name):
-                columns[attr_name] = np.zeros(n_rows, dtype=float)
-        for method_name in self.config.method_times:
-            columns[method_name] = np.zeros(n_rows, dtype=float)
-        # Populate the table, one row at a time.
+        data_ids = list(handles_by_data_id.keys())
+        # Load the metadata datasets concurrently, and extract the values of
+        # each row from them as they arrive.
+        rows = self._extract_rows(handles_by_data_id.values())
+        # Fill the table one column at a time.
+        columns = {}
+        for d in dimensions.names:
+            columns[d] = np.zeros(
+                len(data_ids), dtype=_dtype_from_field_spec(universe.dimensions[d].primaryKey)
+            )
+            for index, data_id in enumerate(data_ids):
+                if (value := data_id.mapping.get(d)) is not None:
+                    columns[d][index] = value
+        value_columns = [
+            attr_name
+            for attr_name in ("memory", "prep_time", "init_time", "run_time")
+            if getattr(self.config, attr_name)
+        ]
+        value_columns.extend(self.config.method_times)
+        for column in value_columns:
+            columns[column] = np.fromiter(
+                (row.get(column, 0.0) for row in rows), dtype=float, count=len(rows)
+            )
+        if self.config.dataset_id:
+            columns["dataset_id"] = np.array(
+                [str(handle.ref.id) for handle in handles_by_data_id.values()], dtype=object
+            )
+        return Struct(output_table=pd.DataFrame(columns, copy=False))
+
+    def _extract_rows(self, handles):
+        """Load metadata datasets and extract the configured resource usage
+        statistics from each.
+
+        Parameters
+        ----------
+        handles : `~collections.abc.Iterable` [ `DeferredDatasetHandle` ]
+            Handles of the metadata datasets to load.
+
+        Returns
+        -------
+        rows : `list` [ `dict` [ `str`, `float` ] ]
+            The statistics extracted from each dataset, in the order of the
+            handles, keyed by column name.  Statistics which could not be
+            extracted are missing.
+        """
+        handles = list(handles)
         warned_about_metadata_version = False
-        for index, (data_id, handle) in enumerate(handles_by_data_id.items()):
-            # Fill in the data ID columns.
-            for k, v in data_id.mapping.items():
-                columns[k][index] = v
-            # Load the metadata dataset and fill in the columns derived from
-            # it.
-            metadata = handle.get()
-            try:
-                quantum_metadata = metadata["quantum"]
-            except KeyError:
-                self.log.warning(
-                    "Metadata dataset %s @ %s has no 'quantum' key.",
-                    handle.ref.datasetType.name,
-                    handle.dataId,
-                )
-            else:
-                if self.config.memory:
-                    columns["memory"][index], warned_about_metadata_version = self._extract_memory(
-                        quantum_metadata,
-                        handle,
-                        warned_about_metadata_version,
+        rows = []
+        with ThreadPoolExecutor(max_workers=min(self.config.max_workers, max(len(handles), 1))) as pool:
+            for handle, (row, old_version) in zip(handles, pool.map(self._extract_row, handles)):
+                if old_version:
+                    msg = (
+                        "Metadata dataset %s @ %s is too old; guessing memory units by "
+                        "assuming the platform has not changed"
                     )
-                for key, value in self._extract_quantum_timing(quantum_metadata).items():
-                    columns[key][index] = value
-            for key, value in self._extract_method_timing(metadata, handle).items():
-                columns[key][index] = value
-        return Struct(output_table=pd.DataFrame(columns, copy=False))
+                    if not warned_about_metadata_version:
+                        self.log.warning(msg, handle.ref.datasetType.name, handle.dataId)
+                        self.log.warning(
+                            "Warnings about memory units for other inputs "
+                            "will be emitted only at DEBUG level."
+                        )
+                        warned_about_metadata_version = True
+                    else:
+                        self.log.debug(msg, handle.ref.datasetType.name, handle.dataId)
+                rows.append(row)
+        return rows
+
+    def _extract_row(self, handle):
+        """Load a metadata dataset and extract the configured resource usage
+        statistics from it.
+
+        Parameters
+        ----------
+        handle : `lsst.daf.butler.DeferredDatasetHandle`
+            Butler handle for the metadata dataset.
 
-    def _extract_memory(self, quantum_metadata, handle, warned_about_metadata_version):
+        Returns
+        -------
+        row : `dict` [ `str`, `float` ]
+            The statistics extracted, keyed by column name.
+        old_version : `bool`
+            Whether the metadata was written before memory units were
+            standardized, so that the memory usage is a guess.
+        """
+        metadata = self._load_metadata(handle)
+        row = {}
+        old_version = False
+        try:
+            quantum_metadata = metadata["quantum"]
+        except KeyError:
+            self.log.warning(
+                "Metadata dataset %s @ %s has no 'quantum' key.",
+                handle.ref.datasetType.name,
+                handle.dataId,
+            )
+        else:
+            if self.config.memory:
+                row["memory"], old_version = self._extract_memory(quantum_metadata)
+            row.update(self._extract_quantum_timing(quantum_metadata))
+        row.update(self._extract_method_timing(metadata, handle))
+        return row, old_version
+
+    def _load_metadata(self, handle):
+        """Load a metadata dataset.
+
+        Parameters
+        ----------
+        handle : `lsst.daf.butler.DeferredDatasetHandle`
+            Butler handle for the metadata dataset.
+
+        Returns
+        -------
+        metadata : `lsst.pipe.base.TaskMetadata` or `_JsonTaskMetadata`
+            The metadata, which supports hierarchical look up of keys.
+        """
+        if self.config.read_json:
+            uri = handle.butler.getURI(handle.ref)
+            if uri.getExtension() == ".json":
+                return _JsonTaskMetadata(json.loads(uri.read()))
+        return handle.get()
+
+    def _extract_memory(self, quantum_metadata):
         """Extract maximum memory usage from quantum metadata.
 
         Parameters
@@ -386,43 +521,24 @@ class GatherResourceUsageTask(PipelineTask):
         quantum_metadata : `lsst.pipe.base.TaskMetadata`
             The nested metadata associated with the label "quantum" inside a
             PipelineTask's metadata.
-        handle : `lsst.daf.butler.DeferredDatasetHandle`
-            Butler handle for the metadata dataset; used to identify the
-            metadata in diagnostic messages only.
-        warned_about_metadata_version : `bool`
-            Whether we have already emitted at least one warning about old
-            metadata versions.
 
         Returns
         -------
         memory : `float`
             Maximum memory usage in bytes.
-        warned_about_metadata_version : `bool`
-            Whether we have now emitted at least one warning about old
-            metadata versions.
+        old_version : `bool`
+            Whether the metadata is too old for its memory units to be known,
+            so that they were guessed by assuming the platform has not
+            changed.
         """
         # Attempt to work around memory units being
         # platform-dependent for metadata written prior to
         # w.2022.10.
         memory_multiplier = 1
-        if quantum_metadata.get("__version__", 0) < 1:
+        old_version = quantum_metadata.get("__version__", 0) < 1
+        if old_version:
             memory_multiplier = _RUSAGE_MEMORY_MULTIPLIER
-            msg = (
-                "Metadata dataset %s @ %s is too old; guessing memory units by "
-                "assuming the platform has not changed"
-            )
-            if not warned_about_metadata_version:
-                self.log.warning(msg, handle.ref.datasetType.name, handle.dataId)
-                self.log.warning(
-                    "Warnings about memory units for other inputs " "will be emitted only at DEBUG level."
-                )
-                warned_about_metadata_version = True
-            else:
-                self.log.debug(msg, handle.ref.datasetType.name, handle.dataId)
-        return (
-            quantum_metadata["endMaxResidentSetSize"] * memory_multiplier,
-            warned_about_metadata_version,
-        )
+        return quantum_metadata["endMaxResidentSetSize"] * memory_multiplier, old_version
 
     def _extract_quantum_timing(self, quantum_metadata):
         """Extract timing for standard PipelineTask quantum-execution steps
@@ -492,10 +608,44 @@ class GatherResourceUsageTask(PipelineTask):
                 # that happens, we just let the times stay zero.
                 pass
             else:
-                result[f"{task_label}.{method_name}"] = method_end_time - method_start_time
+                result[method_name] = method_end_time - method_start_time
         return result
 
 
+class _JsonTaskMetadata:
+    """A read-only view of the JSON serialization of a
+    `lsst.pipe.base.TaskMetadata`, supporting the hierarchical look up of
+    keys.
+
+    Parameters
+    ----------
+    data : `dict` [ `str`, `~typing.Any` ]
+        The decoded JSON, with ``scalars``, ``arrays`` and ``metadata`` keys.
+    """
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getitem__(self, key):
+        # As for TaskMetadata, the last element of an array is returned.
+        name, _, rest = key.partition(".")
+        if rest:
+            return _JsonTaskMetadata(self._data["metadata"][name])[rest]
+        if name in self._data["scalars"]:
+            return self._data["scalars"][name]
+        if name in self._data["metadata"]:
+            return _JsonTaskMetadata(self._data["metadata"][name])
+        if self._data["arrays"].get(name):
+            return self._data["arrays"][name][-1]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
 def _dtype_from_field_spec(field_spec):
     """Return the `np.dtype` that can be used to hold the values of a butler
     dimension field.
@@ -517,6 +667,108 @@ def _dtype_from_field_spec(field_spec):
         return np.dtype(python_type)
 
 
+class ResourceUsageStore:
+    """A store of per-quantum resource usage tables, used to consolidate
+    resource usage incrementally.
+
+    The store is a directory of parquet files, partitioned by task label in
+    the Hive style (``task=<label>/part-<id>.parquet``), so that it may also
+    be read as a single dataset by parquet readers.  Alongside them a
+    watermark file records the IDs of the metadata datasets whose resource
+    usage the store holds, so that only new quanta need be gathered.
+
+    Parameters
+    ----------
+    directory : `str`
+        The directory of the store, which is created if it does not exist.
+    """
+
+    WATERMARK_FILENAME = "_watermark.json"
+    """Name of the watermark file in the store (`str`); as its name starts
+    with an underscore, parquet readers ignore it.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _partition(self, task_label: str) -> str:
+        return os.path.join(self.directory, f"task={task_label}")
+
+    def watermark(self) -> dict[str, set[str]]:
+        """Return the IDs of the metadata datasets already in the store.
+
+        Returns
+        -------
+        watermark : `dict` [ `str`, `set` [ `str` ] ]
+            The dataset IDs, as strings, keyed by task label.
+        """
+        try:
+            with open(os.path.join(self.directory, self.WATERMARK_FILENAME)) as stream:
+                return {task_label: set(ids) for task_label, ids in json.load(stream).items()}
+        except FileNotFoundError:
+            return {}
+
+    def append(self, task_label: str, table: pd.DataFrame) -> None:
+        """Add the resource usage of new quanta of a task to the store.
+
+        Parameters
+        ----------
+        task_label : `str`
+            The label of the task.
+        table : `pandas.DataFrame`
+            The resource usage of the quanta, as gathered by
+            `GatherResourceUsageTask` with a ``dataset_id`` column.
+
+        Raises
+        ------
+        ValueError
+            Raised if the table has no ``dataset_id`` column.
+        """
+        if "dataset_id" not in table.columns:
+            raise ValueError(f"Resource usage table of {task_label} has no dataset_id column.")
+        if not len(table):
+            return
+        partition = self._partition(task_label)
+        os.makedirs(partition, exist_ok=True)
+        table.to_parquet(os.path.join(partition, f"part-{uuid.uuid4().hex}.parquet"), index=False)
+        # The watermark is replaced atomically once the table is written; if
+        # that fails, the quanta will be gathered again, and read once.
+        watermark = self.watermark()
+        watermark.setdefault(task_label, set()).update(table["dataset_id"])
+        path = os.path.join(self.directory, self.WATERMARK_FILENAME)
+        with open(f"{path}.tmp", "w") as stream:
+            json.dump({label: sorted(ids) for label, ids in watermark.items()}, stream)
+        os.replace(f"{path}.tmp", path)
+
+    def read(self) -> dict[str, pd.DataFrame]:
+        """Read all of the resource usage in the store.
+
+        Returns
+        -------
+        tables : `dict` [ `str`, `pandas.DataFrame` ]
+            The resource usage of all quanta of each task, keyed by task
+            label.
+        """
+        tables = {}
+        if not os.path.isdir(self.directory):
+            return tables
+        for entry in sorted(os.listdir(self.directory)):
+            if not entry.startswith("task="):
+                continue
+            partition = os.path.join(self.directory, entry)
+            parts = [
+                pd.read_parquet(os.path.join(partition, filename))
+                for filename in sorted(os.listdir(partition))
+                if filename.endswith(".parquet")
+            ]
+            if parts:
+                table = pd.concat(parts, ignore_index=True)
+                tables[entry[len("task=") :]] = table.drop_duplicates("dataset_id", keep="last").reset_index(
+                    drop=True
+                )
+        return tables
+
+
 class ResourceUsageQuantumGraphBuilder(QuantumGraphBuilder):
     """Custom quantum graph generator and pipeline builder for resource
     usage summary tasks.
@@ -546,6 +798,11 @@ class ResourceUsageQuantumGraphBuilder(QuantumGraphBuilder):
         Whether *execution* of this quantum graph will permit clobbering.  If
         `False` (default), existing outputs in ``output_run`` are an error
         unless ``skip_existing_in`` will cause those quanta to be skipped.
+    incremental_directory : `str`, optional
+        Directory of a `ResourceUsageStore` holding the resource usage of
+        quanta summarized by earlier runs.  If provided, only metadata
+        datasets missing from its watermark are gathered, and the
+        consolidated summary covers both those and the quanta in the store.
 
     Notes
     -----
@@ -566,6 +823,7 @@ class ResourceUsageQuantumGraphBuilder(QuantumGraphBuilder):
         output_run: str | None = None,
         skip_existing_in: Sequence[str] = (),
         clobber: bool = False,
+        incremental_directory: str | None = None,
     ):
         # Start by querying for metadata datasets, since we'll need to know
         # which dataset types exist in the input collections in order to
@@ -578,6 +836,12 @@ class ResourceUsageQuantumGraphBuilder(QuantumGraphBuilder):
         pipeline_graph = PipelineGraph()
         metadata_refs: dict[str, set[DatasetRef]] = {}
         consolidate_config = ConsolidateResourceUsageConfig()
+        if incremental_directory is not None:
+            incremental_directory = os.path.abspath(incremental_directory)
+        consolidate_config.incremental_directory = incremental_directory
+        watermark = {}
+        if incremental_directory is not None:
+            watermark = ResourceUsageStore(incremental_directory).watermark()
         for results in butler.registry.queryDatasets(
             input_dataset_types,
             where=where,
@@ -586,9 +850,13 @@ class ResourceUsageQuantumGraphBuilder(QuantumGraphBuilder):
         ).byParentDatasetType():
             input_metadata_dataset_type = results.parentDatasetType
             refs_for_type = set(results)
+            if processed := watermark.get(input_metadata_dataset_type.name.removesuffix("_metadata")):
+                refs_for_type = {ref for ref in refs_for_type if str(ref.id) not in processed}
             if refs_for_type:
                 gather_task_label, gather_dataset_type_name = self._add_gather_task(
-                    pipeline_graph, input_metadata_dataset_type
+                    pipeline_graph,
+                    input_metadata_dataset_type,
+                    dataset_id=incremental_directory is not None,
                 )
                 metadata_refs[gather_task_label] = refs_for_type
                 consolidate_config.input_names.append(gather_dataset_type_name)
@@ -620,7 +888,10 @@ class ResourceUsageQuantumGraphBuilder(QuantumGraphBuilder):
 
     @classmethod
     def _add_gather_task(
-        cls, pipeline_graph: PipelineGraph, input_metadata_dataset_type: DatasetType
+        cls,
+        pipeline_graph: PipelineGraph,
+        input_metadata_dataset_type: DatasetType,
+        dataset_id: bool = False,
     ) -> tuple[str, str]:
         """Add a single configuration of `GatherResourceUsageTask` to a
         pipeline graph.
@@ -633,6 +904,8 @@ class ResourceUsageQuantumGraphBuilder(QuantumGraphBuilder):
             Dataset type for the task's input dataset, which is the metadata
             output of the task whose resource usage information is being
             extracted.
+        dataset_id : `bool`, optional
+            Whether the task should record the ID of each metadata dataset.
 
         Returns
         -------
@@ -653,6 +926,7 @@ class ResourceUsageQuantumGraphBuilder(QuantumGraphBuilder):
         gather_dataset_type_name = f"{input_task_label}_resource_usage"
         gather_config = GatherResourceUsageConfig()
         gather_config.dimensions = input_metadata_dataset_type.dimensions.names
+        gather_config.dataset_id = dataset_id
         gather_config.connections.input_metadata = input_metadata_dataset_type.name
         gather_config.connections.output_table = gather_dataset_type_name
         pipeline_graph.add_task(
@@ -751,6 +1025,17 @@ class ResourceUsageQuantumGraphBuilder(QuantumGraphBuilder):
             default=None,
             metavar="RUN",
         )
+        parser.add_argument(
+            "--incremental",
+            type=str,
+            help=(
+                "Directory of a store of the resource usage of quanta summarized by earlier runs. "
+                "Only metadata for quanta missing from the store is gathered, and the new resource "
+                "usage is added to it when the graph is executed."
+            ),
+            default=None,
+            metavar="DIR",
+        )
         return parser
 
     @classmethod
@@ -775,6 +1060,7 @@ class ResourceUsageQuantumGraphBuilder(QuantumGraphBuilder):
             where=args.where,
             input_collections=args.collections,
             output_run=args.output_run,
+            incremental_directory=args.incremental,
         )
         qg: QuantumGraph = builder.build(
             # Metadata includes a subset of attributes defined in CmdLineFwk.
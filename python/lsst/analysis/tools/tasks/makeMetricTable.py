@@ -25,9 +25,10 @@ __all__ = (
     "MakeMetricTableTask",
 )
 
+import astropy.units as u
 import lsst.pipe.base as pipeBase
 import numpy as np
-from astropy.table import Table
+from astropy.table import Column, Table
 from lsst.pex.config import ListField
 from lsst.pipe.base import connectionTypes as ct
 from lsst.skymap import BaseSkyMap
@@ -173,49 +174,48 @@ class MakeMetricTableTask(pipeBase.PipelineTask):
 
         # Make an initial dict of the columns needed
         metricsDict = {}
-        for key, value in dataIdInfo[0].items():
-            metricsDict[key] = [value]
+        for key in dataIdInfo[0]:
+            metricsDict[key] = [info[key] for info in dataIdInfo]
 
-        # Add tract corners if inputs are at the tract-level
+        # Add tract corners if inputs are at the tract-level, computing
+        # them once for each tract.
         if "tract" in self.config.inputDataDimensions:
-            corners = self.getTractCorners(skymap, dataIdInfo[0]["tract"])
-            metricsDict["corners"] = [corners]
-
-        # Add the metrics from the first bundle to the dict
-        for name, metrics in metricBundles[0].items():
-            for metric in metrics:
-                fullName = f"{name}_{metric.metric_name}"
-                metricValue = metric.quantity
-                metricsDict[fullName] = [metricValue]
-
-        # Check if any additional columns are needed; add to dict if needed.
-        for i, metricBundle in enumerate(metricBundles[1:]):
-            for key, value in dataIdInfo[i + 1].items():
-                metricsDict[key].append(value)
-
-            if "tract" in self.config.inputDataDimensions:
-                corners = self.getTractCorners(skymap, dataIdInfo[0]["tract"])
-                metricsDict["corners"].append(corners)
-
-            metricNames = list(metricsDict)
+            tractCorners = {}
+            for info in dataIdInfo:
+                if (tract := info["tract"]) not in tractCorners:
+                    tractCorners[tract] = self.getTractCorners(skymap, tract)
+            metricsDict["corners"] = [tractCorners[info["tract"]] for info in dataIdInfo]
+
+        # Find the union of the metrics of all of the bundles, in the order
+        # they are first seen, with the unit each is first given in.
+        units = {}
+        for metricBundle in metricBundles:
             for name, metrics in metricBundle.items():
                 for metric in metrics:
                     fullName = f"{name}_{metric.metric_name}"
-                    metricValue = metric.quantity
-                    # Check if the metric already exists in the output
-                    if fullName in metricsDict.keys():
-                        metricsDict[fullName].append(metricValue)
-                    else:
-                        values = [np.nan] * (len(metricsDict[metricNames[0]]) - 1)
-                        values.append(metricValue)
-                        metricsDict[fullName] = values
-                    metricNames.append(fullName)
-
-            # If a metric that existed in a previous bundle does
-            # not exist for this one then add a nan
-            for metricName in metricsDict.keys():
-                if metricName not in metricNames:
-                    metricsDict[metricName].append(np.nan)
+                    if fullName not in units:
+                        units[fullName] = getattr(metric.quantity, "unit", None)
+
+        # Fill a column of each metric, which is NaN for bundles without it.
+        values = {fullName: np.full(len(metricBundles), np.nan) for fullName in units}
+        for row, metricBundle in enumerate(metricBundles):
+            for name, metrics in metricBundle.items():
+                for metric in metrics:
+                    fullName = f"{name}_{metric.metric_name}"
+                    if metric.quantity is None:
+                        continue
+                    try:
+                        values[fullName][row] = u.Quantity(metric.quantity).to_value(units[fullName])
+                    except u.UnitConversionError:
+                        self.log.warning(
+                            "Metric %s of bundle %d is in units of %s, not %s; it is left as NaN.",
+                            fullName,
+                            row,
+                            metric.quantity.unit,
+                            units[fullName],
+                        )
+        for fullName, unit in units.items():
+            metricsDict[fullName] = Column(values[fullName], unit=unit)
 
         metricTableStruct = pipeBase.Struct(metricTable=Table(metricsDict))
         return metricTableStruct
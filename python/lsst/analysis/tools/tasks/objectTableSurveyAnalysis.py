@@ -22,17 +22,27 @@ from __future__ import annotations
 __all__ = ("ObjectTableSurveyAnalysisTask",)
 
 
-from typing import TYPE_CHECKING, Any, Iterable, Mapping
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, Mapping
 
 if TYPE_CHECKING:
     from lsst.daf.butler import DataCoordinate, DeferredDatasetHandle
+    from lsst.pipe.base import QuantumContext
+    from lsst.pipe.base.connections import InputQuantizedConnection, OutputQuantizedConnection
 
 from astropy.table import vstack
+from lsst.pex.config import Field
+from lsst.pipe.base import Struct
 from lsst.pipe.base import connectionTypes as ct
 from lsst.skymap import BaseSkyMap
 
 from ..actions.plot.plotUtils import shorten_list
-from ..interfaces import AnalysisBaseConfig, AnalysisBaseConnections, AnalysisPipelineTask, KeyedData
+from ..interfaces import (
+    AnalysisBaseConfig,
+    AnalysisBaseConnections,
+    AnalysisPipelineTask,
+    KeyedData,
+    StreamingToolRunner,
+)
 
 
 class ObjectTableSurveyAnalysisConnections(
@@ -60,7 +70,31 @@ class ObjectTableSurveyAnalysisConnections(
 class ObjectTableSurveyAnalysisConfig(
     AnalysisBaseConfig, pipelineConnections=ObjectTableSurveyAnalysisConnections
 ):
-    pass
+    streamTracts = Field[bool](
+        doc="Read the input tracts in chunks of tractsPerChunk, rather than all at once, so that the "
+        "whole survey need not be held in memory. The statistics read by the calculate actions of each "
+        "tool are accumulated from every chunk, with medians and sigmaMads estimated from quantile "
+        "sketches. Plots, and calculations which can not be accumulated, are made from a random sample "
+        "of the rows of each band. The tools are run serially, and actions are not cached.",
+        default=False,
+    )
+    tractsPerChunk = Field[int](
+        doc="Number of tracts read at once when streamTracts is True.",
+        default=1,
+        check=lambda x: x > 0,
+    )
+    streamingSampleSize = Field[int](
+        doc="Maximum number of rows sampled for each band of each tool when streamTracts is True.",
+        default=100_000,
+        check=lambda x: x > 0,
+    )
+    streamingSketchSize = Field[int](
+        doc="Capacity of the quantile sketches medians and sigmaMads are estimated from when "
+        "streamTracts is True. The rank of an estimate is typically in error by less than 2 divided by "
+        "this, as a fraction of the number of rows.",
+        default=200,
+        check=lambda x: x >= 2,
+    )
 
 
 class ObjectTableSurveyAnalysisTask(AnalysisPipelineTask):
@@ -125,3 +159,99 @@ class ObjectTableSurveyAnalysisTask(AnalysisPipelineTask):
         for h in handle:
             cats.append(h.get(parameters={"columns": names}))
         return vstack(cats)
+
+    def runQuantum(
+        self,
+        butlerQC: QuantumContext,
+        inputRefs: InputQuantizedConnection,
+        outputRefs: OutputQuantizedConnection,
+    ) -> None:
+        # Docstring inherited
+        if not self.config.streamTracts:
+            super().runQuantum(butlerQC, inputRefs, outputRefs)
+            return
+        inputs = butlerQC.get(inputRefs)
+        plotInfo = self.parsePlotInfo(inputs, butlerQC.quantum.dataId)
+        handles = inputs.pop("data")
+        outputs = self.runStreaming(chunks=self.iterChunks(handles), plotInfo=plotInfo, **inputs)
+        self.putByBand(butlerQC, outputs, outputRefs)
+
+    def iterChunks(
+        self,
+        handle: Iterable[DeferredDatasetHandle],
+        names: Iterable[str] | None = None,
+    ) -> Iterator[KeyedData]:
+        """Load the input dataset in chunks of ``tractsPerChunk`` tracts.
+
+        Parameters
+        ----------
+        handle : `Iterable` of `DeferredDatasetHandle`
+            Handles to load the dataset of each tract with.
+        names : `Iterable` of `str`, optional
+            The names of keys to extract from the dataset, see `loadData`.
+
+        Yields
+        ------
+        chunk : `KeyedData`
+            The data of the tracts of a chunk, as returned by `loadData`.
+        """
+        handles = list(handle)
+        if names is None:
+            names = self.collectInputNames()
+        size = self.config.tractsPerChunk
+        for start in range(0, len(handles), size):
+            yield self.loadData(handles[start : start + size], names)
+
+    def runStreaming(self, *, chunks: Iterable[KeyedData], **kwargs) -> Struct:
+        """Produce the outputs of this task from input data given in chunks.
+
+        Each tool is run with a `StreamingToolRunner`, so only a single chunk
+        of the input data and a sample of the rows each tool selects are
+        held at once.
+
+        Parameters
+        ----------
+        chunks : `Iterable` of `KeyedData`
+            The chunks of the input data, which all have the same keys.
+        **kwargs
+            Additional arguments that are passed through to the
+            `AnalysisTools` specified in the configuration.
+
+        Returns
+        -------
+        results : `~lsst.pipe.base.Struct`
+            The accumulated results of all the plots and metrics produced by
+            this `PipelineTask`.
+        """
+        self._setDefaultArguments(kwargs)
+        runners = {
+            name: StreamingToolRunner(
+                tool,
+                sampleSize=self.config.streamingSampleSize,
+                sketchSize=self.config.streamingSketchSize,
+                **kwargs,
+            )
+            for name, tool in self.config.atools.items()
+        }
+        numChunks = 0
+        for chunk in chunks:
+            for runner in runners.values():
+                runner.update(chunk)
+            numChunks += 1
+            self.log.verbose("Processed chunk %d of the input data", numChunks)
+        for name, runner in runners.items():
+            if not runner.streamed:
+                self.log.warning(
+                    "The atool %s can not be streamed, it is run on a sample of at most %d input rows",
+                    name,
+                    self.config.streamingSampleSize,
+                )
+            elif sampled := runner.sampled:
+                self.log.info(
+                    "The calculate actions %s of the atool %s are computed from a sample of at most %d "
+                    "rows in each band",
+                    sampled,
+                    name,
+                    self.config.streamingSampleSize,
+                )
+        return self._gatherResults((name, runner.finish()) for name, runner in runners.items())
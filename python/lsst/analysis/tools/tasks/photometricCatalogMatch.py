@@ -109,8 +109,14 @@ class PhotometricCatalogMatchTask(CatalogMatchTask):
         )
 
         skymap = inputs.pop("skymap")
-        loadedRefCat = self._loadRefCat(loaderTask, skymap[tract])
-        outputs = self.run(targetCatalog=table, refCatalog=loadedRefCat, bands=bands)
+        cacheKey = self._refCatCacheKey(inputs["refCat"], butlerQC.quantum.dataId["skymap"], tract)
+        loadedRefCat = self._loadRefCat(loaderTask, skymap[tract], cacheKey=cacheKey)
+        selections = {"matchedCatalog": self.config}
+        for name, selection in self.config.extraMatchSelections.items():
+            selections[f"matchedCatalog_{name}"] = selection
+        outputs = self.runMultiple(
+            targetCatalog=table, refCatalog=loadedRefCat, bands=bands, selections=selections
+        )
 
         butlerQC.put(outputs, outputRefs)
 
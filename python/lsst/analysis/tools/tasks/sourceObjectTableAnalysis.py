@@ -21,6 +21,8 @@
 from __future__ import annotations
 
 __all__ = (
+    "AssociatedSourceVisitIndexConfig",
+    "AssociatedSourceVisitIndexTask",
     "SourceObjectTableAnalysisConfig",
     "SourceObjectTableAnalysisTask",
     "ObjectEpochTableConfig",
@@ -141,6 +143,123 @@ class ObjectEpochTableTask(pipeBase.PipelineTask):
             butlerQC.put(epochs, outputEpochRefs[patch])
 
 
+class AssociatedSourceVisitIndexConnections(
+    pipeBase.PipelineTaskConnections,
+    dimensions=("instrument", "skymap", "tract"),
+    defaultTemplates={"associatedSourcesInputName": "isolated_star_presources"},
+):
+    associatedSources = ct.Input(
+        doc="Table of associated sources.",
+        name="{associatedSourcesInputName}",
+        storageClass="ArrowAstropy",
+        dimensions=("instrument", "skymap", "tract"),
+        deferLoad=True,
+    )
+
+    visitIndex = ct.Output(
+        doc="The range of rows of sourcesByVisit holding the sources of each visit.",
+        name="{associatedSourcesInputName}_visit_index",
+        storageClass="ArrowAstropy",
+        dimensions=("instrument", "skymap", "tract"),
+    )
+
+    sourcesByVisit = ct.Output(
+        doc="The visits and source rows of the associated sources, sorted by visit.",
+        name="{associatedSourcesInputName}_by_visit",
+        storageClass="ArrowAstropy",
+        dimensions=("instrument", "skymap", "tract"),
+    )
+
+
+class AssociatedSourceVisitIndexConfig(
+    pipeBase.PipelineTaskConfig, pipelineConnections=AssociatedSourceVisitIndexConnections
+):
+    pass
+
+
+class AssociatedSourceVisitIndexTask(pipeBase.PipelineTask):
+    """Index the associated sources of a tract by visit.
+
+    The associated sources are sorted by visit, and the range of rows of the
+    sorted table holding the sources of each visit is recorded in the index,
+    so that `SourceObjectTableAnalysisTask` may read the sources of one visit
+    without reading those of every other visit of the tract.
+    """
+
+    ConfigClass = AssociatedSourceVisitIndexConfig
+    _DefaultName = "associatedSourceVisitIndex"
+
+    def run(self, associatedSources):
+        """Index the associated sources by visit.
+
+        Parameters
+        ----------
+        associatedSources : `astropy.table.Table`
+            Table of associated sources, with ``visit`` and ``source_row``
+            columns.
+
+        Returns
+        -------
+        result : `lsst.pipe.base.Struct`
+            Results struct with attributes:
+
+            ``visitIndex``
+                Table of the visits, in increasing order, and the ``start``
+                and ``stop`` of the range of rows of ``sourcesByVisit`` holding
+                the sources of each (`astropy.table.Table`).
+            ``sourcesByVisit``
+                Table of the ``visit`` and ``source_row`` of each associated
+                source, sorted by visit (`astropy.table.Table`).
+        """
+        visits = np.asarray(associatedSources["visit"])
+        order = np.argsort(visits, kind="stable")
+        sortedVisits = visits[order]
+        indexVisits, starts, counts = np.unique(sortedVisits, return_index=True, return_counts=True)
+        visitIndex = Table({"visit": indexVisits, "start": starts, "stop": starts + counts})
+        sourcesByVisit = Table(
+            {"visit": sortedVisits, "source_row": np.asarray(associatedSources["source_row"])[order]}
+        )
+        return pipeBase.Struct(visitIndex=visitIndex, sourcesByVisit=sourcesByVisit)
+
+    def runQuantum(self, butlerQC, inputRefs, outputRefs):
+        inputs = butlerQC.get(inputRefs)
+        associatedSources = inputs["associatedSources"].get(parameters={"columns": ["visit", "source_row"]})
+        outputs = self.run(associatedSources)
+        butlerQC.put(outputs, outputRefs)
+
+
+def _readVisitSourceRows(visit, visitIndexHandle, sourcesByVisitHandle):
+    """Read the source rows of the associated sources of a visit from the
+    outputs of `AssociatedSourceVisitIndexTask`.
+
+    Parameters
+    ----------
+    visit : `int`
+        Identifier of the visit.
+    visitIndexHandle : `DeferredDatasetHandle`
+        Handle for the index of the associated sources of a tract.
+    sourcesByVisitHandle : `DeferredDatasetHandle`
+        Handle for the associated sources of the tract, sorted by visit.
+
+    Returns
+    -------
+    sourceRows : `numpy.ndarray`
+        The rows of the visit's source table of its associated sources.
+
+    Notes
+    -----
+    Only the ``source_row`` column of the sorted sources is read, rather than
+    both columns of the associated sources, and the rows of the visit are
+    found from the index rather than by comparing every visit.
+    """
+    visitIndex = visitIndexHandle.get()
+    i = np.searchsorted(visitIndex["visit"], visit)
+    if i == len(visitIndex) or visitIndex["visit"][i] != visit:
+        return np.zeros(0, dtype=int)
+    sourcesByVisit = sourcesByVisitHandle.get(parameters={"columns": ["source_row"]})
+    return np.asarray(sourcesByVisit["source_row"][visitIndex["start"][i] : visitIndex["stop"][i]])
+
+
 class SourceObjectTableAnalysisConnections(
     AnalysisBaseConnections,
     dimensions=("visit",),
@@ -169,6 +288,26 @@ class SourceObjectTableAnalysisConnections(
         deferGraphConstraint=True,
     )
 
+    associatedSourcesVisitIndex = ct.Input(
+        doc="Index of the associated sources of each tract by visit.",
+        name="{associatedSourcesInputName}_visit_index",
+        storageClass="ArrowAstropy",
+        multiple=True,
+        deferLoad=True,
+        dimensions=("instrument", "skymap", "tract"),
+        deferGraphConstraint=True,
+    )
+
+    associatedSourcesByVisit = ct.Input(
+        doc="Associated sources of each tract, sorted by visit.",
+        name="{associatedSourcesInputName}_by_visit",
+        storageClass="ArrowAstropy",
+        multiple=True,
+        deferLoad=True,
+        dimensions=("instrument", "skymap", "tract"),
+        deferGraphConstraint=True,
+    )
+
     refCat = ct.Input(
         doc="Catalog of positions to use as reference.",
         name="objectTable",
@@ -204,6 +343,11 @@ class SourceObjectTableAnalysisConnections(
     def __init__(self, *, config=None):
         super().__init__(config=config)
 
+        if config.useVisitIndex:
+            self.inputs.remove("associatedSources")
+        else:
+            self.inputs.remove("associatedSourcesVisitIndex")
+            self.inputs.remove("associatedSourcesByVisit")
         if not config.applyAstrometricCorrections:
             self.inputs.remove("astrometricCorrectionCatalog")
             self.inputs.remove("refCatEpochs")
@@ -253,6 +397,15 @@ class SourceObjectTableAnalysisConfig(
             " reference catalog."
         ),
     )
+    useVisitIndex = pexConfig.Field(
+        dtype=bool,
+        default=False,
+        doc=(
+            "Find the associated sources of the visit using the index made by "
+            "AssociatedSourceVisitIndexTask, rather than comparing the visit of every associated source. "
+            "The source rows of every visit of the tract are still read."
+        ),
+    )
     applyAstrometricCorrections = pexConfig.Field(
         dtype=bool,
         default=True,
@@ -365,7 +518,10 @@ class SourceObjectTableAnalysisTask(AnalysisPipelineTask):
             Catalog of sources to be associated.
         associatedSourceRefs : `list` [`DeferredDatasetHandle`]
             Handle for the catalogs of isolated sources. There will be multiple
-            if the visit overlaps with multiple tracts.
+            if the visit overlaps with multiple tracts. If
+            `self.config.useVisitIndex` is True, these are instead pairs of
+            handles for the index of the isolated sources of each tract and
+            the isolated sources sorted by visit.
         refCats : `list` [`pd.DataFrame`]
             Catalog of objects with which the sources will be compared.
         visitTable : `pd.DataFrame`
@@ -376,9 +532,12 @@ class SourceObjectTableAnalysisTask(AnalysisPipelineTask):
         """
         isolatedSources = []
         for associatedSourceRef in associatedSourceRefs:
-            associatedSources = associatedSourceRef.get(parameters={"columns": ["visit", "source_row"]})
-            visit_sources = associatedSources[associatedSources["visit"] == visit]
-            isolatedSources.append(data[visit_sources["source_row"]])
+            if self.config.useVisitIndex:
+                sourceRows = _readVisitSourceRows(visit, *associatedSourceRef)
+            else:
+                associatedSources = associatedSourceRef.get(parameters={"columns": ["visit", "source_row"]})
+                sourceRows = associatedSources["source_row"][associatedSources["visit"] == visit]
+            isolatedSources.append(data[sourceRows])
         isolatedSources = vstack(isolatedSources)
 
         if len(isolatedSources) == 0:
@@ -420,6 +579,15 @@ class SourceObjectTableAnalysisTask(AnalysisPipelineTask):
         data = inputs["data"].get(parameters={"columns": names})
         inputs["data"] = data
 
+        if self.config.useVisitIndex:
+            sourcesByVisit = {
+                handle.dataId["tract"]: handle for handle in inputs.pop("associatedSourcesByVisit")
+            }
+            inputs["associatedSources"] = [
+                (handle, sourcesByVisit[handle.dataId["tract"]])
+                for handle in inputs.pop("associatedSourcesVisitIndex")
+            ]
+
         if self.config.applyAstrometricCorrections:
             refCatEpochs = {
                 epochTable.dataId["patch"]: epochTable.get() for epochTable in inputs["refCatEpochs"]
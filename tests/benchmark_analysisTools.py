@@ -0,0 +1,584 @@
+# This file is part of analysis_tools.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Benchmarks of `AnalysisTool` throughput on synthetic catalogs.
+
+Each benchmark case runs a representative analysis tool through
+`AnalysisTool.__call__` on a synthetic object, source or diaSource table of a
+given number of rows, and reports the wall clock time and the peak memory
+allocated in each of the prep, process and produce stages. Skymap and camera
+objects are stubbed, so no butler or external data is needed.
+
+Run it from this directory, for example::
+
+    python benchmark_analysisTools.py --rows 10000 100000 --repeat 3
+
+``test_benchmarks.py`` runs every case on a small catalog to make sure the
+suite keeps working.
+"""
+
+from __future__ import annotations
+
+__all__ = (
+    "BenchmarkCase",
+    "StageProfile",
+    "StubCamera",
+    "StubSkyMap",
+    "cases",
+    "makeDiaSourceTable",
+    "makeObjectTable",
+    "makeSourceTable",
+    "profileTool",
+    "runCase",
+)
+
+import argparse
+import math
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator, Mapping
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+import lsst.geom as geom
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+from lsst.analysis.tools.atools import (
+    AstrometricRelativeRepeatability,
+    MagnitudeTool,
+    MatchedRefCoaddDiffMagTool,
+    NumGoodDiaSourcesMetrics,
+    PsfCModelScatterPlot,
+    PsfCModelSkyPlot,
+    ShapeSizeFractionalDiffScatter,
+    StellarAstrometricResidualsRAFocalPlanePlot,
+    WPerpPSF,
+)
+from lsst.analysis.tools.interfaces import AnalysisTool, KeyedData
+
+matplotlib.use("Agg")
+
+STAGES = ("prep", "process", "produce")
+
+# The centre of the synthetic tract in degrees, the side length of the tract
+# in pixels and the pixel scale in degrees.
+_TRACT_CENTER = (150.0, 2.0)
+_TRACT_SIZE = 12000
+_PIXEL_SCALE = 0.2 / 3600.0
+_NUM_PATCHES = 6
+
+# The number of detectors in the stub camera, which are laid out on a square
+# grid of detectors with the size below in pixels.
+_NUM_DETECTORS = 16
+_DETECTOR_SIZE = 4000
+
+
+class _StubWcs:
+    """A tangent plane approximation of a tract WCS."""
+
+    def __init__(self, center: tuple[float, float], origin: float, scale: float):
+        self._center = center
+        self._origin = origin
+        self._scale = scale
+
+    def pixelToSky(self, points: list[geom.Point2D]) -> list[geom.SpherePoint]:
+        ra0, dec0 = self._center
+        cosDec = math.cos(math.radians(dec0))
+        return [
+            geom.SpherePoint(
+                ra0 + (point.getX() - self._origin) * self._scale / cosDec,
+                dec0 + (point.getY() - self._origin) * self._scale,
+                geom.degrees,
+            )
+            for point in points
+        ]
+
+
+class _StubPatchInfo:
+    def __init__(self, bbox: geom.Box2I):
+        self._bbox = bbox
+
+    def getInnerBBox(self) -> geom.Box2I:
+        return self._bbox
+
+
+class _StubTractInfo:
+    """The parts of `lsst.skymap.TractInfo` used when plotting."""
+
+    def __init__(self):
+        self.num_patches = geom.Extent2I(_NUM_PATCHES, _NUM_PATCHES)
+        self._patchSize = _TRACT_SIZE // _NUM_PATCHES
+        self._wcs = _StubWcs(_TRACT_CENTER, _TRACT_SIZE / 2, _PIXEL_SCALE)
+
+    def getWcs(self) -> _StubWcs:
+        return self._wcs
+
+    def getBBox(self) -> geom.Box2I:
+        return geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(_TRACT_SIZE, _TRACT_SIZE))
+
+    def getPatchInfo(self, patch: int) -> _StubPatchInfo:
+        y, x = divmod(int(patch), _NUM_PATCHES)
+        corner = geom.Point2I(x * self._patchSize, y * self._patchSize)
+        return _StubPatchInfo(geom.Box2I(corner, geom.Extent2I(self._patchSize, self._patchSize)))
+
+
+class StubSkyMap:
+    """A skymap with a single square tract, for use in place of a
+    `lsst.skymap.BaseSkyMap` when plotting.
+    """
+
+    def generateTract(self, tract: int) -> _StubTractInfo:
+        return _StubTractInfo()
+
+    def __getitem__(self, tract: int) -> _StubTractInfo:
+        return self.generateTract(tract)
+
+
+class _StubMapping:
+    def __init__(self, offset: tuple[float, float], scale: float):
+        self._offset = offset
+        self._scale = scale
+
+    def applyForward(self, points: np.ndarray) -> np.ndarray:
+        return np.asarray(points) * self._scale + np.array(self._offset)[:, np.newaxis]
+
+
+class _StubDetector:
+    def __init__(self, detectorId: int):
+        row, column = divmod(detectorId, int(math.sqrt(_NUM_DETECTORS)))
+        # Focal plane positions are in mm, with 10 micron pixels.
+        self._mapping = _StubMapping((column * _DETECTOR_SIZE * 0.01, row * _DETECTOR_SIZE * 0.01), 0.01)
+
+    def getTransform(self, fromSys: Any, toSys: Any) -> _StubDetector:
+        return self
+
+    def getMapping(self) -> _StubMapping:
+        return self._mapping
+
+
+class StubCamera:
+    """A camera with a square grid of detectors, for use in place of a
+    `lsst.afw.cameraGeom.Camera` when plotting.
+    """
+
+    def __getitem__(self, detectorId: int) -> _StubDetector:
+        return _StubDetector(int(detectorId))
+
+
+def _fluxes(mags: np.ndarray, rng: np.random.Generator, snrAt20: float = 500.0) -> tuple:
+    """Return fluxes in nJy and their errors for the given magnitudes."""
+    flux = 10 ** ((31.4 - mags) / 2.5)
+    fluxErr = flux / (snrAt20 * 10 ** ((20.0 - mags) / 2.5))
+    return flux + rng.normal(0.0, fluxErr), fluxErr
+
+
+def _flags(nRows: int, rng: np.random.Generator, fraction: float = 0.01) -> np.ndarray:
+    return rng.random(nRows) < fraction
+
+
+def makeObjectTable(nRows: int, bands: tuple[str, ...] = ("g", "r", "i"), seed: int = 0) -> KeyedData:
+    """Make a synthetic object table, which has also been matched to a
+    reference catalog.
+
+    Half of the objects are stars whose colors follow a simple stellar locus,
+    and the rest are galaxies. The objects are spread uniformly over the tract
+    of `StubSkyMap`.
+
+    Parameters
+    ----------
+    nRows : `int`
+        The number of objects.
+    bands : `tuple` [`str`]
+        The bands to make per band columns for. This must include ``g``,
+        ``r`` and ``i`` for the stellar locus columns to be present.
+    seed : `int`
+        The seed of the random number generator.
+
+    Returns
+    -------
+    data : `KeyedData`
+        The columns of the table.
+    """
+    rng = np.random.default_rng(seed)
+    data: dict[str, np.ndarray] = {}
+    x = rng.uniform(0, _TRACT_SIZE, nRows)
+    y = rng.uniform(0, _TRACT_SIZE, nRows)
+    cosDec = math.cos(math.radians(_TRACT_CENTER[1]))
+    data["coord_ra"] = _TRACT_CENTER[0] + (x - _TRACT_SIZE / 2) * _PIXEL_SCALE / cosDec
+    data["coord_dec"] = _TRACT_CENTER[1] + (y - _TRACT_SIZE / 2) * _PIXEL_SCALE
+    patchSize = _TRACT_SIZE // _NUM_PATCHES
+    data["patch"] = (y // patchSize).astype(int) * _NUM_PATCHES + (x // patchSize).astype(int)
+    data["sky_object"] = _flags(nRows, rng)
+    data["detect_isPatchInner"] = np.ones(nRows, dtype=bool)
+    data["detect_isDeblendedSource"] = np.ones(nRows, dtype=bool)
+    data["xy_flag"] = _flags(nRows, rng)
+    data["ebv"] = rng.uniform(0.0, 0.1, nRows)
+    data["match_distance"] = np.where(_flags(nRows, rng, 0.05), -1.0, rng.exponential(0.1, nRows))
+
+    isStar = rng.random(nRows) < 0.5
+    data["refcat_is_pointsource"] = isStar
+    # Stars follow r - i = 0.45 (g - r) - 0.12, approximately the blue part
+    # of the stellar locus.
+    rMag = rng.uniform(17.0, 26.0, nRows)
+    gr = np.where(isStar, rng.uniform(0.3, 1.2, nRows), rng.uniform(0.0, 1.5, nRows))
+    ri = np.where(isStar, 0.45 * gr - 0.12 + rng.normal(0.0, 0.02, nRows), rng.uniform(-0.2, 1.0, nRows))
+    colors = {"u": 1.5 + gr, "g": gr, "r": 0.0, "i": -ri, "z": -ri - 0.1, "y": -ri - 0.15}
+    for band in bands:
+        mags = rMag + colors.get(band, 0.0)
+        data[f"refcat_flux_{band}"] = 10 ** ((31.4 - mags) / 2.5)
+        data[f"{band}_psfFlux"], data[f"{band}_psfFluxErr"] = _fluxes(mags, rng)
+        galaxyExcess = np.where(isStar, 0.0, rng.uniform(0.1, 1.0, nRows))
+        data[f"{band}_cModelFlux"], data[f"{band}_cModelFluxErr"] = _fluxes(mags - galaxyExcess, rng)
+        data[f"{band}_ap09Flux"], _ = _fluxes(mags - galaxyExcess / 2, rng)
+        data[f"{band}_extendedness"] = (~isStar).astype(float)
+        for flag in ("psfFlux_flag", "extendedness_flag", "pixelFlags_saturatedCenter", "pixelFlags_edge"):
+            data[f"{band}_{flag}"] = _flags(nRows, rng)
+        psfSize = rng.uniform(2.0, 3.0)
+        for moment, scale in (("ixx", 1.0), ("iyy", 1.0), ("ixy", 0.1)):
+            psf = psfSize * scale * (1 + rng.normal(0.0, 0.01, nRows))
+            data[f"{band}_{moment}PSF"] = psf
+            size = np.where(isStar, rng.normal(0.0, 0.01, nRows), rng.exponential(0.5, nRows))
+            data[f"{band}_{moment}"] = psf * (1 + size)
+    return data
+
+
+def makeSourceTable(
+    nRows: int, bands: tuple[str, ...] = ("i",), nVisits: int = 20, seed: int = 0
+) -> KeyedData:
+    """Make a synthetic table of sources associated across visits.
+
+    Each object is observed once in each of ``nVisits`` visits, in one of the
+    bands, with a positional scatter of 10 mas.
+
+    Parameters
+    ----------
+    nRows : `int`
+        The number of sources, which is rounded down to a multiple of
+        ``nVisits``.
+    bands : `tuple` [`str`]
+        The bands the visits are taken in.
+    nVisits : `int`
+        The number of visits.
+    seed : `int`
+        The seed of the random number generator.
+
+    Returns
+    -------
+    data : `KeyedData`
+        The columns of the table.
+    """
+    rng = np.random.default_rng(seed)
+    nObjects = max(nRows // nVisits, 1)
+    nRows = nObjects * nVisits
+    objects = makeObjectTable(nObjects, bands=("r",), seed=seed)
+    objIndex = np.repeat(np.arange(nObjects), nVisits)
+    visit = np.tile(np.arange(nVisits), nObjects)
+    data: dict[str, np.ndarray] = {
+        "obj_index": objIndex,
+        "visit": visit,
+        "band": np.array(bands)[visit % len(bands)],
+        "detector": rng.integers(0, _NUM_DETECTORS, nRows),
+        "x": rng.uniform(0, _DETECTOR_SIZE, nRows),
+        "y": rng.uniform(0, _DETECTOR_SIZE, nRows),
+    }
+    scatter = 10.0 / 3600.0 / 1000.0
+    data["coord_ra"] = objects["coord_ra"][objIndex] + rng.normal(0.0, scatter, nRows)
+    data["coord_dec"] = objects["coord_dec"][objIndex] + rng.normal(0.0, scatter, nRows)
+    # Repeatability is computed from bright stars, so use a brighter
+    # magnitude range than the object table does.
+    mags = rng.uniform(16.0, 23.0, nObjects)[objIndex]
+    data["psfFlux"], data["psfFluxErr"] = _fluxes(mags, rng)
+    return data
+
+
+def makeDiaSourceTable(nRows: int, seed: int = 0) -> KeyedData:
+    """Make a synthetic diaSource table.
+
+    Parameters
+    ----------
+    nRows : `int`
+        The number of diaSources.
+    seed : `int`
+        The seed of the random number generator.
+
+    Returns
+    -------
+    data : `KeyedData`
+        The columns of the table.
+    """
+    rng = np.random.default_rng(seed)
+    data: dict[str, np.ndarray] = {
+        "diaSourceId": np.arange(nRows),
+        "parentDiaSourceId": np.where(_flags(nRows, rng, 0.1), rng.integers(1, nRows + 1, nRows), 0),
+        "reliability": rng.random(nRows),
+    }
+    for flag in ("bad", "edge", "interpolatedCenter", "saturatedCenter"):
+        data[f"pixelFlags_{flag}"] = _flags(nRows, rng, 0.05)
+    return data
+
+
+@dataclass
+class StageProfile:
+    """The resources used by one stage of an `AnalysisTool`."""
+
+    seconds: float = 0.0
+    """The wall clock time spent in the stage, in seconds (`float`)."""
+
+    peakBytes: int | None = None
+    """The peak memory allocated while running the stage over the memory
+    allocated when it started, in bytes, or `None` if memory was not traced
+    (`int` or `None`).
+    """
+
+
+@contextmanager
+def _instrumentStages(tool: AnalysisTool, profiles: dict[str, StageProfile]) -> Iterator[None]:
+    """Accumulate the time and memory used by calls to the stages of a tool
+    into ``profiles``.
+
+    The ``__call__`` method of each stage's class is temporarily replaced, as
+    the stages are configs whose instances can not be modified.
+    """
+    stageNames = {id(getattr(tool, name)): name for name in STAGES}
+    active: list[str] = []
+    patched: dict[type, Any] = {}
+
+    def makeWrapper(original: Callable) -> Callable:
+        def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+            stage = stageNames.get(id(self))
+            # Calls nested in a stage are part of that stage, this also
+            # guards against counting a stage twice when its class inherits
+            # a wrapped method.
+            if stage is None or active:
+                return original(self, *args, **kwargs)
+            active.append(stage)
+            tracing = tracemalloc.is_tracing()
+            if tracing:
+                startBytes, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+            start = time.perf_counter()
+            try:
+                return original(self, *args, **kwargs)
+            finally:
+                profile = profiles.setdefault(stage, StageProfile())
+                profile.seconds += time.perf_counter() - start
+                if tracing:
+                    _, peakBytes = tracemalloc.get_traced_memory()
+                    profile.peakBytes = max(profile.peakBytes or 0, peakBytes - startBytes)
+                active.pop()
+
+        return wrapper
+
+    for name in STAGES:
+        cls = type(getattr(tool, name))
+        if cls not in patched:
+            patched[cls] = cls.__dict__.get("__call__")
+            cls.__call__ = makeWrapper(cls.__call__)
+    try:
+        yield
+    finally:
+        for cls, original in patched.items():
+            if original is None:
+                del cls.__call__
+            else:
+                cls.__call__ = original
+
+
+def profileTool(
+    tool: AnalysisTool, data: KeyedData, repeat: int = 1, traceMemory: bool = True, **kwargs: Any
+) -> dict[str, StageProfile]:
+    """Run a tool on some data and measure the resources used by each stage.
+
+    Parameters
+    ----------
+    tool : `AnalysisTool`
+        The tool to run. It is finalized if that has not been done already.
+    data : `KeyedData`
+        The data to run the tool on.
+    repeat : `int`
+        The number of times to time the tool, the fastest run is reported.
+    traceMemory : `bool`
+        Whether to make an extra run of the tool, with memory allocations
+        traced, to measure the peak memory of each stage. Tracing slows
+        down the tool, so this run is not timed.
+    **kwargs
+        Keyword arguments to call the tool with.
+
+    Returns
+    -------
+    profiles : `dict` [`str`, `StageProfile`]
+        The resources used by the ``prep``, ``process`` and ``produce``
+        stages, and by the ``total`` call of the tool. For tools called with
+        more than one band, the times are summed over the bands.
+    """
+    if not tool.__dict__.get("_finalizeRun"):
+        tool.finalize()
+        tool.__dict__["_finalizeRun"] = True
+
+    best: dict[str, StageProfile] | None = None
+    for _ in range(max(repeat, 1)):
+        profiles: dict[str, StageProfile] = {}
+        with _instrumentStages(tool, profiles):
+            start = time.perf_counter()
+            tool(data, **_copyKwargs(kwargs))
+            profiles["total"] = StageProfile(time.perf_counter() - start)
+        plt.close("all")
+        if best is None or profiles["total"].seconds < best["total"].seconds:
+            best = profiles
+    assert best is not None
+
+    if traceMemory:
+        traced: dict[str, StageProfile] = {}
+        wasTracing = tracemalloc.is_tracing()
+        if not wasTracing:
+            tracemalloc.start()
+        try:
+            with _instrumentStages(tool, traced):
+                startBytes, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                tool(data, **_copyKwargs(kwargs))
+                _, peakBytes = tracemalloc.get_traced_memory()
+        finally:
+            if not wasTracing:
+                tracemalloc.stop()
+        plt.close("all")
+        for stage, profile in traced.items():
+            best.setdefault(stage, StageProfile()).peakBytes = profile.peakBytes
+        best["total"].peakBytes = peakBytes - startBytes
+    return best
+
+
+def _copyKwargs(kwargs: Mapping[str, Any]) -> dict[str, Any]:
+    # Tools modify the plotInfo they are given, so each call gets its own.
+    kwargs = dict(kwargs)
+    if "plotInfo" in kwargs:
+        kwargs["plotInfo"] = dict(kwargs["plotInfo"])
+    return kwargs
+
+
+@dataclass
+class BenchmarkCase:
+    """A tool to benchmark and the data to run it on."""
+
+    makeTool: Callable[[], AnalysisTool]
+    """Make the tool to benchmark."""
+
+    makeData: Callable[[int], KeyedData]
+    """Make synthetic data of the given number of rows to run the tool on."""
+
+    kwargs: dict[str, Any] = field(default_factory=dict)
+    """Keyword arguments to call the tool with, in addition to the
+    ``plotInfo``, ``skymap`` and ``camera`` which are always supplied.
+    """
+
+
+def _makeMatchedRefCoaddDiffMagTool() -> AnalysisTool:
+    return MatchedRefCoaddDiffMagTool(
+        fluxes={"cmodel": MagnitudeTool.fluxes_default.cmodel_err}, mag_y="cmodel", name_prefix="", unit=""
+    )
+
+
+cases: dict[str, BenchmarkCase] = {
+    "stellarLocus": BenchmarkCase(WPerpPSF, makeObjectTable),
+    "astrometricRelativeRepeatability": BenchmarkCase(
+        AstrometricRelativeRepeatability, makeSourceTable, {"bands": ["i"]}
+    ),
+    "shapeSizeFractionalDiff": BenchmarkCase(
+        ShapeSizeFractionalDiffScatter, makeObjectTable, {"bands": ["i"]}
+    ),
+    "matchedRefCoaddDiffMag": BenchmarkCase(
+        _makeMatchedRefCoaddDiffMagTool, makeObjectTable, {"bands": ["i"]}
+    ),
+    "skyPlot": BenchmarkCase(PsfCModelSkyPlot, makeObjectTable, {"bands": ["g", "r", "i"]}),
+    "scatterPlot": BenchmarkCase(PsfCModelScatterPlot, makeObjectTable, {"bands": ["g", "r", "i"]}),
+    "focalPlanePlot": BenchmarkCase(
+        StellarAstrometricResidualsRAFocalPlanePlot, makeSourceTable, {"bands": ["i"]}
+    ),
+    "diaSourceMetrics": BenchmarkCase(NumGoodDiaSourcesMetrics, makeDiaSourceTable),
+}
+"""The benchmark cases, keyed by name (`dict` [`str`, `BenchmarkCase`])."""
+
+
+def runCase(name: str, nRows: int, repeat: int = 1, traceMemory: bool = True) -> dict[str, StageProfile]:
+    """Run a benchmark case.
+
+    Parameters
+    ----------
+    name : `str`
+        The name of the case in `cases`.
+    nRows : `int`
+        The number of rows of synthetic data to run the tool on.
+    repeat : `int`
+        The number of times to time the tool.
+    traceMemory : `bool`
+        Whether to measure the peak memory of each stage.
+
+    Returns
+    -------
+    profiles : `dict` [`str`, `StageProfile`]
+        The resources used by each stage, see `profileTool`.
+    """
+    case = cases[name]
+    data = case.makeData(nRows)
+    plotInfo = {
+        "plotName": name,
+        "run": "benchmark",
+        "tableName": "benchmark",
+        "bands": [],
+        "tract": 0,
+        "skymap": "benchmark",
+    }
+    return profileTool(
+        case.makeTool(),
+        data,
+        repeat=repeat,
+        traceMemory=traceMemory,
+        plotInfo=plotInfo,
+        skymap=StubSkyMap(),
+        camera=StubCamera(),
+        **case.kwargs,
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--cases", nargs="+", choices=sorted(cases), default=list(cases))
+    parser.add_argument("--rows", nargs="+", type=int, default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs, the fastest is shown.")
+    parser.add_argument("--no-memory", dest="traceMemory", action="store_false", help="Do not trace memory.")
+    args = parser.parse_args(argv)
+
+    columns = ("total",) + STAGES
+    print(f"{'case':<34} {'rows':>9} " + " ".join(f"{c + ' s':>10} {c + ' MiB':>12}" for c in columns))
+    for name in args.cases:
+        for nRows in args.rows:
+            profiles = runCase(name, nRows, repeat=args.repeat, traceMemory=args.traceMemory)
+            cells = []
+            for column in columns:
+                profile = profiles.get(column, StageProfile())
+                memory = "-" if profile.peakBytes is None else f"{profile.peakBytes / 2**20:.1f}"
+                cells.append(f"{profile.seconds:>10.3f} {memory:>12}")
+            print(f"{name:<34} {nRows:>9} " + " ".join(cells), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# This file is part of analysis_tools.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import unittest
+
+import lsst.utils.tests
+import numpy as np
+from lsst.analysis.tools.actions.vector import LoadVector
+from lsst.analysis.tools.actions.vector.selectors import FlagSelector, SnSelector
+from lsst.analysis.tools.interfaces import ActionCache
+
+
+class ActionCacheTestCase(unittest.TestCase):
+    """Test the memoization of actions with an `ActionCache`."""
+
+    def setUp(self):
+        rng = np.random.default_rng(12)
+        self.data = {
+            "g_flag": rng.random(100) > 0.5,
+            "r_flag": rng.random(100) > 0.5,
+            "g_psfFlux": rng.normal(1000, 10, size=100),
+            "g_psfFluxErr": np.full(100, 10.0),
+        }
+        self.selector = FlagSelector(selectWhenFalse=["{band}_flag"])
+        self.selector.freeze()
+
+    def testHitsAndMisses(self):
+        cache = ActionCache(self.data)
+        first = cache.evaluate(self.selector, self.data, band="g")
+        second = cache.evaluate(FlagSelector(selectWhenFalse=["{band}_flag"]), self.data, band="g")
+        np.testing.assert_array_equal(first, ~self.data["g_flag"])
+        np.testing.assert_array_equal(second, first)
+        # Consumers may modify their results without affecting the cache or
+        # the input data.
+        second[:] = False
+        np.testing.assert_array_equal(cache.evaluate(self.selector, self.data, band="g"), first)
+        cache.evaluate(LoadVector(vectorKey="g_psfFlux"), self.data, band="g")
+        self.assertTrue(self.data["g_psfFlux"].flags.writeable)
+        loaded = cache.evaluate(LoadVector(vectorKey="g_psfFlux"), self.data, band="g")
+        loaded[:] = 0.0
+        self.assertTrue(np.all(self.data["g_psfFlux"] != 0.0))
+
+        other = cache.evaluate(self.selector, self.data, band="r")
+        np.testing.assert_array_equal(other, ~self.data["r_flag"])
+        stats = cache.stats
+        self.assertEqual((stats.hits, stats.misses, stats.entries), (3, 3, 3))
+        self.assertEqual(stats.nbytes, 1000)
+
+    def testBandIndependence(self):
+        cache = ActionCache(self.data)
+        selector = FlagSelector(selectWhenFalse=["g_flag"])
+        first = cache.evaluate(selector, self.data, band="g")
+        # Without a band template the result is shared between bands.
+        np.testing.assert_array_equal(cache.evaluate(selector, self.data, band="r"), first)
+        # Actions adding the band to plot labels are not shared.
+        snSelector = SnSelector(fluxType="g_psfFlux", threshold=50, bands=["g"])
+        cache.evaluate(snSelector, self.data, band="g")
+        cache.evaluate(snSelector, self.data, band="r")
+        self.assertEqual((cache.stats.hits, cache.stats.misses), (1, 3))
+
+    def testBypass(self):
+        cache = ActionCache(self.data)
+        # Different data, or unknown non-trivial kwargs, are not cached.
+        cache.evaluate(self.selector, dict(self.data), band="g")
+        cache.evaluate(self.selector, self.data, band="g", mask=np.ones(100, dtype=bool))
+        self.assertEqual(cache.stats.entries, 0)
+
+        # Constant kwargs supplied to the cache are part of the key.
+        constant = object()
+        cache = ActionCache(self.data, skymap=constant)
+        cache.evaluate(self.selector, self.data, band="g", skymap=constant)
+        cache.evaluate(self.selector, self.data, band="g", skymap=constant)
+        self.assertEqual((cache.stats.hits, cache.stats.misses), (1, 1))
+
+    def testEviction(self):
+        cache = ActionCache(self.data, maxBytes=150)
+        cache.evaluate(self.selector, self.data, band="g")
+        cache.evaluate(self.selector, self.data, band="r")
+        stats = cache.stats
+        self.assertEqual((stats.entries, stats.evictions, stats.nbytes), (1, 1, 100))
+        # The least recently used result was evicted.
+        cache.evaluate(self.selector, self.data, band="g")
+        self.assertEqual(cache.stats.hits, 0)
+
+    def testShare(self):
+        cache = ActionCache(self.data, maxBytes=1000)
+        # Shared values are held whatever the plan, within the memory limit.
+        cache.setPlan({})
+        calls = []
+        for _ in range(2):
+            value = cache.share("positions", lambda: calls.append(1) or (np.zeros(50), np.zeros(50)))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(value), 2)
+        stats = cache.stats
+        self.assertEqual((stats.hits, stats.misses, stats.entries, stats.nbytes), (1, 1, 1, 800))
+        cache.share("large", lambda: np.zeros(200))
+        self.assertEqual(cache.stats.entries, 1)
+
+    def testPlotInfoReplay(self):
+        selector = SnSelector(fluxType="{band}_psfFlux", threshold=50, plotLabelKey="snLabel")
+        cache = ActionCache(self.data)
+        plotInfo = {}
+        cache.evaluate(selector, self.data, band="g", plotInfo=plotInfo)
+        secondPlotInfo = {}
+        cache.evaluate(selector, self.data, band="g", plotInfo=secondPlotInfo)
+        self.assertEqual(cache.stats.hits, 1)
+        self.assertIn("snLabel", secondPlotInfo)
+        self.assertEqual(plotInfo, secondPlotInfo)
+
+
+class MyMemoryTestCase(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
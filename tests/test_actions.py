@@ -25,14 +25,22 @@ import astropy.units as u
 import lsst.utils.tests
 import numpy as np
 import pandas as pd
+from lsst.analysis.tools.actions.keyedData import KeyedScalars
 from lsst.analysis.tools.actions.keyedData.calcDistances import CalcRelativeDistances
 from lsst.analysis.tools.actions.scalar import (
     ApproxFloor,
     CountAction,
+    FracInRange,
+    FracNan,
+    FracThreshold,
+    MaxAction,
     MeanAction,
     MedianAction,
+    MinAction,
+    RmsAction,
     SigmaMadAction,
     StdevAction,
+    SumAction,
 )
 from lsst.analysis.tools.actions.vector import (
     CalcBinnedStatsAction,
@@ -43,6 +51,8 @@ from lsst.analysis.tools.actions.vector import (
     ExtinctionCorrectedMagDiff,
     LoadVector,
     MagDiff,
+    PerGroupStatistic,
+    ResidualWithPerGroupStatistic,
 )
 from lsst.analysis.tools.actions.vector.mathActions import (
     AddVector,
@@ -67,6 +77,16 @@ from lsst.analysis.tools.actions.vector.selectors import (
     StarSelector,
     VectorSelector,
 )
+from lsst.analysis.tools.interfaces import ActionCache, VectorStatistics, VectorStatisticsCache
+from lsst.analysis.tools.math import (
+    GroupIndex,
+    nanMax,
+    nanMean,
+    nanMedian,
+    nanMin,
+    nanSigmaMad,
+    nanStd,
+)
 from lsst.pex.config import FieldValidationError
 
 
@@ -126,6 +146,107 @@ class TestScalarActions(unittest.TestCase):
 
     def testApproxFloorAction(self):
         self._testScalarActionAlmostEqual(ApproxFloor, 9216.0, 2352.5)
+        # Compare with sorting, with NaN values sorted last, for short vectors
+        # which are mostly NaN.
+        rng = np.random.default_rng(3)
+        action = ApproxFloor(vectorKey="y")
+        for size in (1, 9, 10, 25, 101):
+            for nanFraction in (0.0, 0.05, 0.5, 1.0):
+                values = rng.normal(size=size)
+                values[rng.random(size) < nanFraction] = np.nan
+                truth = nanMedian(np.sort(values)[-(size // 10) :])
+                np.testing.assert_equal(action({"y": values}), truth)
+        # Boolean and small integer values are averaged in floating point.
+        for values in (
+            np.array([100] * 20 + [120] * 20, dtype=np.int8),
+            np.array([False] * 20 + [True] * 20),
+        ):
+            truth = nanMedian(np.sort(values)[-(values.size // 10) :])
+            self.assertEqual(action({"y": values}), truth)
+
+    def testVectorStatistics(self):
+        rng = np.random.default_rng(2)
+        values = rng.normal(size=1001)
+        values[rng.random(1001) < 0.1] = np.nan
+        mask = rng.random(1001) < 0.7
+        cases = (
+            (values, None),
+            (values, mask),
+            (values, np.flatnonzero(mask)),
+            (values[:100].reshape((10, 10)), None),
+            (values[:4], None),
+            (np.full(3, np.nan), None),
+            (rng.integers(0, 100, 51), None),
+            (rng.integers(100, 128, 50, dtype=np.int8), None),
+            (rng.random(50) < 0.7, None),
+            (np.array([False, True, True, True]), None),
+        )
+        for vector, vectorMask in cases:
+            selected = vector if vectorMask is None else vector[vectorMask]
+            statistics = VectorStatistics(vector, vectorMask)
+            statistics.compute(VectorStatistics.statistics)
+            self.assertEqual(statistics.size, selected.size)
+            self.assertEqual(statistics.count, np.count_nonzero(~np.isnan(selected)))
+            self.assertEqual(statistics.nanCount, np.count_nonzero(np.isnan(selected)))
+            np.testing.assert_allclose(statistics.sum, np.nansum(selected))
+            for name, func in (
+                ("median", nanMedian),
+                ("mean", nanMean),
+                ("std", nanStd),
+                ("sigmaMad", nanSigmaMad),
+                ("min", nanMin),
+                ("max", nanMax),
+            ):
+                np.testing.assert_allclose(getattr(statistics, name), func(selected), err_msg=name)
+            np.testing.assert_allclose(statistics.rms, np.sqrt(np.nanmean(selected**2.0)))
+            with self.assertRaises(ValueError):
+                statistics.values[:] = 0.0
+        with self.assertRaises(ValueError):
+            VectorStatistics(values).compute(["mode"])
+        with self.assertRaises(ValueError):
+            VectorStatistics(values[:0]).max
+
+    def testVectorStatisticsCache(self):
+        actions = [MedianAction(vectorKey="{band}_y"), SigmaMadAction(vectorKey="{band}_y")]
+        actions.append(MeanAction(vectorKey="i_y"))
+        actions.append(SumAction(vectorKey="r_y"))
+        cache = VectorStatisticsCache()
+        cache.plan(actions, band="i")
+        vector, mask = self.data["i_y"], self.mask["i"]
+        # The statistics are shared by the three actions reading i_y, and
+        # released after the last of them.
+        first = cache.get("i_y", vector, mask)
+        self.assertIs(cache.get("i_y", vector, mask), first)
+        self.assertIs(cache.get("i_y", vector, mask), first)
+        self.assertIsNot(cache.get("i_y", vector, mask), first)
+        # Statistics read by a single action are not kept.
+        rStatistics = cache.get("r_y", self.data["r_y"])
+        self.assertIsNot(cache.get("r_y", self.data["r_y"]), rStatistics)
+
+        # Actions give the same results with and without sharing statistics.
+        keyedScalars = KeyedScalars()
+        for name, cls in (
+            ("median", MedianAction),
+            ("mean", MeanAction),
+            ("std", StdevAction),
+            ("sigmaMad", SigmaMadAction),
+            ("count", CountAction),
+            ("rms", RmsAction),
+            ("max", MaxAction),
+            ("min", MinAction),
+            ("sum", SumAction),
+            ("fracNan", FracNan),
+            ("fracInRange", FracInRange),
+            ("approxFloor", ApproxFloor),
+        ):
+            setattr(keyedScalars.scalarActions, name, cls(vectorKey="{band}_y"))
+        keyedScalars.scalarActions.fracThreshold = FracThreshold(
+            vectorKey="{band}_y", op="lt", threshold=100.0, relative_to_median=True
+        )
+        for band in ("r", "i", "z"):
+            result = keyedScalars(self.data, band=band, mask=self.mask[band])
+            for name, action in keyedScalars.scalarActions.items():
+                self.assertAlmostEqual(result[name], action(self.data, band=band, mask=self.mask[band]))
 
 
 class TestVectorActions(unittest.TestCase):
@@ -403,9 +524,42 @@ class TestVectorActions(unittest.TestCase):
 
     # Statistical vectorActions
 
-    # def testPerGroupStatistic(self): TODO: implement
-
-    # def testResidualWithPerGroupStatistic(self): TODO: implement
+    def _makeGroupData(self):
+        rng = np.random.default_rng(42)
+        groups = rng.integers(0, 50, 500).astype(float)
+        groups[::37] = np.nan
+        values = rng.normal(size=500)
+        values[::11] = np.nan
+        return {"obj_index": groups, "r_vector": values}
+
+    def testPerGroupStatistic(self):
+        data = self._makeGroupData()
+        frame = pd.DataFrame(data)
+        for func in ("count", "mean", "median", "std", "min", "max", "sem"):
+            with self.subTest(func=func):
+                action = PerGroupStatistic(buildAction=LoadVector(vectorKey="r_vector"), func=func)
+                self._checkSchema(action, ["obj_index", "r_vector"])
+                truth = frame.groupby("obj_index")["r_vector"].aggregate(func).to_numpy()
+                np.testing.assert_allclose(action(data), truth, rtol=1e-12)
+
+        action = PerGroupStatistic(buildAction=LoadVector(vectorKey="r_vector"), func="sigmaMad")
+        truth = frame.groupby("obj_index")["r_vector"].aggregate(nanSigmaMad).to_numpy()
+        np.testing.assert_allclose(action(data), truth, rtol=1e-12)
+
+        # All the actions grouping the same vector share one grouping.
+        self.assertIs(GroupIndex.fromKeys(data["obj_index"]), GroupIndex.fromKeys(data["obj_index"]))
+
+    def testResidualWithPerGroupStatistic(self):
+        data = self._makeGroupData()
+        frame = pd.DataFrame(data)
+        for func in ("mean", "median", "sem"):
+            with self.subTest(func=func):
+                action = ResidualWithPerGroupStatistic(
+                    buildAction=LoadVector(vectorKey="r_vector"), func=func
+                )
+                self._checkSchema(action, ["obj_index", "r_vector"])
+                truth = frame["r_vector"] - frame.groupby("obj_index")["r_vector"].transform(func)
+                np.testing.assert_allclose(action(data), truth, rtol=1e-12)
 
 
 class TestVectorRhoStats(unittest.TestCase):
@@ -527,6 +681,13 @@ class TestVectorSelectors(unittest.TestCase):
         schema = [col for col, colType in action.getInputSchema()]
         self.assertEqual(sorted(schema), sorted(truth))
 
+    def _checkRowFilters(self, action, **kwargs):
+        comparisons = {"==": np.equal, "<": np.less, ">=": np.greater_equal}
+        mask = np.ones(self.size, dtype=bool)
+        for column, comparison, value in action.getRowFilters(**kwargs):
+            mask &= comparisons[comparison](self.data[column], value)
+        np.testing.assert_array_equal(mask, action(self.data, **kwargs))
+
     def testFlagSelector(self):
         selector = FlagSelector(
             selectWhenFalse=["{band}_psfFlux_flag"], selectWhenTrue=["detect_isPatchInner"]
@@ -537,6 +698,7 @@ class TestVectorSelectors(unittest.TestCase):
         truth[1] = False
         truth[9] = False
         np.testing.assert_array_equal(result, truth)
+        self._checkRowFilters(selector, band="r")
 
     def testCoaddPlotFlagSelector(self):
         # Test defaults
@@ -573,6 +735,7 @@ class TestVectorSelectors(unittest.TestCase):
         for bit in (1, 11):
             truth[bit] = 0
         np.testing.assert_array_equal(result, truth)
+        self._checkRowFilters(selector)
 
     def testRangeSelector(self):
         selector = RangeSelector(vectorKey="r_psfFlux", minimum=np.nextafter(20, 30), maximum=50)
@@ -580,6 +743,7 @@ class TestVectorSelectors(unittest.TestCase):
         result = self.data["r_psfFlux"][selector(self.data)]
         truth = [30, 40]
         np.testing.assert_array_equal(result, truth)
+        self._checkRowFilters(selector)
 
     def testSnSelector(self):
         # test defaults
@@ -705,6 +869,29 @@ class TestKeyedDataActions(unittest.TestCase):
         self.assertNotEqual(res["ADx"], np.nan)
         self.assertNotEqual(res["AFx"], np.nan)
 
+        # Sharing a wider self-match gives the same results, and the pairs
+        # downsampled from shared self-matches do not depend on their radius.
+        res = CalcRelativeDistances()(data)
+        shared = CalcRelativeDistances(selfMatchRadius=10.0)(data)
+        for key in ("AMx", "ADx", "AFx"):
+            self.assertEqual(res[key], shared[key])
+        res = CalcRelativeDistances(maxPairs=100, selfMatchRadius=10.0)(data)
+        shared = CalcRelativeDistances(maxPairs=100, selfMatchRadius=20.0)(data)
+        for key in ("AMx", "ADx", "AFx"):
+            self.assertEqual(res[key], shared[key])
+        with self.assertRaises(ValueError):
+            CalcRelativeDistances(selfMatchRadius=5.0)(data)
+
+        # Actions computing different annuli share a self-match through an
+        # action cache, which holds it until the cache is discarded.
+        cache = ActionCache(data)
+        for annulus in (1.0, 5.0):
+            res = CalcRelativeDistances(annulus=annulus)(data)
+            shared = CalcRelativeDistances(annulus=annulus, selfMatchRadius=10.0)(data, actionCache=cache)
+            for key in ("AMx", "ADx", "AFx"):
+                self.assertEqual(res[key], shared[key])
+        self.assertEqual((cache.stats.hits, cache.stats.misses, cache.stats.entries), (1, 1, 1))
+
 
 if __name__ == "__main__":
     lsst.utils.tests.init()
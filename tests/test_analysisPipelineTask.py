@@ -0,0 +1,255 @@
+# This file is part of analysis_tools.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import threading
+import unittest
+from unittest.mock import patch
+
+import lsst.utils.tests
+import numpy as np
+import pandas as pd
+from lsst.analysis.tools.actions.scalar import CountAction, MedianAction
+from lsst.analysis.tools.actions.vector import LoadVector
+from lsst.analysis.tools.actions.vector.selectors import FlagSelector, RangeSelector
+from lsst.analysis.tools.interfaces import (
+    ActionCache,
+    ActionPlanner,
+    AnalysisBaseConfig,
+    AnalysisPipelineTask,
+    AnalysisTool,
+    ArrowKeyedData,
+    PlotAction,
+    Vector,
+    _analysisTools,
+)
+from lsst.pipe.base import InMemoryDatasetHandle
+from matplotlib.figure import Figure
+
+
+class _TestTask(AnalysisPipelineTask):
+    _DefaultName = "testAnalysisPipelineTask"
+
+
+def _makeTool(key: str, minimum: float) -> AnalysisTool:
+    tool = AnalysisTool()
+    tool.prep.selectors.flags = FlagSelector(selectWhenFalse=["{band}_flag"])
+    tool.prep.selectors.range = RangeSelector(vectorKey="z", minimum=minimum)
+    tool.process.buildActions.x = LoadVector(vectorKey="{band}_x")
+    tool.process.calculateActions.median = MedianAction(vectorKey=key)
+    tool.process.calculateActions.count = CountAction(vectorKey=key)
+    tool.produce.metric.units = {"median": "", "count": "ct"}
+    tool.produce.metric.newNames = {"median": "{band}_median", "count": "{band}_count"}
+    return tool
+
+
+class _CountingFlagSelector(FlagSelector):
+    calls = 0
+
+    def __call__(self, data, **kwargs):
+        type(self).calls += 1
+        return super().__call__(data, **kwargs)
+
+
+class _ThreadRecordingPlot(PlotAction):
+    threads: list[threading.Thread] = []
+
+    def getInputSchema(self):
+        return (("{band}_x", Vector),)
+
+    def __call__(self, data, **kwargs):
+        type(self).threads.append(threading.current_thread())
+        return Figure()
+
+
+class _BatchedTool(AnalysisTool):
+    batchBands = True
+
+
+class _PropagatingTool(AnalysisTool):
+    propagateData = True
+
+
+class AnalysisPipelineTaskTestCase(unittest.TestCase):
+    """Test running the configured tools of an `AnalysisPipelineTask`."""
+
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.bands = ["g", "r"]
+        self.data = {"z": rng.normal(size=1000)}
+        for band in self.bands:
+            self.data[f"{band}_x"] = rng.normal(size=1000)
+            self.data[f"{band}_y"] = rng.normal(size=1000)
+            self.data[f"{band}_flag"] = rng.random(1000) > 0.8
+
+    def _makeConfig(self, minima=(-1.0, -1.0, 0.0), **kwargs) -> AnalysisBaseConfig:
+        config = AnalysisBaseConfig()
+        config.connections.outputName = "test"
+        config.bands = self.bands
+        for i, (key, minimum) in enumerate(zip(("{band}_x", "{band}_y", "{band}_x"), minima)):
+            setattr(config.atools, f"tool{i}", _makeTool(key, minimum))
+        for name, value in kwargs.items():
+            setattr(config, name, value)
+        config.freeze()
+        return config
+
+    def _runTask(self, **kwargs) -> dict[str, list[tuple[str, float]]]:
+        return self._measure(_TestTask(config=self._makeConfig(**kwargs)), self.data)
+
+    @staticmethod
+    def _measure(task: AnalysisPipelineTask, data) -> dict[str, list[tuple[str, float]]]:
+        return {
+            name: [(m.metric_name.metric, m.quantity.value) for m in measurements]
+            for name, measurements in task.run(data=data).metrics.items()
+        }
+
+    def testExecutionModes(self):
+        serial = self._runTask()
+        self.assertEqual(list(serial.keys()), ["tool0", "tool1", "tool2"])
+        for mode in ("thread", "process"):
+            with self.subTest(mode=mode):
+                result = self._runTask(executionMode=mode, numWorkers=2)
+                # Results must be merged in the configured order.
+                self.assertEqual(list(result.keys()), list(serial.keys()))
+                self.assertEqual(result, serial)
+
+        # Tools which make plots are run in the task's own thread.
+        config = AnalysisBaseConfig()
+        config.connections.outputName = "test"
+        config.bands = self.bands
+        config.atools.tool0 = _makeTool("{band}_x", -1.0)
+        config.atools.plot = AnalysisTool()
+        config.atools.plot.produce.plot = _ThreadRecordingPlot()
+        config.executionMode = "thread"
+        config.numWorkers = 2
+        config.freeze()
+        _ThreadRecordingPlot.threads = []
+        _TestTask(config=config).run(data=self.data)
+        self.assertEqual(_ThreadRecordingPlot.threads, [threading.main_thread()] * len(self.bands))
+
+    def testActionCache(self):
+        serial = self._runTask()
+        for mode in ("serial", "thread"):
+            with self.subTest(mode=mode):
+                self.assertEqual(self._runTask(cacheActions=True, executionMode=mode, numWorkers=2), serial)
+                self.assertEqual(self._runTask(planActions=True, executionMode=mode, numWorkers=2), serial)
+
+    def testBatchBands(self):
+        tool = _BatchedTool()
+        tool.prep.selectors.flags = _CountingFlagSelector(selectWhenFalse=["g_flag"])
+        tool.process.calculateActions.median = MedianAction(vectorKey="{band}_x")
+        tool.produce.metric.units = {"median": ""}
+        tool.produce.metric.newNames = {"median": "{band}_median"}
+        tool.finalize()
+        _CountingFlagSelector.calls = 0
+        results = tool(self.data, bands=self.bands)
+        self.assertEqual(set(results), {"g_median", "r_median"})
+        # The band independent selector is only evaluated once, and no
+        # results are held once the last band has used them.
+        self.assertEqual(_CountingFlagSelector.calls, 1)
+        caches = []
+
+        def makeCache(*args, **kwargs):
+            caches.append(ActionCache(*args, **kwargs))
+            return caches[-1]
+
+        with patch.object(_analysisTools, "ActionCache", side_effect=makeCache):
+            tool(self.data, bands=self.bands)
+        self.assertEqual(caches[0].maxBytes, tool.batchBandsMaxMemory * 2**20)
+        self.assertEqual(caches[0].stats.entries, 0)
+        self.assertEqual(caches[0].stats.hits, 1)
+
+    def testPushDownSelections(self):
+        task = _TestTask(config=self._makeConfig())
+        # The flag selections differ between bands, and the range selections
+        # differ between tools, so only the common upper bound remains.
+        self.assertEqual(task.collectInputFilters(), [("z", "<", np.inf)])
+
+        task = _TestTask(config=self._makeConfig(minima=(-1.0, -1.0, -1.0), pushDownSelections=True))
+        self.assertEqual(task.collectInputFilters(), [("z", ">=", -1.0), ("z", "<", np.inf)])
+        handle = InMemoryDatasetHandle(pd.DataFrame(self.data), storageClass="DataFrame")
+        loaded = task.loadData(handle)
+        self.assertIsInstance(loaded, pd.DataFrame)
+        self.assertEqual(len(loaded), np.count_nonzero(self.data["z"] >= -1.0))
+        self.assertTrue(np.all(loaded["z"] >= -1.0))
+        # Explicitly requested names are never filtered.
+        self.assertEqual(len(task.loadData(handle, names=["z"])), len(self.data["z"]))
+        self.assertEqual(self._measure(task, loaded), self._measure(task, pd.DataFrame(self.data)))
+
+        # Tools which see all of the data prevent any filtering.
+        config = AnalysisBaseConfig()
+        config.connections.outputName = "test"
+        config.atools.tool0 = _makeTool("{band}_x", -1.0)
+        config.atools.tool1 = _PropagatingTool()
+        config.atools.tool1.prep.selectors.range = RangeSelector(vectorKey="z", minimum=-1.0)
+        config.atools.tool1.process.calculateActions.count = CountAction(vectorKey="z")
+        config.atools.tool1.produce.metric.units = {"count": "ct"}
+        config.freeze()
+        self.assertEqual(_TestTask(config=config).collectInputFilters(), [])
+
+    def testLoadArrowData(self):
+        task = _TestTask(config=self._makeConfig(loadArrowData=True, pushDownSelections=True))
+        frame = pd.DataFrame(self.data)
+        loaded = task.loadData(InMemoryDatasetHandle(frame, storageClass="DataFrame"))
+        self.assertIsInstance(loaded, ArrowKeyedData)
+        self.assertEqual(set(loaded), set(task.collectInputNames()))
+        self.assertEqual(loaded.numRows, len(frame))
+        self.assertEqual(self._measure(task, loaded), self._measure(task, frame))
+
+    def testPlanner(self):
+        config = self._makeConfig()
+        cache = ActionCache(self.data)
+        graph = ActionPlanner(cache).plan(config.atools, bands=self.bands)
+        # Each of the 3 tools requests 2 selectors, a selection, and a build
+        # in each of the 2 bands.
+        self.assertEqual(graph.requests, 24)
+        # In each band the flag selector is shared by all tools, and the
+        # selection and build are shared by tool0 and tool1 (which differ
+        # only in the key used by their calculate actions). The range
+        # selectors do not depend on the band, so are shared between bands.
+        self.assertEqual(len(graph), 2 + 2 + 2 * 2 + 2 * 2)
+        counts = graph.useCounts()
+        self.assertEqual(sorted(counts.values()), [1, 1, 2, 2, 2, 3, 3, 4])
+
+    def testPlannedRejection(self):
+        """Test that the results of selectors skipped after a selection
+        rejects everything are not held by a planned cache.
+        """
+        config = self._makeConfig()
+        data = dict(self.data, g_flag=np.ones(1000, dtype=bool))
+        cache = ActionCache(data)
+        cache.setPlan(ActionPlanner(cache).plan(config.atools, bands=self.bands).useCounts())
+        for tool in config.atools:
+            tool(data, bands=self.bands, actionCache=cache)
+        self.assertGreater(cache.stats.hits, 0)
+        self.assertEqual((cache.stats.entries, cache.stats.nbytes), (0, 0))
+
+
+class MyMemoryTestCase(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,94 @@
+# This file is part of analysis_tools.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import unittest
+
+import lsst.utils.tests
+import numpy as np
+import pyarrow as pa
+from lsst.analysis.tools.interfaces import ArrowKeyedData
+
+
+class ArrowKeyedDataTestCase(unittest.TestCase):
+    """Test `KeyedData` backed by an arrow table."""
+
+    def setUp(self):
+        self.table = pa.table(
+            {
+                "x": np.arange(10.0),
+                "flag": np.arange(10) % 2 == 1,
+                "missing": pa.array([1.0, None] * 5),
+                "chunked": pa.chunked_array([np.arange(5), np.arange(5, 10)]),
+                "tensor": pa.FixedSizeListArray.from_arrays(pa.array(np.arange(20.0)), 2),
+            }
+        )
+
+    def testColumns(self):
+        data = ArrowKeyedData(self.table)
+        self.assertEqual(list(data), ["x", "flag", "missing", "chunked", "tensor"])
+        self.assertEqual(data.numRows, 10)
+
+        # Numeric columns without nulls are read only views of the table.
+        x = data["x"]
+        np.testing.assert_array_equal(x, np.arange(10.0))
+        self.assertFalse(x.flags.writeable)
+        buffer = self.table.column("x").chunk(0).buffers()[1]
+        self.assertEqual(x.ctypes.data, buffer.address)
+        self.assertIs(data["x"], x)
+
+        # Other columns are converted.
+        np.testing.assert_array_equal(data["flag"], np.arange(10) % 2 == 1)
+        self.assertEqual(data["flag"].dtype, bool)
+        self.assertTrue(np.all(np.isnan(data["missing"][1::2])))
+        np.testing.assert_array_equal(data["chunked"], np.arange(10))
+        self.assertEqual(data["tensor"].shape, (10, 2))
+        np.testing.assert_array_equal(data["tensor"][3], [6.0, 7.0])
+
+        # Selecting rows from a view works as for any other vector.
+        np.testing.assert_array_equal(x[data["flag"]], [1.0, 3.0, 5.0, 7.0, 9.0])
+
+        with self.assertRaises(KeyError):
+            data["y"]
+
+    def testAssignment(self):
+        data = ArrowKeyedData(self.table)
+        data["x"] = np.zeros(10)
+        data["y"] = np.ones(10)
+        np.testing.assert_array_equal(data["x"], np.zeros(10))
+        self.assertIn("y", data)
+        # The table is not modified.
+        np.testing.assert_array_equal(self.table.column("x").to_numpy(), np.arange(10.0))
+        del data["y"]
+        self.assertNotIn("y", data)
+
+
+class MyMemoryTestCase(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,70 @@
+# This file is part of analysis_tools.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import TestCase, main
+
+import lsst.utils.tests
+from benchmark_analysisTools import STAGES, cases, makeObjectTable, profileTool, runCase
+from lsst.analysis.tools.actions.vector import LoadVector
+from lsst.analysis.tools.interfaces import AnalysisTool, BasePrep, BaseProcess, BaseProduce
+
+
+class BenchmarkTestCase(TestCase):
+    """Run each benchmark on a small catalog, so that the benchmarks keep
+    working as the tools change.
+    """
+
+    def testCases(self):
+        for name in cases:
+            with self.subTest(name=name):
+                profiles = runCase(name, 1000)
+                self.assertEqual(set(profiles), set(STAGES) | {"total"})
+                for stage in STAGES:
+                    self.assertGreater(profiles[stage].seconds, 0.0)
+                    self.assertIsNotNone(profiles[stage].peakBytes)
+                self.assertGreaterEqual(
+                    profiles["total"].seconds, sum(profiles[stage].seconds for stage in STAGES)
+                )
+
+    def testProfileTool(self):
+        tool = AnalysisTool()
+        tool.process.buildActions.x = LoadVector(vectorKey="g_psfFlux")
+        data = makeObjectTable(100)
+        profiles = profileTool(tool, data, repeat=2, traceMemory=False, bands=["g", "r"])
+        self.assertEqual(set(profiles), set(STAGES) | {"total"})
+        for profile in profiles.values():
+            self.assertIsNone(profile.peakBytes)
+        # The stages are restored once the tool has been profiled.
+        for cls in (BasePrep, BaseProcess, BaseProduce):
+            self.assertNotIn("wrapper", cls.__call__.__qualname__)
+
+
+class MyMemoryTestCase(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    main()
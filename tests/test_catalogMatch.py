@@ -19,7 +19,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import tempfile
 import unittest
+from unittest.mock import MagicMock
 
 import astropy.units as u
 import lsst.afw.table as afwTable
@@ -28,7 +30,13 @@ import lsst.skymap
 import numpy as np
 import pandas as pd
 from astropy.table import Table
-from lsst.analysis.tools.tasks import AstrometricCatalogMatchConfig, AstrometricCatalogMatchTask
+from lsst.analysis.tools.actions.vector import RangeSelector
+from lsst.analysis.tools.tasks import (
+    AstrometricCatalogMatchConfig,
+    AstrometricCatalogMatchTask,
+    CatalogMatchSelectionConfig,
+)
+from lsst.analysis.tools.tasks.catalogMatch import _assignGreedily
 from lsst.daf.base import PropertyList
 from lsst.meas.algorithms.testUtils import MockRefcatDataId
 from lsst.pipe.base import InMemoryDatasetHandle
@@ -67,13 +75,13 @@ class TestCatalogMatch(unittest.TestCase):
 
         refDataId, deferredRefCat = self._make_refCat(starIds, starRas, starDecs, self.tractPoly)
 
-        loaderTask = LoadReferenceCatalogTask(
+        self.loaderTask = LoadReferenceCatalogTask(
             config=config.referenceCatalogLoader,
             dataIds=[refDataId],
             name="gaia_dr3_20230707",
             refCats=[deferredRefCat],
         )
-        self.loadedRefCat = self.task._loadRefCat(loaderTask, tract)
+        self.loadedRefCat = self.task._loadRefCat(self.loaderTask, tract)
         self.loadedRefCat["sourceId"] = np.arange(0, len(self.loadedRefCat))
 
         self.objectTable = self._make_objectCat(starIds, starRas, starDecs)
@@ -209,6 +217,36 @@ class TestCatalogMatch(unittest.TestCase):
         self.assertTrue(inFootprint.all())
         self.assertEqual(len(self.loadedRefCat), self.nStars)
 
+    def test_refCatCache(self):
+        """Test that reference catalogs are cached and read back."""
+        tract = self.skymap.generateTract(self.tract)
+        with tempfile.TemporaryDirectory() as tempDir:
+            self.task.config.refCatCacheDir = tempDir
+            loadedRefCat = self.task._loadRefCat(self.loaderTask, tract, cacheKey="gaia/rings/9813")
+            cachedRefCat = self.task._loadRefCat(None, tract, cacheKey="gaia/rings/9813")
+            self.assertEqual(cachedRefCat.colnames, loadedRefCat.colnames)
+            np.testing.assert_array_equal(cachedRefCat["ra"], loadedRefCat["ra"])
+            self.assertIsInstance(cachedRefCat["ra"].base.base, np.memmap)
+            # The catalog is the same whether or not it was already cached.
+            self.assertEqual(loadedRefCat["refMag"].dtype, np.float32)
+            np.testing.assert_array_equal(cachedRefCat["refMag"], loadedRefCat["refMag"])
+            np.testing.assert_allclose(loadedRefCat["refMag"], self.loadedRefCat["refMag"], rtol=1e-6)
+
+            # A different configuration loads the catalog again.
+            self.task.config.epoch = 2020.0
+            with self.assertRaises(AttributeError):
+                self.task._loadRefCat(None, tract, cacheKey="gaia/rings/9813")
+
+        # Shards ingested again have new ids, so a new key.
+        refCats = [MagicMock() for _ in range(2)]
+        for i, handle in enumerate(refCats):
+            handle.ref.datasetType.name = "gaia"
+            handle.ref.id = i
+        key = self.task._refCatCacheKey(refCats, "rings", self.tract)
+        self.assertEqual(key, self.task._refCatCacheKey(refCats[::-1], "rings", self.tract))
+        refCats[0].ref.id = 2
+        self.assertNotEqual(key, self.task._refCatCacheKey(refCats, "rings", self.tract))
+
     def test_run(self):
         """Test whether `CatalogMatchTask` correctly associates the target and
         reference catalog.
@@ -223,6 +261,92 @@ class TestCatalogMatch(unittest.TestCase):
             list(output.matchedCatalog["sourceId_ref"]),
         )
 
+    def test_returnNonMatches(self):
+        """Test that the unmatched rows of the reference catalog are
+        appended to the matches.
+        """
+        self.task.config.returnNonMatches = True
+        output = self.task.run(
+            targetCatalog=self.objectTable[:900], refCatalog=self.loadedRefCat, bands=self.task.config.bands
+        ).matchedCatalog
+
+        self.assertEqual(len(output), self.nStars)
+        unmatched = np.isnan(output["matchDistance"])
+        np.testing.assert_array_equal(output["sourceId_ref"][unmatched], np.arange(900, self.nStars))
+        # The target columns of unmatched rows are masked, and the flags
+        # the selectors need are set.
+        self.assertTrue(output["sourceId_target"].mask[unmatched].all())
+        self.assertFalse(output["sourceId_target"].mask[~unmatched].any())
+        self.assertTrue(output["detect_isPrimary"][unmatched].all())
+        self.assertTrue(output["detect_isPrimary"].mask[~unmatched].all())
+        self.assertTrue(np.isnan(output["coord_ra"][unmatched]).all())
+
+    def test_runMultiple(self):
+        """Test that matching several selections of the target catalog
+        together gives the same matches as matching each alone.
+        """
+        selection = CatalogMatchSelectionConfig()
+        selection.sourceSelectorActions.leftHalf = RangeSelector(vectorKey="x", maximum=2000)
+        outputs = self.task.runMultiple(
+            targetCatalog=self.objectTable,
+            refCatalog=self.loadedRefCat,
+            bands=self.task.config.bands,
+            selections={"all": self.task.config, "leftHalf": selection},
+        )
+        self.assertEqual(len(outputs.all), self.nStars)
+
+        self.task.config.sourceSelectorActions.leftHalf = RangeSelector(vectorKey="x", maximum=2000)
+        expected = self.task.run(
+            targetCatalog=self.objectTable, refCatalog=self.loadedRefCat, bands=self.task.config.bands
+        ).matchedCatalog
+        self.assertLess(len(expected), self.nStars)
+        self.assertEqual(outputs.leftHalf.colnames, expected.colnames)
+        for column in expected.colnames:
+            np.testing.assert_array_equal(outputs.leftHalf[column], expected[column])
+
+        # Each extra selection has its own output.
+        self.task.config.extraMatchSelections["leftHalf"] = selection
+        connections = self.task.config.ConnectionsClass(config=self.task.config)
+        self.assertEqual(
+            connections.matchedCatalog_leftHalf.name, f"{connections.matchedCatalog.name}_leftHalf"
+        )
+
+    def test_matchNearest(self):
+        """Test that matching nearest candidates assigns targets to reference
+        objects one-to-one.
+        """
+        self.task.config.matchMethod = "nearest"
+        matchedCatalog = self.task.run(
+            targetCatalog=self.objectTable, refCatalog=self.loadedRefCat, bands=self.task.config.bands
+        ).matchedCatalog
+        self.assertEqual(len(matchedCatalog), self.nStars)
+        self.assertEqual(len(np.unique(matchedCatalog["sourceId_ref"])), self.nStars)
+        self.assertTrue(np.all(matchedCatalog["matchCandidates"] >= 1))
+        self.assertTrue(np.all(matchedCatalog["matchCandidates"] <= self.task.config.nCandidates))
+        ambiguous = (matchedCatalog["matchDistanceRatio"] >= self.task.config.ambiguityRatio) | (
+            matchedCatalog["matchRefCandidates"] > 1
+        )
+        np.testing.assert_array_equal(matchedCatalog["matchAmbiguous"], ambiguous)
+
+    def test_assignGreedily(self):
+        """Test that the pairs assigned are those of a greedy assignment by
+        distance.
+        """
+        # The last cases have many candidate pairs colliding on each target
+        # and reference object.
+        for nPairs, nObjects in [(40, 10)] * 20 + [(5000, 100), (20000, 50)]:
+            targets = self.rng.integers(0, nObjects, nPairs)
+            refs = self.rng.integers(0, nObjects, nPairs)
+            dists = self.rng.integers(0, 5, nPairs).astype(float)
+            expected = np.zeros(len(dists), dtype=bool)
+            assignedTargets, assignedRefs = set(), set()
+            for i in np.argsort(dists, kind="stable"):
+                if targets[i] not in assignedTargets and refs[i] not in assignedRefs:
+                    expected[i] = True
+                    assignedTargets.add(targets[i])
+                    assignedRefs.add(refs[i])
+            np.testing.assert_array_equal(_assignGreedily(targets, refs, dists), expected)
+
 
 class MyMemoryTestCase(lsst.utils.tests.MemoryTestCase):
     pass
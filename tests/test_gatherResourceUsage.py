@@ -0,0 +1,149 @@
+# This file is part of analysis_tools.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+import lsst.utils.tests
+import numpy as np
+from lsst.analysis.tools.tasks.gatherResourceUsage import (
+    ConsolidateResourceUsageConfig,
+    ConsolidateResourceUsageTask,
+    GatherResourceUsageConfig,
+    GatherResourceUsageTask,
+    ResourceUsageStore,
+)
+from lsst.daf.butler import DataCoordinate, DimensionUniverse
+from lsst.pipe.base import TaskMetadata
+from lsst.resources import ResourcePath
+
+
+def _makeMetadata(visit):
+    """Make the metadata of a quantum of a task labelled ``isr``."""
+    metadata = TaskMetadata()
+    metadata["quantum.__version__"] = 1
+    metadata["quantum.prepCpuTime"] = 1.0
+    metadata["quantum.initCpuTime"] = 2.0
+    metadata["quantum.startCpuTime"] = 4.0
+    metadata["quantum.endCpuTime"] = 4.0 + visit
+    metadata["quantum.endMaxResidentSetSize"] = 1000 * visit
+    metadata["isr:fringe.runStartCpuTime"] = 5.0
+    metadata["isr:fringe.runEndCpuTime"] = 5.5
+    return metadata
+
+
+class GatherResourceUsageTestCase(unittest.TestCase):
+    """Test gathering resource usage from the metadata of quanta."""
+
+    def setUp(self):
+        self.universe = DimensionUniverse()
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.handles = []
+        for visit in range(1, 6):
+            dataId = DataCoordinate.standardize(
+                {"instrument": "Cam", "visit": visit, "detector": 1}, universe=self.universe
+            )
+            metadata = _makeMetadata(visit)
+            path = os.path.join(self.tempDir.name, f"{visit}.json")
+            with open(path, "w") as stream:
+                stream.write(metadata.model_dump_json())
+            handle = MagicMock()
+            handle.dataId = dataId
+            handle.ref.datasetType.name = "isr_metadata"
+            handle.get.return_value = metadata
+            handle.butler.getURI.return_value = ResourcePath(path)
+            self.handles.append(handle)
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def _run(self, **kwargs):
+        config = GatherResourceUsageConfig()
+        config.dimensions = ["visit", "detector"]
+        config.method_times = ["fringe.run", "missing"]
+        config.connections.input_metadata = "isr_metadata"
+        config.connections.output_table = "isr_resource_usage"
+        config.update(**kwargs)
+        task = GatherResourceUsageTask(config=config)
+        return task.run(self.universe, self.handles).output_table
+
+    def testRun(self):
+        table = self._run()
+        np.testing.assert_array_equal(table["visit"], [1, 2, 3, 4, 5])
+        np.testing.assert_array_equal(table["memory"], [1000, 2000, 3000, 4000, 5000])
+        np.testing.assert_array_equal(table["init_time"], 2.0)
+        np.testing.assert_array_equal(table["run_time"], [1.0, 2.0, 3.0, 4.0, 5.0])
+        np.testing.assert_array_equal(table["fringe.run"], 0.5)
+        # Methods which did not run take no time.
+        np.testing.assert_array_equal(table["missing"], 0.0)
+        self.assertNotIn("prep_time", table.columns)
+
+        # Loading concurrently, or reading the JSON directly, gives the same
+        # table.
+        concurrent = self._run(max_workers=4)
+        self.assertTrue(concurrent.equals(table))
+        direct = self._run(max_workers=4, read_json=True)
+        self.assertTrue(direct.equals(table))
+        for handle in self.handles:
+            self.assertEqual(handle.get.call_count, 2)
+
+    def testIncremental(self):
+        for i, handle in enumerate(self.handles):
+            handle.ref.id = f"id{i}"
+        full = self._run(dataset_id=True)
+        self.assertEqual(list(full["dataset_id"]), ["id0", "id1", "id2", "id3", "id4"])
+
+        config = ConsolidateResourceUsageConfig()
+        config.input_names = ["isr_resource_usage"]
+        expected = ConsolidateResourceUsageTask(config=config).run(isr_resource_usage=full).output_table
+
+        # Consolidating the quanta in two parts gives the same summary, and
+        # the watermark records the quanta consolidated.
+        directory = os.path.join(self.tempDir.name, "store")
+        config.incremental_directory = directory
+        task = ConsolidateResourceUsageTask(config=config)
+        task.run(isr_resource_usage=full[:3])
+        store = ResourceUsageStore(directory)
+        self.assertEqual(store.watermark(), {"isr": {"id0", "id1", "id2"}})
+        # Quanta consolidated twice are only counted once.
+        result = task.run(isr_resource_usage=full[2:]).output_table
+        self.assertTrue(result.equals(expected))
+        self.assertEqual(store.watermark(), {"isr": set(full["dataset_id"])})
+        self.assertEqual(len(store.read()["isr"]), 5)
+        self.assertTrue(os.path.exists(os.path.join(directory, "task=isr")))
+
+        with self.assertRaises(ValueError):
+            store.append("isr", self._run())
+
+
+class MyMemoryTestCase(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
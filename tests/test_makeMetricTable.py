@@ -0,0 +1,97 @@
+# This file is part of analysis_tools.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+from unittest.mock import MagicMock
+
+import astropy.units as u
+import lsst.pipe.base
+import lsst.utils.tests
+import numpy as np
+from lsst.analysis.tools.interfaces import MetricMeasurementBundle
+from lsst.analysis.tools.tasks.makeMetricTable import MakeMetricTableConfig, MakeMetricTableTask
+from lsst.verify import Measurement
+
+
+def _makeTract(ra):
+    """Make a mock tract with corners at a given right ascension."""
+    vertices = []
+    for dRa, dec in [(0, 0), (1, 0), (1, 1), (0, 1)]:
+        vertex = MagicMock()
+        vertex.getRa.return_value.asDegrees.return_value = ra + dRa
+        vertex.getDec.return_value.asDegrees.return_value = dec
+        vertices.append(vertex)
+    tract = MagicMock()
+    tract.getVertexList.return_value = vertices
+    return tract
+
+
+class MakeMetricTableTestCase(unittest.TestCase):
+    """Test assembling a table of metrics from bundles."""
+
+    def setUp(self):
+        config = MakeMetricTableConfig()
+        config.inputDataDimensions = ["tract"]
+        config.outputTableDimensions = ["skymap"]
+        config.dataIdFieldsToIncludeAsColumns = ["tract"]
+        self.task = MakeMetricTableTask(config=config)
+        self.skymap = {tract: _makeTract(10.0 * tract) for tract in range(3)}
+
+    def testRun(self):
+        bundles = [
+            MetricMeasurementBundle({"x": [Measurement("a", 1.0 * u.mag)]}),
+            MetricMeasurementBundle({"x": [Measurement("a", 2000.0 * u.mmag), Measurement("b", 3.0 * u.s)]}),
+            MetricMeasurementBundle({"y": [Measurement("c", 4.0 * u.dimensionless_unscaled)]}),
+        ]
+        dataIdInfo = [{"tract": 0}, {"tract": 2}, {"tract": 0}]
+        table = self.task.run(dataIdInfo, bundles, self.skymap).metricTable
+        self.assertEqual(table.colnames[:2], ["tract", "corners"])
+        self.assertEqual(len(table.colnames), 5)
+        np.testing.assert_array_equal(table["tract"], [0, 2, 0])
+        # The corners are those of the tract of each row.
+        np.testing.assert_array_equal(table["corners"][:, 0, 0], [0.0, 20.0, 0.0])
+
+        # Missing metrics are NaN, and values are in the unit of the column.
+        columns = table.colnames[2:]
+        self.assertEqual([table[column].unit for column in columns], [u.mag, u.s, u.dimensionless_unscaled])
+        np.testing.assert_array_equal(table[columns[0]], [1.0, 2.0, np.nan])
+        np.testing.assert_array_equal(table[columns[1]], [np.nan, 3.0, np.nan])
+        np.testing.assert_array_equal(table[columns[2]], [np.nan, np.nan, 4.0])
+
+        # The corners of each tract are computed once.
+        self.assertEqual(self.skymap[0].getVertexList.call_count, 1)
+
+    def testNoWork(self):
+        with self.assertRaises(lsst.pipe.base.NoWorkFound):
+            self.task.run([], [], self.skymap)
+
+
+class MyMemoryTestCase(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
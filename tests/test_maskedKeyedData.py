@@ -0,0 +1,124 @@
+# This file is part of analysis_tools.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import unittest
+
+import lsst.utils.tests
+import numpy as np
+import pandas as pd
+from astropy.table import Table
+from lsst.analysis.tools.actions.vector.selectors import FlagSelector, RangeSelector
+from lsst.analysis.tools.interfaces import BasePrep, MaskedKeyedData
+
+
+class _CountingDict(dict):
+    """A dict which records how many times each key is read."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reads = {}
+
+    def __getitem__(self, key):
+        self.reads[key] = self.reads.get(key, 0) + 1
+        return super().__getitem__(key)
+
+
+class MaskedKeyedDataTestCase(unittest.TestCase):
+    """Test lazily masked views of `KeyedData`."""
+
+    def setUp(self):
+        self.data = _CountingDict(
+            x=np.arange(10.0),
+            y=np.arange(10.0) * 2,
+            flag=np.arange(10) % 2 == 1,
+            scalar=3.0,
+        )
+
+    def testLazyGather(self):
+        index = MaskedKeyedData.combineMasks(None, ~self.data["flag"])
+        index = MaskedKeyedData.combineMasks(index, np.arange(10) < 7)
+        np.testing.assert_array_equal(index, [0, 2, 4, 6])
+
+        view = MaskedKeyedData(self.data, ["x", "y", "scalar"], ["x", "y"], index)
+        self.assertEqual(list(view), ["x", "y", "scalar"])
+        self.assertNotIn("flag", view)
+        # Nothing is read until it is needed, and only read once.
+        self.assertNotIn("x", self.data.reads)
+        np.testing.assert_array_equal(view["x"], [0, 2, 4, 6])
+        np.testing.assert_array_equal(view["x"], [0, 2, 4, 6])
+        self.assertEqual(self.data.reads["x"], 1)
+        self.assertNotIn("y", self.data.reads)
+        self.assertEqual(view["scalar"], 3.0)
+        with self.assertRaises(KeyError):
+            view["flag"]
+
+        # Assignment shadows, but does not modify, the parent.
+        view["x"] = np.zeros(4)
+        np.testing.assert_array_equal(view["x"], np.zeros(4))
+        np.testing.assert_array_equal(self.data["x"], np.arange(10.0))
+
+    def testPandas(self):
+        frame = pd.DataFrame({"x": np.arange(10.0)}, index=np.arange(10, 20))
+        view = MaskedKeyedData(frame, ["x"], ["x"], np.array([1, 3]))
+        np.testing.assert_array_equal(view["x"], [1.0, 3.0])
+
+    def testBasePrep(self):
+        prep = BasePrep(keysToLoad=["scalar"], vectorKeys=["x", "y"])
+        prep.selectors.flag = FlagSelector(selectWhenFalse=["flag"])
+        prep.selectors.range = RangeSelector(vectorKey="x", minimum=3)
+        result = prep(self.data)
+        np.testing.assert_array_equal(result["x"], [4, 6, 8])
+        np.testing.assert_array_equal(result["y"], [8, 12, 16])
+        self.assertEqual(result["scalar"], 3.0)
+
+        # Selectors after an empty selection are not evaluated.
+        prep.selectors.range = RangeSelector(vectorKey="x", minimum=100)
+        prep.selectors.other = RangeSelector(vectorKey="y", minimum=0)
+        self.data.reads.clear()
+        result = prep(self.data)
+        self.assertEqual(len(result["x"]), 0)
+        self.assertEqual(self.data.reads.get("y", 0), 0)
+
+    def testBasePrepTable(self):
+        table = Table({key: self.data[key] for key in ("x", "y", "flag")})
+        prep = BasePrep(vectorKeys=["x", "y"])
+        prep.selectors.flag = FlagSelector(selectWhenFalse=["flag"])
+        result = prep(table)
+        np.testing.assert_array_equal(result["x"], [0, 2, 4, 6, 8])
+        np.testing.assert_array_equal(result["y"], [0, 4, 8, 12, 16])
+
+        prep.vectorKeys = ["x", "missing"]
+        with self.assertRaises(KeyError):
+            prep(table)
+
+
+class MyMemoryTestCase(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
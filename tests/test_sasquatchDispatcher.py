@@ -0,0 +1,283 @@
+# This file is part of analysis_tools.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import astropy.units as u
+import lsst.utils.tests
+from lsst.analysis.tools.interfaces import MetricMeasurementBundle
+from lsst.analysis.tools.interfaces.datastore import (
+    SasquatchDispatcher,
+    SasquatchDispatchFailure,
+    SasquatchDispatchPartialFailure,
+    SasquatchSpool,
+)
+from lsst.daf.butler import DataCoordinate, DatasetRef, DatasetType, DimensionUniverse
+from lsst.verify import Measurement
+
+
+class _StubProxyHandler(BaseHTTPRequestHandler):
+    """Answer requests as a Sasquatch REST proxy would, recording them on the
+    server.
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests.append(("GET", self.path, None))
+        self._reply(200, {"data": [{"cluster_id": "stub"}]})
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["content-length"])))
+        with self.server.lock:
+            self.server.requests.append(("POST", self.path, payload))
+        if self.path.endswith("/topics"):
+            self._reply(201, {})
+        elif self.path in self.server.failingPaths:
+            self._reply(500, {})
+        else:
+            self._reply(self.server.status, {"offsets": []})
+
+
+class _StubProxyTestCase(unittest.TestCase):
+    """Base class of tests run against a local stub of the REST proxy."""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubProxyHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.status = 200
+        self.server.failingPaths = set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _requests(self, kind):
+        return [request for request in self.server.requests if request[1].endswith(kind)]
+
+    @staticmethod
+    def _bundles(number):
+        for i in range(number):
+            bundle = MetricMeasurementBundle(
+                {
+                    "photometry": [Measurement("a", i * u.mag), Measurement("b", 1.0 * u.mag)],
+                    "astrometry": [Measurement("c", i * u.mas)],
+                }
+            )
+            yield bundle, dict(run="run", datasetType="metrics", identifierFields={"visit": i})
+
+
+class SasquatchDispatcherTestCase(_StubProxyTestCase):
+    """Test dispatching bundles to a local stub of the REST proxy."""
+
+    def testDispatchBundles(self):
+        dispatcher = SasquatchDispatcher(self.url, "na", maxWorkers=4)
+        dispatcher.dispatchBundles(self._bundles(5))
+        # Each topic is created once, and the records of all the bundles are
+        # sent to it in one request.
+        self.assertEqual(len(self._requests("/clusters")), 1)
+        self.assertEqual(len(self._requests("/topics")), 2)
+        posts = {path: payload for _, path, payload in self.server.requests if "/topics/" in path}
+        self.assertEqual(set(posts), {"/topics/lsst.dm.photometry", "/topics/lsst.dm.astrometry"})
+        records = posts["/topics/lsst.dm.photometry"]["records"]
+        self.assertEqual([record["value"]["visit"] for record in records], ["0", "1", "2", "3", "4"])
+        self.assertEqual([record["value"]["a"] for record in records], [0.0, 1.0, 2.0, 3.0, 4.0])
+
+        # Topics are remembered by other dispatchers, and batches are split.
+        self.server.requests.clear()
+        dispatcher = SasquatchDispatcher(self.url, "na", maxWorkers=2, maxBatchSize=2)
+        dispatcher.dispatchBundles(self._bundles(5))
+        self.assertEqual(len(self._requests("/topics")), 0)
+        self.assertEqual(len(self.server.requests), 6)
+
+        bundle, kwargs = next(self._bundles(1))
+        self.server.requests.clear()
+        dispatcher.dispatch(bundle, **kwargs)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def testSchemaCache(self):
+        dispatcher = SasquatchDispatcher(self.url, "na", namespace="lsst.cache")
+        with patch.object(
+            SasquatchDispatcher, "_generateAvroSchema", wraps=dispatcher._generateAvroSchema
+        ) as generate:
+            dispatcher.dispatchBundles(self._bundles(5))
+            # Schemas are generated once for each metric.
+            self.assertEqual(generate.call_count, 2)
+            SasquatchDispatcher(self.url, "na", namespace="lsst.cache").dispatchBundles(self._bundles(5))
+            self.assertEqual(generate.call_count, 2)
+
+            # Records of a different form have a different schema, and fields
+            # which cannot be encoded are removed.
+            bundle, kwargs = next(self._bundles(1))
+            kwargs["extraFields"] = {"mixed": [1, "a"]}
+            self.server.requests.clear()
+            for _ in range(2):
+                with self.assertRaises(SasquatchDispatchPartialFailure):
+                    dispatcher.dispatch(bundle, **kwargs)
+            self.assertEqual(generate.call_count, 4)
+        schemas = {payload["value_schema"] for _, path, payload in self.server.requests if "/topics/" in path}
+        self.assertEqual(len(schemas), 2)
+        for _, path, payload in self.server.requests:
+            self.assertNotIn("mixed", payload["records"][0]["value"])
+            self.assertEqual(payload["records"][0]["value"]["visit"], "0")
+
+    def testFailures(self):
+        self.server.status = 500
+        dispatcher = SasquatchDispatcher(self.url, "na", maxWorkers=4)
+        with self.assertRaises(SasquatchDispatchFailure):
+            dispatcher.dispatchBundles(self._bundles(2))
+        with self.assertRaises(ValueError):
+            SasquatchDispatcher(self.url, "na", maxWorkers=0)
+
+        # Bundles with values which cannot be uploaded are sent in part.
+        self.server.status = 200
+        bundle = MetricMeasurementBundle({"photometry": [Measurement("a", float("nan") * u.mag)]})
+        with self.assertRaises(SasquatchDispatchPartialFailure) as cm:
+            dispatcher.dispatchBundles([(bundle, dict(run="run", datasetType="metrics"))])
+        self.assertEqual(cm.exception.unsent, frozenset())
+
+        # The bundles with records which were not sent are reported.
+        self.server.failingPaths = {"/topics/lsst.dm.astrometry"}
+        bundles = list(self._bundles(2))
+        bundles[0][0].pop("astrometry")
+        with self.assertRaises(SasquatchDispatchPartialFailure) as cm:
+            dispatcher.dispatchBundles(bundles)
+        self.assertEqual(cm.exception.unsent, frozenset({1}))
+
+
+class SasquatchSpoolTestCase(_StubProxyTestCase):
+    """Test spooling bundles while the REST proxy is failing."""
+
+    def testSpool(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            path = os.path.join(tempDir, "spool.sqlite3")
+            spool = SasquatchSpool(path, SasquatchDispatcher(self.url, "na"), batchSize=2, initialDelay=0.0)
+            for i, (bundle, kwargs) in enumerate(self._bundles(3)):
+                spool.putBundle(bundle, key=str(i), **kwargs)
+            # A bundle spooled again replaces the one waiting to be sent.
+            spool.putBundle(bundle, key="2", **kwargs)
+            self.assertEqual(len(spool), 3)
+
+            self.server.status = 500
+            self.assertEqual(spool.flush(), 0)
+            self.assertEqual(len(spool), 3)
+
+            # Entries are kept when the proxy cannot be reached at all.
+            unreachable = SasquatchDispatcher("http://127.0.0.1:1", "na")
+            self.assertEqual(SasquatchSpool(path, unreachable, initialDelay=0.0).flush(), 0)
+
+            # The entries left by an earlier process are sent by another.
+            self.server.status = 200
+            self.server.requests.clear()
+            replay = SasquatchSpool(path, SasquatchDispatcher(self.url, "na"), batchSize=2)
+            self.assertEqual(replay.flush(), 3)
+            self.assertEqual(len(replay), 0)
+            visits = [
+                record["value"]["visit"]
+                for _, path, payload in self.server.requests
+                if path == "/topics/lsst.dm.photometry"
+                for record in payload["records"]
+            ]
+            self.assertEqual(visits, ["0", "1", "2"])
+
+            # Failed entries are retried after a delay.
+            self.server.status = 500
+            replay.initialDelay = 60.0
+            replay.putBundle(bundle, key="3", **kwargs)
+            self.assertEqual(replay.flush(), 0)
+            self.server.status = 200
+            self.assertEqual(replay.flush(), 0)
+            self.assertEqual(len(replay), 1)
+
+    def testPartialFailure(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            spool = SasquatchSpool(
+                os.path.join(tempDir, "spool.sqlite3"), SasquatchDispatcher(self.url, "na"), initialDelay=0.0
+            )
+            for bundle, kwargs in self._bundles(2):
+                spool.putBundle(bundle, **kwargs)
+
+            # Only the records which could not be sent are retried.
+            self.server.failingPaths = {"/topics/lsst.dm.astrometry"}
+            self.assertEqual(spool.flush(), 0)
+            self.assertEqual(len(spool), 2)
+            self.assertEqual(len(self._requests("/topics/lsst.dm.photometry")), 1)
+            self.server.failingPaths = set()
+            self.server.requests.clear()
+            self.assertEqual(spool.flush(), 2)
+            self.assertEqual(len(spool), 0)
+            self.assertEqual(self._requests("/topics/lsst.dm.photometry"), [])
+            ((_, _, payload),) = self._requests("/topics/lsst.dm.astrometry")
+            self.assertEqual([record["value"]["visit"] for record in payload["records"]], ["0", "1"])
+
+    def testKeys(self):
+        universe = DimensionUniverse()
+        dataId = DataCoordinate.standardize({"instrument": "Cam", "visit": 1}, universe=universe)
+        datasetType = DatasetType("metrics", dataId.dimensions, "MetricMeasurementBundle")
+        ref = DatasetRef(datasetType, dataId, run="run")
+        with tempfile.TemporaryDirectory() as tempDir:
+            spool = SasquatchSpool(
+                os.path.join(tempDir, "spool.sqlite3"), SasquatchDispatcher(self.url, "na")
+            )
+            bundle, _ = next(self._bundles(1))
+            # A dataset spooled by its ref and by its data ID has one entry.
+            spool.put(bundle, ref)
+            spool.putBundle(bundle, run="run", datasetType="metrics", identifierFields=dataId)
+            spool.putBundle(
+                bundle, run="run", datasetType="metrics", identifierFields={"visit": 1, "instrument": "Cam"}
+            )
+            self.assertEqual(len(spool), 1)
+            spool.putBundle(bundle, run="other", datasetType="metrics", identifierFields=dataId)
+            self.assertEqual(len(spool), 2)
+            with self.assertRaises(ValueError):
+                spool.putBundle(bundle, run="run")
+
+
+class MyMemoryTestCase(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
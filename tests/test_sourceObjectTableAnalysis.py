@@ -0,0 +1,91 @@
+# This file is part of analysis_tools.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+from unittest.mock import MagicMock
+
+import lsst.utils.tests
+import numpy as np
+from astropy.table import Table
+from lsst.analysis.tools.tasks import (
+    AssociatedSourceVisitIndexTask,
+    SourceObjectTableAnalysisConfig,
+    SourceObjectTableAnalysisTask,
+)
+from lsst.analysis.tools.tasks.sourceObjectTableAnalysis import _readVisitSourceRows
+
+
+class AssociatedSourceVisitIndexTestCase(unittest.TestCase):
+    """Test reading the associated sources of a visit through an index."""
+
+    def setUp(self):
+        rng = np.random.default_rng(12345)
+        self.associatedSources = Table(
+            {"visit": rng.integers(100, 120, 1000), "source_row": rng.integers(0, 500, 1000)}
+        )
+        outputs = AssociatedSourceVisitIndexTask().run(self.associatedSources)
+        self.visitIndex = outputs.visitIndex
+        self.indexHandle = MagicMock()
+        self.indexHandle.get.return_value = self.visitIndex
+        self.sourcesHandle = MagicMock()
+        self.sourcesHandle.get.return_value = outputs.sourcesByVisit
+
+    def testIndex(self):
+        self.assertTrue(np.all(np.diff(self.visitIndex["visit"]) > 0))
+        self.assertEqual(self.visitIndex["stop"][-1], len(self.associatedSources))
+        np.testing.assert_array_equal(self.visitIndex["start"][1:], self.visitIndex["stop"][:-1])
+
+        for visit in [100, 110, 119, 99, 120]:
+            # The rows are those of the visit, in their original order.
+            expected = self.associatedSources["source_row"][self.associatedSources["visit"] == visit]
+            sourceRows = _readVisitSourceRows(visit, self.indexHandle, self.sourcesHandle)
+            np.testing.assert_array_equal(sourceRows, expected)
+        # The sources are read through the butler.
+        self.sourcesHandle.get.assert_called_with(parameters={"columns": ["source_row"]})
+
+    def testPrepareAssociatedSources(self):
+        config = SourceObjectTableAnalysisConfig()
+        config.applyAstrometricCorrections = False
+        config.useVisitIndex = True
+        connections = config.ConnectionsClass(config=config)
+        self.assertNotIn("associatedSources", connections.inputs)
+        self.assertIn("associatedSourcesVisitIndex", connections.inputs)
+
+        data = Table({"coord_ra": np.linspace(10, 11, 500), "coord_dec": np.linspace(0, 1, 500)})
+        refCats = data[::2].to_pandas().rename(columns={"coord_ra": "r_ra", "coord_dec": "r_dec"})
+        allCat = SourceObjectTableAnalysisTask(config=config).prepareAssociatedSources(
+            110, data, [(self.indexHandle, self.sourcesHandle)], refCats, None, None
+        )
+        sourceRows = self.associatedSources["source_row"][self.associatedSources["visit"] == 110]
+        self.assertEqual(len(allCat), np.sum(sourceRows % 2 == 0))
+
+
+class MyMemoryTestCase(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
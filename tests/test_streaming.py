@@ -0,0 +1,340 @@
+# This file is part of analysis_tools.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import unittest
+
+import lsst.utils.tests
+import numpy as np
+from lsst.analysis.tools.actions.keyedData import KeyedScalars
+from lsst.analysis.tools.actions.scalar import (
+    CountAction,
+    CountUniqueAction,
+    FracThreshold,
+    MeanAction,
+    MedianAction,
+    SigmaMadAction,
+    StdevAction,
+)
+from lsst.analysis.tools.actions.vector import CalcBinnedStatsAction, LoadVector
+from lsst.analysis.tools.actions.vector.selectors import FlagSelector, RangeSelector
+from lsst.analysis.tools.interfaces import (
+    AnalysisTool,
+    QuantileSketch,
+    ReservoirSample,
+    StreamingStatistics,
+    StreamingToolRunner,
+    VectorStatistics,
+)
+from lsst.analysis.tools.math import nanMedian, nanSigmaMad
+from lsst.analysis.tools.tasks.objectTableSurveyAnalysis import (
+    ObjectTableSurveyAnalysisConfig,
+    ObjectTableSurveyAnalysisTask,
+)
+
+
+def _makeTool() -> AnalysisTool:
+    tool = AnalysisTool()
+    tool.prep.selectors.flags = FlagSelector(selectWhenFalse=["{band}_flag"])
+    tool.prep.selectors.range = RangeSelector(vectorKey="z", minimum=-1.0)
+    tool.process.buildActions.x = LoadVector(vectorKey="{band}_x")
+    tool.process.calculateActions.median = MedianAction(vectorKey="x")
+    tool.process.calculateActions.mean = MeanAction(vectorKey="x")
+    tool.process.calculateActions.stats = KeyedScalars()
+    tool.process.calculateActions.stats.scalarActions.count = CountAction(vectorKey="{band}_y")
+    tool.process.calculateActions.stats.scalarActions.sigmaMad = SigmaMadAction(vectorKey="{band}_y")
+    tool.process.calculateActions.unique = CountUniqueAction(vectorKey="{band}_y")
+    tool.produce.metric.units = {"median": "", "mean": "", "count": "ct", "sigmaMad": "", "unique": "ct"}
+    tool.produce.metric.newNames = {key: f"{{band}}_{key}" for key in tool.produce.metric.units}
+    return tool
+
+
+class QuantileSketchTestCase(unittest.TestCase):
+    """Test the quantile sketch."""
+
+    def testExact(self):
+        values = np.random.default_rng(1).normal(size=151)
+        values[::10] = np.nan
+        sketch = QuantileSketch(k=200)
+        sketch.update(values)
+        self.assertTrue(sketch.exact)
+        self.assertEqual(sketch.count, np.count_nonzero(~np.isnan(values)))
+        self.assertEqual(sketch.quantile(0.5), nanMedian(values))
+        self.assertEqual(sketch.quantile(0.0), np.nanmin(values))
+        self.assertEqual(sketch.quantile(1.0), np.nanmax(values))
+        self.assertTrue(np.isnan(QuantileSketch().quantile(0.5)))
+        with self.assertRaises(ValueError):
+            sketch.quantile(1.5)
+
+    def testAccuracy(self):
+        rng = np.random.default_rng(2)
+        values = rng.normal(size=200_000)
+        whole = QuantileSketch(k=200)
+        merged = QuantileSketch(k=200)
+        for chunk in np.array_split(values, 13):
+            whole.update(chunk)
+            part = QuantileSketch(k=200, seed=int(rng.integers(100)))
+            part.update(chunk)
+            merged.merge(part)
+        ordered = np.sort(values)
+        for sketch in (whole, merged):
+            self.assertFalse(sketch.exact)
+            self.assertEqual(sketch.count, values.size)
+            # The sketch is bounded in size, but its weights cover every
+            # value.
+            self.assertLess(len(sketch), 2000)
+            self.assertEqual(sketch.items()[1].sum(), values.size)
+            for q in (0.1, 0.5, 0.9):
+                rank = np.searchsorted(ordered, sketch.quantile(q)) / values.size
+                self.assertLess(abs(rank - q), 0.02)
+                self.assertLess(abs(sketch.rank(np.quantile(values, q)) - q), 0.02)
+
+    def testRankError(self):
+        rng = np.random.default_rng(7)
+        values = rng.lognormal(size=100_000)
+        sketch = QuantileSketch.fromRankError(0.01)
+        self.assertEqual(sketch.k, 200)
+        sketch.update(values)
+        ordered = np.sort(values)
+        for q in np.linspace(0.05, 0.95, 19):
+            rank = np.searchsorted(ordered, sketch.quantile(q)) / values.size
+            self.assertLess(abs(rank - q), 0.01)
+        self.assertAlmostEqual(sketch.sigmaMad(), nanSigmaMad(values), delta=0.03)
+        with self.assertRaises(ValueError):
+            QuantileSketch.fromRankError(0.0)
+
+    def testSerialization(self):
+        rng = np.random.default_rng(8)
+        parts = []
+        for chunk in np.array_split(rng.normal(size=30_000), 4):
+            part = QuantileSketch(k=100)
+            part.update(chunk)
+            # Partial sketches are written out and read back before merging.
+            parts.append(QuantileSketch.parse_obj(json.loads(part.json)))
+            self.assertEqual(parts[-1].items()[0].tolist(), part.items()[0].tolist())
+            restored = parts[-1]
+            self.assertEqual((restored.count, restored.min, restored.max), (part.count, part.min, part.max))
+        merged = QuantileSketch.fromSketches(parts)
+        self.assertEqual(merged.count, 30_000)
+        self.assertAlmostEqual(merged.quantile(0.5), 0.0, delta=0.05)
+        empty = QuantileSketch.parse_obj(json.loads(QuantileSketch().json))
+        self.assertEqual(empty.count, 0)
+        self.assertTrue(np.isnan(empty.quantile(0.5)))
+
+    def testActions(self):
+        rng = np.random.default_rng(9)
+        values = rng.normal(loc=1.0, size=50_000)
+        data = {"x": values, "sketches": []}
+        for chunk in np.array_split(values, 5):
+            sketch = QuantileSketch(k=400)
+            sketch.update(chunk)
+            data["sketches"].append(sketch)
+        expectedMedian, expectedSigmaMad = nanMedian(values), nanSigmaMad(values)
+        median = MedianAction(vectorKey="x", sketchRankError=0.005)
+        sigmaMad = SigmaMadAction(vectorKey="x", sketchRankError=0.005)
+        self.assertEqual(median.getStatisticNames(), ("quantileSketch",))
+        stats = KeyedScalars()
+        stats.scalarActions.median = median
+        stats.scalarActions.sigmaMad = sigmaMad
+        result = stats(data)
+        self.assertAlmostEqual(result["median"], expectedMedian, delta=0.02)
+        self.assertAlmostEqual(result["sigmaMad"], expectedSigmaMad, delta=0.02)
+        # Vectors of sketches are merged, whether or not a rank error is set.
+        for action in (MedianAction(vectorKey="sketches"), SigmaMadAction(vectorKey="sketches")):
+            expected = expectedMedian if isinstance(action, MedianAction) else expectedSigmaMad
+            self.assertAlmostEqual(action(data), expected, delta=0.02)
+        mask = np.array([True, False, False, False, False])
+        self.assertAlmostEqual(
+            MedianAction(vectorKey="sketches")(data, mask=mask), nanMedian(values[:10_000]), delta=0.03
+        )
+        # The exact statistics are unchanged by default.
+        self.assertEqual(MedianAction(vectorKey="x")(data), expectedMedian)
+
+        binned = CalcBinnedStatsAction(key_vector="x")
+        binned.selector_range.vectorKey = "x"
+        binned.selector_range.minimum = 0.0
+        binned.selector_range.maximum = 2.0
+        binned.statistics.scalarActions.median.sketchRankError = 0.005
+        binned.statistics.scalarActions.sigmaMad.sketchRankError = 0.005
+        binned.freeze()
+        result = binned(data)
+        selected = values[(values >= 0.0) & (values < 2.0)]
+        self.assertAlmostEqual(result["median"], nanMedian(selected), delta=0.02)
+        self.assertAlmostEqual(result["sigmaMad"], nanSigmaMad(selected), delta=0.02)
+
+
+class StreamingStatisticsTestCase(unittest.TestCase):
+    """Test the accumulation of statistics from chunks."""
+
+    def testStatistics(self):
+        rng = np.random.default_rng(3)
+        values = rng.normal(loc=5.0, size=50_000)
+        values[rng.random(values.size) > 0.9] = np.nan
+        statistics = StreamingStatistics()
+        other = StreamingStatistics()
+        for i, chunk in enumerate(np.array_split(values, 7)):
+            (statistics if i % 2 else other).update(chunk)
+        statistics.update(np.array([]))
+        statistics.merge(other)
+        expected = VectorStatistics(values)
+        for name in ("size", "count", "nanCount"):
+            self.assertEqual(getattr(statistics, name), getattr(expected, name))
+        for name in ("sum", "mean", "std", "rms", "min", "max"):
+            self.assertAlmostEqual(getattr(statistics, name), getattr(expected, name), places=7)
+        self.assertAlmostEqual(statistics.median, expected.median, delta=0.05)
+        self.assertAlmostEqual(statistics.sigmaMad, expected.sigmaMad, delta=0.05)
+
+        empty = StreamingStatistics(sketchSize=None)
+        empty.update(np.array([np.nan]))
+        self.assertEqual(empty.nanCount, 1)
+        for name in ("mean", "std", "rms", "min", "max"):
+            self.assertTrue(np.isnan(getattr(empty, name)))
+        with self.assertRaises(ValueError):
+            empty.median
+        with self.assertRaises(ValueError):
+            StreamingStatistics().min
+
+    def testSmallInputs(self):
+        # Statistics of few values are exact.
+        values = np.random.default_rng(4).normal(size=100)
+        statistics = StreamingStatistics()
+        statistics.update(values[:40])
+        statistics.update(values[40:])
+        self.assertAlmostEqual(statistics.median, nanMedian(values))
+        self.assertAlmostEqual(statistics.sigmaMad, nanSigmaMad(values))
+
+
+class ReservoirSampleTestCase(unittest.TestCase):
+    """Test sampling rows of chunks of data."""
+
+    def testSample(self):
+        data = {"a": np.arange(10_000), "b": np.arange(10_000) * 2.0}
+        sample = ReservoirSample(500, seed=5)
+        other = ReservoirSample(500, seed=6)
+        for i, rows in enumerate(np.array_split(np.arange(10_000), 9)):
+            (sample if i < 5 else other).add({key: value[rows] for key, value in data.items()}, ["a", "b"])
+        sample.merge(other)
+        self.assertEqual(sample.numRows, 10_000)
+        self.assertEqual(len(sample), 500)
+        result = sample.data
+        # Rows are kept whole, and in order.
+        np.testing.assert_array_equal(result["b"], result["a"] * 2.0)
+        self.assertTrue(np.all(np.diff(result["a"]) > 0))
+        # The rows are drawn from all of the chunks.
+        self.assertLess(abs(np.mean(result["a"]) - 5000), 500)
+
+        small = ReservoirSample(100)
+        small.add({"a": np.arange(10)}, ["a"])
+        np.testing.assert_array_equal(small.data["a"], np.arange(10))
+        with self.assertRaises(ValueError):
+            small.add({"c": np.arange(10)}, ["c"])
+
+
+class StreamingToolRunnerTestCase(unittest.TestCase):
+    """Test running tools over data given in chunks."""
+
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.bands = ["g", "r"]
+        size = 20_000
+        self.data = {"z": rng.normal(size=size)}
+        for band in self.bands:
+            self.data[f"{band}_x"] = rng.normal(size=size)
+            self.data[f"{band}_y"] = rng.integers(0, 1000, size=size).astype(float)
+            self.data[f"{band}_flag"] = rng.random(size) > 0.8
+
+    def _chunks(self, numChunks):
+        for rows in np.array_split(np.arange(len(self.data["z"])), numChunks):
+            yield {key: value[rows] for key, value in self.data.items()}
+
+    @staticmethod
+    def _values(results):
+        return {key: value.quantity.value for key, value in results.items()}
+
+    def testRunner(self):
+        tool = _makeTool()
+        tool.finalize()
+        expected = self._values(tool(self.data, bands=self.bands))
+        runner = StreamingToolRunner(tool, sampleSize=1000, bands=self.bands)
+        self.assertTrue(runner.streamed)
+        with self.assertRaises(RuntimeError):
+            runner.finish()
+        for chunk in self._chunks(7):
+            runner.update(chunk)
+        # The number of unique values can only be computed from the sample.
+        self.assertEqual(runner.sampled, ["unique"])
+        result = self._values(runner.finish())
+        self.assertEqual(set(result), set(expected))
+        for band in self.bands:
+            self.assertEqual(result[f"{band}_count"], expected[f"{band}_count"])
+            self.assertAlmostEqual(result[f"{band}_mean"], expected[f"{band}_mean"])
+            self.assertAlmostEqual(result[f"{band}_median"], expected[f"{band}_median"], delta=0.05)
+            self.assertAlmostEqual(result[f"{band}_sigmaMad"], expected[f"{band}_sigmaMad"], delta=0.05 * 300)
+            self.assertLessEqual(result[f"{band}_unique"], 1000)
+
+    def testSampledStatistics(self):
+        # Every action reading a vector which one action reads the values of
+        # is computed from the sample.
+        tool = AnalysisTool()
+        tool.process.buildActions.x = LoadVector(vectorKey="{band}_x")
+        tool.process.calculateActions.std = StdevAction(vectorKey="x")
+        tool.process.calculateActions.frac = FracThreshold(vectorKey="x", op="lt", threshold=0.0)
+        tool.process.calculateActions.mean = MeanAction(vectorKey="{band}_y")
+        tool.produce.metric.units = {"std": "", "frac": "", "mean": ""}
+        tool.finalize()
+        runner = StreamingToolRunner(tool, sampleSize=100_000, bands=["g"])
+        for chunk in self._chunks(3):
+            runner.update(chunk)
+        self.assertEqual(sorted(runner.sampled), ["frac", "std"])
+        # The sample holds every row, so the results are the same.
+        expected = self._values(tool(self.data, bands=["g"]))
+        result = self._values(runner.finish())
+        for key, value in expected.items():
+            self.assertAlmostEqual(result[key], value)
+
+    def testSurveyTask(self):
+        config = ObjectTableSurveyAnalysisConfig()
+        config.connections.outputName = "test"
+        config.bands = self.bands
+        config.atools.tool = _makeTool()
+        config.streamTracts = True
+        config.streamingSampleSize = 500
+        config.freeze()
+        task = ObjectTableSurveyAnalysisTask(config=config)
+        expected = task.run(data=self.data).metrics["tool"]
+        result = task.runStreaming(chunks=self._chunks(4)).metrics["tool"]
+        self.assertEqual([m.metric_name.metric for m in result], [m.metric_name.metric for m in expected])
+        for measurement, reference in zip(result, expected):
+            if measurement.metric_name.metric.endswith("count"):
+                self.assertEqual(measurement.quantity, reference.quantity)
+
+
+class MyMemoryTestCase(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
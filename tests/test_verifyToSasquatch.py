@@ -20,13 +20,23 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import argparse
+import os
 import tempfile
 import unittest
+from unittest.mock import MagicMock
 
 import astropy.units as u
 import lsst.daf.butler.tests as butlerTests
-from lsst.analysis.tools.bin.verifyToSasquatch import _AppendDict, _bundle_metrics
+from lsst.analysis.tools.bin.verifyToSasquatch import (
+    _AppendDict,
+    _bundle_metrics,
+    _group_metrics,
+    _iter_bundles,
+    _read_checkpoint,
+    _upload,
+)
 from lsst.analysis.tools.interfaces import MetricMeasurementBundle
+from lsst.analysis.tools.interfaces.datastore import SasquatchDispatchPartialFailure
 from lsst.daf.butler import CollectionType, DataCoordinate
 from lsst.verify import Measurement
 
@@ -177,6 +187,62 @@ class VerifyToSasquatchTestSuite(unittest.TestCase):
         with self.assertRaises(ValueError):
             _bundle_metrics(self.butler, refs)
 
+    def _put_many(self):
+        for visit in [42, 43]:
+            for detector in range(4):
+                for name in ["fancyMetric", "fancierMetric"]:
+                    self.butler.put(
+                        Measurement(f"nopackage.{name}", (visit + detector) * u.s),
+                        f"metricvalue_nopackage_{name}",
+                        run="run1",
+                        instrument="notACam",
+                        visit=visit,
+                        detector=detector,
+                    )
+        return self.butler.registry.queryDatasets("metricvalue_nopackage_*", collections=...)
+
+    def test_bundle_metrics_workers(self):
+        refs = list(self._put_many())
+        bundles = _bundle_metrics(self.butler, refs)
+        self.assertEqual(len(bundles), 16)
+        self.assertDictEqual(_bundle_metrics(self.butler, refs, workers=4), bundles)
+        # Bundles are yielded in the order of their first metric value.
+        groups = _group_metrics(refs)
+        keys = [key for key, _ in _iter_bundles(self.butler, groups, workers=3)]
+        self.assertEqual(keys, list(groups))
+
+    def test_upload_checkpoint(self):
+        refs = list(self._put_many())
+        with tempfile.TemporaryDirectory() as tempDir:
+            path = os.path.join(tempDir, "checkpoint.txt")
+            args = argparse.Namespace(date_created=None, dataset="test", extra={}, checkpoint=path)
+            batch = list(_iter_bundles(self.butler, _group_metrics(refs)))
+            dispatcher = MagicMock()
+            self.assertEqual(_upload(batch[:8], dispatcher, None, args), 0)
+            self.assertEqual(len(dispatcher.dispatchBundles.call_args[0][0]), 8)
+            self.assertEqual(len(_read_checkpoint(path)), 8)
+
+            # Bundles from which records were left out, which would be left
+            # out again, are recorded.
+            dispatcher.dispatchBundles.side_effect = SasquatchDispatchPartialFailure(unsent=())
+            self.assertEqual(_upload(batch[8:10], dispatcher, None, args), 0)
+            self.assertEqual(len(_read_checkpoint(path)), 10)
+
+            # Only the bundles which were not sent are left out of the
+            # checkpoint.
+            dispatcher.dispatchBundles.side_effect = SasquatchDispatchPartialFailure(unsent=(1, 3))
+            self.assertEqual(_upload(batch[10:14], dispatcher, None, args), 2)
+            remaining = _group_metrics(refs, skip=_read_checkpoint(path))
+            self.assertEqual(list(remaining), [batch[11][0], batch[13][0]] + [key for key, _ in batch[14:]])
+
+            # None of the bundles are recorded if it is not known which were
+            # sent.
+            dispatcher.dispatchBundles.side_effect = SasquatchDispatchPartialFailure()
+            self.assertEqual(_upload(batch[14:], dispatcher, None, args), 2)
+            remaining = _group_metrics(refs, skip=_read_checkpoint(path))
+            self.assertEqual(len(remaining), 4)
+        self.assertEqual(_read_checkpoint(None), set())
+
 
 class AppendDictTestSuite(unittest.TestCase):
     def setUp(self):